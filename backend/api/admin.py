@@ -1,15 +1,81 @@
+from contextlib import ExitStack
+
 from django.contrib import admin
-from .models import Team, Round, Game, Bet, Odds, Bonus
+from .models import Tournament, Team, Round, Game, Bet, Odds, Bonus
+from .events import record_rows_deleted, record_rows_saved
+from .ledger import LEDGER_SOURCES, rebuild_ledger
+from .locks import tournament_lock
+from .replay import take_checkpoint
+from .tournament import PENDING_SOURCES, bump_version, refresh_pending
+
+# Admin edits change what players see, so they bump the tournament version,
+# and are recorded in the event log under the tournament lock like every other
+# write. Edits that may change bets or their odds rebuild the bet ledger, and
+# edits of the rows the pending counters count recount them.
+class VersionBumpingAdmin(admin.ModelAdmin):
+    def save_model(self, request, obj, form, change):
+        with tournament_lock(obj.tournament):
+            super().save_model(request, obj, form, change)
+            record_rows_saved(obj.tournament_id, [obj])
+            self.written(obj.tournament_id)
+
+    def delete_model(self, request, obj):
+        obj_id = obj.pk
+        with tournament_lock(obj.tournament):
+            super().delete_model(request, obj)
+            record_rows_deleted(obj.tournament_id, self.model, [obj_id])
+            self.written(obj.tournament_id)
+
+    def delete_queryset(self, request, queryset):
+        ids_by_tournament = {}
+        for obj_id, tournament_id in queryset.values_list('id', 'tournament_id'):
+            ids_by_tournament.setdefault(tournament_id, []).append(obj_id)
+        with ExitStack() as locks:
+            # In id order, so two bulk deletes cannot wait for each other
+            for tournament in Tournament.objects.filter(id__in=ids_by_tournament).order_by('id'):
+                locks.enter_context(tournament_lock(tournament))
+            super().delete_queryset(request, queryset)
+            for tournament_id, ids in ids_by_tournament.items():
+                record_rows_deleted(tournament_id, self.model, ids)
+                self.written(tournament_id)
+
+    def written(self, tournament_id):
+        if self.model in LEDGER_SOURCES:
+            rebuild_ledger(tournament_id)
+        if self.model in PENDING_SOURCES:
+            refresh_pending(tournament_id)
+        bump_version(tournament_id, resync=True)
+
+# Custom admin for Tournament
+class TournamentAdmin(admin.ModelAdmin):
+    list_display = ('id', 'slug', 'name', 'finish_distance', 'odds_mode', 'version', 'created', 'modified')
+    list_filter = ('odds_mode',)
+    search_fields = ('slug', 'name')
+    ordering = ('-created',)
+    prepopulated_fields = {'slug': ('name',)}
+    readonly_fields = ('version', 'cache_version')
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            with tournament_lock(obj):
+                # Saving the whole row would put back the version read with the form
+                obj.save(update_fields=form.changed_data + ['modified'])
+                record_rows_saved(obj.id, [obj])
+                bump_version(obj.id, resync=True)
+        else:
+            super().save_model(request, obj, form, change)
+            # The state its event log is replayed from
+            take_checkpoint(obj.id)
 
 # Custom admin for Team
-class TeamAdmin(admin.ModelAdmin):
+class TeamAdmin(VersionBumpingAdmin):
     list_display = ('id', 'identifier', 'name', 'bets_available', 'distance', 'created', 'modified')
-    list_filter = ('bets_available', 'created')
+    list_filter = ('tournament', 'bets_available', 'created')
     search_fields = ('identifier', 'name', 'description')
     ordering = ('name',)
     fieldsets = (
         (None, {
-            'fields': ('identifier', 'name')
+            'fields': ('tournament', 'identifier', 'name')
         }),
         ('Details', {
             'fields': ('description', 'bets_available', 'distance')
@@ -17,29 +83,33 @@ class TeamAdmin(admin.ModelAdmin):
     )
 
 # Custom admin for Round
-class RoundAdmin(admin.ModelAdmin):
+class RoundAdmin(VersionBumpingAdmin):
     list_display = ('id', 'number', 'stage', 'active', 'created', 'modified')
-    list_filter = ('active', 'stage')
+    list_filter = ('tournament', 'active', 'stage')
     search_fields = ('number', 'stage')
     ordering = ('number',)
+    readonly_fields = ('pending_bets', 'pending_games', 'pending_bonuses')
     fieldsets = (
         (None, {
-            'fields': ('number', 'stage')
+            'fields': ('tournament', 'number', 'stage')
         }),
         ('Status', {
             'fields': ('active',)
         }),
+        ('Pending', {
+            'fields': ('pending_bets', 'pending_games', 'pending_bonuses')
+        }),
     )
 
 # Custom admin for Game
-class GameAdmin(admin.ModelAdmin):
+class GameAdmin(VersionBumpingAdmin):
     list_display = ('id', 'team1', 'team2', 'round', 'win', 'location', 'finished', 'created')
-    list_filter = ('finished', 'round', 'win', 'location')
+    list_filter = ('tournament', 'finished', 'round', 'win', 'location')
     search_fields = ('team1__name', 'team2__name', 'location')
     ordering = ('-round__number', 'team1__name')
     fieldsets = (
         ('Teams', {
-            'fields': ('team1', 'team2')
+            'fields': ('tournament', 'team1', 'team2')
         }),
         ('Game Info', {
             'fields': ('round', 'win', 'location', 'finished')
@@ -47,14 +117,14 @@ class GameAdmin(admin.ModelAdmin):
     )
 
 # Custom admin for Bet
-class BetAdmin(admin.ModelAdmin):
+class BetAdmin(VersionBumpingAdmin):
     list_display = ('id', 'team', 'bet_on_team', 'round', 'bet_finish', 'created')
-    list_filter = ('bet_finish', 'round')
+    list_filter = ('tournament', 'bet_finish', 'round')
     search_fields = ('team__name', 'bet_on_team__name')
     ordering = ('-created',)
     fieldsets = (
         ('Bet Details', {
-            'fields': ('team', 'bet_on_team', 'odds', 'round')
+            'fields': ('tournament', 'team', 'bet_on_team', 'odds', 'round')
         }),
         ('Status', {
             'fields': ('bet_finish',)
@@ -62,14 +132,14 @@ class BetAdmin(admin.ModelAdmin):
     )
 
 # Custom admin for Odds
-class OddsAdmin(admin.ModelAdmin):
+class OddsAdmin(VersionBumpingAdmin):
     list_display = ('id', 'team', 'round', 'odd1', 'odd2', 'created', 'modified')
-    list_filter = ('round',)
+    list_filter = ('tournament', 'round')
     search_fields = ('team__name',)
     ordering = ('round', 'team__name')
     fieldsets = (
         ('Relationship', {
-            'fields': ('team', 'round')
+            'fields': ('tournament', 'team', 'round')
         }),
         ('Odds Values', {
             'fields': ('odd1', 'odd2')
@@ -77,14 +147,14 @@ class OddsAdmin(admin.ModelAdmin):
     )
 
 # Custom admin for Bonus
-class BonusAdmin(admin.ModelAdmin):
+class BonusAdmin(VersionBumpingAdmin):
     list_display = ('id', 'team', 'round', 'description', 'bonus_type', 'bonus_target', 'finished', 'created')
-    list_filter = ('finished', 'round', 'bonus_type')
+    list_filter = ('tournament', 'finished', 'round', 'bonus_type')
     search_fields = ('team__name', 'description', 'bonus_type', 'bonus_target')
     ordering = ('-created',)
     fieldsets = (
         ('Bonus Info', {
-            'fields': ('team', 'round', 'description')
+            'fields': ('tournament', 'team', 'round', 'description')
         }),
         ('Bonus Details', {
             'fields': ('bonus_type', 'bonus_target')
@@ -95,6 +165,7 @@ class BonusAdmin(admin.ModelAdmin):
     )
 
 # Register your models here.
+admin.site.register(Tournament, TournamentAdmin)
 admin.site.register(Team, TeamAdmin)
 admin.site.register(Round, RoundAdmin)
 admin.site.register(Game, GameAdmin)
@@ -0,0 +1,943 @@
+"""
+Performance scenarios run by `manage.py benchmark <scenario>`.
+
+Every scenario seeds the throwaway test database prepared by the command and
+prints its measurements, so the numbers can be compared between commits.
+"""
+import asyncio
+import gc
+import logging
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from urllib.parse import urlencode
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.models import F, Q
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext
+
+from .broadcast import DASHBOARD_TOPIC, hub
+from .cache import get_response_cache
+from .calibration import calibrated_odds_array, get_cache
+from .events import TAIL_LIMIT, next_seq, record_event, tail
+from .export import TournamentExport
+from .ledger import add_bet, ledger_totals, rebuild_ledger
+from .listing import ListCursorPagination
+from .live import dashboard_feed
+from .models import Tournament, Team, Round, Game, Odds, Bet, Bonus, TournamentEvent
+from .odds import new_odds_logic, new_odds_array, new_odds_batch
+from .replay import CHECKPOINT_ROUNDS, TournamentReplay, database_differences, take_checkpoint
+from .restore import TournamentRestore
+from .serializers import TeamSerializer
+from .simulation import simulate
+from .testing import (
+    STANDINGS_QUERY_BUDGET,
+    TEAM_STAGE_STATUSES_QUERY_BUDGET,
+    TRANSITION_QUERY_BUDGETS,
+    count_round_trips,
+    count_statements,
+    create_stage_progress,
+    create_tournaments,
+    fire_concurrently,
+    play_rounds,
+)
+from .tournament import (
+    LOCATIONS,
+    calculate_betting_results,
+    check_tournament_winner,
+    generate_new_odds,
+    move_to_joust_stage,
+    process_winners,
+    move_to_bonus_stage,
+    move_to_new_round,
+    stage_statuses_by_team,
+)
+
+SCENARIOS = {}
+
+
+def scenario(name, concurrent=False):
+    """
+    Register a benchmark scenario under the given name. Concurrent scenarios
+    query the database from several threads, so SQLite keeps its test
+    database in a file all of their connections can share.
+    """
+    def register(func):
+        func.concurrent = concurrent
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+def measure(func, repeat):
+    """Call func repeatedly and return the wall time of every call in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def report(out, label, samples):
+    """Print the median and 95th percentile of a list of millisecond samples"""
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    out.write(f"{label:<40} median {statistics.median(ordered):8.2f} ms   p95 {p95:8.2f} ms")
+
+
+# Labels of the blocks that issued more statements than their budget, failing the run
+BUDGET_OVERRUNS = []
+
+
+def count_queries(out, label, func, budget=None):
+    """Run func once, print its SQL statement count and wall time, and return its result"""
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - started) * 1000
+    statements = count_statements(queries)
+    verdict = ""
+    if budget is not None:
+        verdict = "ok" if statements <= budget else f"OVER BUDGET ({budget})"
+        if statements > budget:
+            BUDGET_OVERRUNS.append(label)
+    out.write(
+        f"{label:<40} {statements:4d} statements ({count_round_trips(queries):5d} round trips) "
+        f"{elapsed:10.2f} ms   {verdict}"
+    )
+    return result
+
+
+@scenario('tenancy')
+def bench_tenancy(out, sizes=None):
+    """Endpoint latency for one tournament while the number of tournaments grows"""
+    client = Client()
+    created = 0
+    for size in sizes or [1, 10, 100, 1000, 10000]:
+        create_tournaments(size - created, start=created)
+        created = size
+
+        tournament = Tournament.objects.get(slug=f"bench-{random.randrange(size)}")
+        team = Team.objects.filter(tournament=tournament).first()
+        round_obj = Round.objects.get(tournament=tournament, active=True)
+
+        out.write(f"--- {size} tournaments")
+        report(out, "get-round-info", measure(
+            lambda: client.get('/api/get-round-info/', {'tournament': tournament.slug}), 50))
+        report(out, "get-bets-available", measure(
+            lambda: client.get('/api/get-bets-available/', {'identifier': team.identifier}), 50))
+        report(out, "get-betting-table", measure(
+            lambda: client.get('/api/get-betting-table/', {
+                'identifier': team.identifier, 'round_id': round_obj.id
+            }), 50))
+
+
+@scenario('transitions')
+def bench_transitions(out, sizes=None):
+    """SQL statements and wall time per stage transition as the number of teams grows"""
+    for index, size in enumerate(sizes or [8, 100, 5000]):
+        tournament = create_tournaments(1, teams_per_tournament=size, start=index)[0]
+        betting_round = Round.objects.get(tournament=tournament, active=True)
+        out.write(f"--- {size} teams")
+
+        probe_round = Round.objects.create(tournament=tournament, number=0, stage="betting")
+        count_queries(out, "generate_new_odds", lambda: generate_new_odds(probe_round.id),
+                      TRANSITION_QUERY_BUDGETS['generate_new_odds'])
+
+        joust_round = count_queries(out, "move_to_joust_stage", lambda: move_to_joust_stage(betting_round.id),
+                                    TRANSITION_QUERY_BUDGETS['move_to_joust_stage'])
+
+        for game in Game.objects.filter(round=joust_round):
+            game.win = random.choice([True, False])
+            game.finished = True
+            game.save()
+
+        winners = count_queries(out, "process_winners", lambda: process_winners(joust_round.id),
+                                TRANSITION_QUERY_BUDGETS['process_winners'])
+        bonus_round = count_queries(out, "move_to_bonus_stage", lambda: move_to_bonus_stage(joust_round.id, winners),
+                                    TRANSITION_QUERY_BUDGETS['move_to_bonus_stage'])
+
+        Bonus.objects.filter(round=bonus_round).update(finished=True)
+        count_queries(out, "move_to_new_round", lambda: move_to_new_round(bonus_round.id),
+                      TRANSITION_QUERY_BUDGETS['move_to_new_round'])
+
+
+# Distances of the teams furthest ahead, the rest trailing behind them
+FINISH_LAYOUTS = {
+    'clear podium': [10, 9],
+    'two tied first': [10, 10],
+    'tied second': [10, 9, 9, 9],
+}
+
+
+@scenario('standings')
+def bench_standings(out, sizes=None):
+    """Statements and wall time of the winner and tie check as the number of teams grows"""
+    for index, size in enumerate(sizes or [8, 100, 5000]):
+        tournament = create_tournaments(1, teams_per_tournament=size, start=index)[0]
+        teams = list(Team.objects.filter(tournament=tournament).order_by('id'))
+        out.write(f"--- {size} teams")
+        for layout, leaders in FINISH_LAYOUTS.items():
+            for position, team in enumerate(teams):
+                team.distance = leaders[position] if position < len(leaders) else position % 8
+            Team.objects.bulk_update(teams, ['distance'], batch_size=1000)
+
+            first, second, _ = count_queries(out, f"check_tournament_winner, {layout}",
+                                             lambda: check_tournament_winner(tournament),
+                                             STANDINGS_QUERY_BUDGET)
+            out.write(f"    {len(first)} first, {len(second)} second")
+            report(out, f"check_tournament_winner, {layout}",
+                   measure(lambda: check_tournament_winner(tournament), 20))
+
+
+@scenario('odds')
+def bench_odds(out, sizes=None):
+    """Reference odds loop against the NumPy engine, per field and batched"""
+    rng = np.random.default_rng(0)
+    for size in sizes or [8, 100, 1000, 10000, 100000]:
+        distances = rng.integers(0, 12, size=size)
+        as_list = distances.tolist()
+        if [tuple(odds) for odds in new_odds_array(distances).tolist()] != new_odds_logic(as_list, 9):
+            raise AssertionError(f"NumPy odds differ from the reference for {size} teams")
+
+        out.write(f"--- {size} teams")
+        report(out, "new_odds_logic", measure(lambda: new_odds_logic(as_list, 9), 20))
+        report(out, "new_odds_array", measure(lambda: new_odds_array(distances, 9), 20))
+
+    tournaments = rng.integers(0, 12, size=(10000, 8))
+    rows = tournaments.tolist()
+    out.write(f"--- {len(rows)} tournaments of 8 teams")
+    report(out, "new_odds_logic per tournament", measure(
+        lambda: [new_odds_logic(row, 9) for row in rows], 5))
+    report(out, "new_odds_batch", measure(lambda: new_odds_batch(tournaments, 9), 5))
+
+
+@scenario('simulation')
+def bench_simulation(out, sizes=None):
+    """Simulator throughput, and the expected payout of the quadratic odds curve"""
+    distances = [7, 6, 5, 4, 3, 2, 1, 0]
+    odds = new_odds_array(distances, 9)
+    for runs in sizes or [10000, 100000]:
+        started = time.perf_counter()
+        result = simulate(distances, 9, runs=runs, seed=0)
+        elapsed = time.perf_counter() - started
+        out.write(f"--- {runs} tournaments in {elapsed:.2f} s ({runs / elapsed:,.0f} per second)")
+
+    # A fair odd pays back exactly the stake on average
+    out.write(f"{'distance':>8} {'P(1st)':>8} {'odd1':>5} {'payout':>7} {'P(2nd)':>8} {'odd2':>5} {'payout':>7}")
+    for distance, p1, p2, (odd1, odd2) in zip(distances, result['first'], result['second'], odds):
+        out.write(f"{distance:>8} {p1:>8.3f} {odd1:>5} {p1 * odd1:>7.2f} {p2:>8.3f} {odd2:>5} {p2 * odd2:>7.2f}")
+
+
+@scenario('calibration')
+def bench_calibration(out, sizes=None):
+    """Calibrated odds on a cache miss against a repeated position, per field size"""
+    cache = get_cache()
+    for size in sizes or [4, 8]:
+        distances = list(range(size - 1, -1, -1))
+        cache.clear()
+        miss = measure(lambda: calibrated_odds_array(distances, 9), 1)
+        hit = measure(lambda: calibrated_odds_array(distances[::-1], 9), 50)
+        out.write(f"--- {size} teams, {cache.hits} hits / {cache.misses} misses")
+        report(out, "calibrated_odds_array miss", miss)
+        report(out, "calibrated_odds_array hit", hit)
+        report(out, "new_odds_array", measure(lambda: new_odds_array(distances, 9), 50))
+
+        odds = calibrated_odds_array(distances, 9)
+        out.write(f"{'distance':>8} {'odd1':>5} {'odd2':>5}")
+        for distance, (odd1, odd2) in zip(distances, odds.tolist()):
+            out.write(f"{distance:>8} {odd1:>5} {odd2:>5}")
+
+
+def check_rounds(out, tournament, label):
+    """Report whether the tournament still has one active round and no duplicated stage"""
+    rounds = list(Round.objects.filter(tournament=tournament).values_list('number', 'stage', 'active'))
+    active = sum(1 for _, _, is_active in rounds if is_active)
+    duplicated = [key for key, count in Counter((number, stage) for number, stage, _ in rounds).items() if count > 1]
+    verdict = "ok" if active == 1 and not duplicated else f"CORRUPTED ({active} active, duplicated {duplicated})"
+    out.write(f"{label:<40} {len(rounds):4d} rounds   {verdict}")
+
+
+@scenario('concurrency', concurrent=True)
+def bench_concurrency(out, sizes=None):
+    """Many parallel copies of the request that completes a stage must transition it once"""
+    # Every rejected copy logs a warning
+    logging.disable(logging.WARNING)
+    client = Client()
+    for index, size in enumerate(sizes or [50, 200]):
+        tournament = create_tournaments(1, start=index)[0]
+        teams = list(Team.objects.filter(tournament=tournament).order_by('id'))
+        betting_round = Round.objects.get(tournament=tournament, active=True)
+        out.write(f"--- {size} parallel final submissions")
+
+        # Every team but the last bets, then the last bet arrives many times at once
+        for team in teams[:-1]:
+            client.post('/api/place-bet/', {
+                'team_id': team.id, 'bet_on_team_id': team.id, 'round_id': betting_round.id
+            }, content_type='application/json')
+        started = time.perf_counter()
+        statuses = fire_concurrently([
+            ('/api/place-bet/', {
+                'team_id': teams[-1].id, 'bet_on_team_id': teams[0].id, 'round_id': betting_round.id
+            })
+        ] * size)
+        elapsed = time.perf_counter() - started
+        out.write(f"{'place-bet':<40} {statuses.count(200):4d} accepted {len(statuses) - statuses.count(200):4d} rejected "
+                  f"in {elapsed:.2f} s")
+        check_rounds(out, tournament, "after place-bet")
+
+        # Both teams of the last unfinished game report its result many times at once
+        joust_round = Round.objects.get(tournament=tournament, active=True)
+        games = list(Game.objects.filter(round=joust_round).order_by('id'))
+        for game in games[:-1]:
+            client.post('/api/mark-game/', {
+                'team_id': game.team1_id, 'game_id': game.id, 'winner_id': game.team1_id,
+                'round_id': joust_round.id
+            }, content_type='application/json')
+        last_game = games[-1]
+        started = time.perf_counter()
+        statuses = fire_concurrently([
+            ('/api/mark-game/', {
+                'team_id': team_id, 'game_id': last_game.id, 'winner_id': team_id, 'round_id': joust_round.id
+            })
+            for team_id in [last_game.team1_id, last_game.team2_id] * (size // 2)
+        ])
+        elapsed = time.perf_counter() - started
+        out.write(f"{'mark-game':<40} {statuses.count(200):4d} accepted {len(statuses) - statuses.count(200):4d} rejected "
+                  f"in {elapsed:.2f} s")
+        check_rounds(out, tournament, "after mark-game")
+
+
+@scenario('betting-table')
+def bench_betting_table(out, sizes=None):
+    """get-betting-table latency for 1,000 teams as the bet history grows"""
+    client = Client()
+    tournament = create_tournaments(1, teams_per_tournament=1000)[0]
+    teams = list(Team.objects.filter(tournament=tournament))
+    round_obj = Round.objects.get(tournament=tournament, active=True)
+    odds = list(Odds.objects.filter(round=round_obj))
+    player = teams[0]
+
+    created = 0
+    for size in sizes or [10000, 100000, 1000000]:
+        Bet.objects.bulk_create((
+            Bet(
+                tournament=tournament,
+                team=player if i % 100 == 0 else teams[i % len(teams)],
+                bet_on_team_id=odds[i % len(odds)].team_id,
+                odds=odds[i % len(odds)],
+                round=round_obj,
+            )
+            for i in range(created, size)
+        ), batch_size=5000)
+        created = size
+        rebuild_ledger(tournament.id)
+
+        out.write(f"--- {len(teams)} teams, {size} bets")
+        params = {'identifier': player.identifier, 'round_id': round_obj.id}
+        count_queries(out, "get-betting-table", lambda: client.get('/api/get-betting-table/', params))
+        report(out, "get-betting-table", measure(lambda: client.get('/api/get-betting-table/', params), 10))
+
+
+# Statements of the final results: the active round, the two leading places
+# and the points of every team
+RESULTS_QUERY_BUDGET = 3
+
+
+@scenario('results')
+def bench_results(out, sizes=None):
+    """Final results and the bet ledger update of place_bet as the bet history grows"""
+    client = Client()
+    tournament = create_tournaments(1, teams_per_tournament=200)[0]
+    teams = list(Team.objects.filter(tournament=tournament).order_by('id'))
+    round_obj = Round.objects.get(tournament=tournament, active=True)
+    odds = list(Odds.objects.filter(round=round_obj).order_by('team_id'))
+    Round.objects.filter(id=round_obj.id).update(stage='finished')
+
+    created = 0
+    for size in sizes or [10000, 100000, 1000000]:
+        # Every team bets on every other team in turn
+        Bet.objects.bulk_create((
+            Bet(
+                tournament=tournament,
+                team=teams[i % len(teams)],
+                bet_on_team_id=odds[(i + i // len(teams)) % len(odds)].team_id,
+                odds=odds[(i + i // len(teams)) % len(odds)],
+                round=round_obj,
+            )
+            for i in range(created, size)
+        ), batch_size=5000)
+        created = size
+        rebuild_ledger(tournament.id)
+
+        out.write(f"--- {len(teams)} teams, {size} bets")
+        count_queries(out, "calculate_betting_results", lambda: calculate_betting_results(tournament),
+                      RESULTS_QUERY_BUDGET)
+        report(out, "calculate_betting_results", measure(lambda: calculate_betting_results(tournament), 10))
+        report(out, "get-tournament-results", measure(
+            lambda: client.get('/api/get-tournament-results/', {'tournament': tournament.slug}), 10))
+        # What every results request would scan without the ledger
+        report(out, "summing the bets instead", measure(lambda: ledger_totals(tournament.id), 3))
+
+        with transaction.atomic():
+            bet = Bet.objects.create(tournament=tournament, team=teams[0], bet_on_team=teams[1],
+                                     odds=odds[1], round=round_obj)
+            count_queries(out, "add_bet", lambda: add_bet(bet))
+            report(out, "add_bet", measure(lambda: add_bet(bet), 100))
+            transaction.set_rollback(True)
+
+
+def create_bets(tournament, start, stop):
+    """Bulk create bets start to stop of a tournament's active round, spread over its teams"""
+    teams = list(Team.objects.filter(tournament=tournament))
+    round_obj = Round.objects.get(tournament=tournament, active=True)
+    odds = list(Odds.objects.filter(round=round_obj))
+    Bet.objects.bulk_create((
+        Bet(
+            tournament=tournament,
+            team=teams[i % len(teams)],
+            bet_on_team_id=odds[i % len(odds)].team_id,
+            odds=odds[i % len(odds)],
+            round=round_obj,
+        )
+        for i in range(start, stop)
+    ), batch_size=5000)
+
+
+@scenario('listing')
+def bench_listing(out, sizes=None):
+    """Listing every bet of a tournament with full nesting, one nested object and foreign keys only"""
+    client = Client()
+    tournament = create_tournaments(1, teams_per_tournament=100)[0]
+
+    created = 0
+    for size in sizes or [1000, 100000]:
+        create_bets(tournament, created, size)
+        created = size
+
+        out.write(f"--- {size} bets")
+        for label, params in [
+            ("bets, full nesting", {'tournament': tournament.slug}),
+            ("bets, ?expand=team", {'tournament': tournament.slug, 'expand': 'team'}),
+            ("bets, ?compact=1", {'tournament': tournament.slug, 'compact': '1'}),
+        ]:
+            # Objects left over from the previous listing are not collected on its time
+            gc.collect()
+            response = count_queries(out, label, lambda: client.get('/api/bets/', params))
+            out.write(f"{label:<40} {len(response.content) / 1024 / 1024:10.2f} MiB")
+
+
+def traced_peak(func):
+    """Call func and return its result and the most memory it held at once, in MiB"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = func()
+        return result, tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+
+
+async def read_stream(params):
+    """Read an NDJSON stream of bets the way a client would, returning its size in bytes"""
+    response = await AsyncClient().get('/api/bets/', {**params, 'format': 'ndjson'})
+    size = 0
+    async for part in response.streaming_content:
+        size += len(part)
+    await sync_to_async(connections.close_all)()
+    return size
+
+
+@scenario('paging', concurrent=True)
+def bench_paging(out, sizes=None):
+    """Peak memory of listing every bet whole and as an NDJSON stream, and the cost of every page of it"""
+    client = Client()
+    tournament = create_tournaments(1, teams_per_tournament=100)[0]
+    params = {'tournament': tournament.slug, 'compact': '1'}
+
+    created = 0
+    for size in sizes or [100000]:
+        create_bets(tournament, created, size)
+        created = size
+
+        out.write(f"--- {size} bets")
+        response, peak = traced_peak(lambda: client.get('/api/bets/', params))
+        out.write(f"{'whole list':<40} {len(response.content) / 1024 / 1024:10.2f} MiB   peak {peak:8.2f} MiB")
+        streamed, peak = traced_peak(lambda: asyncio.run(read_stream(params)))
+        out.write(f"{'NDJSON stream':<40} {streamed / 1024 / 1024:10.2f} MiB   peak {peak:8.2f} MiB")
+
+        samples = []
+        url = '/api/bets/?' + urlencode({**params, 'page_size': ListCursorPagination.max_page_size})
+        while url:
+            started = time.perf_counter()
+            page = client.get(url).json()
+            samples.append((time.perf_counter() - started) * 1000)
+            url = page['next']
+        out.write(f"{f'{len(samples)} pages, first':<40} {samples[0]:10.2f} ms")
+        out.write(f"{f'{len(samples)} pages, last':<40} {samples[-1]:10.2f} ms")
+        report(out, f"{len(samples)} pages", samples)
+
+@scenario('export')
+def bench_export(out, sizes=None):
+    """Throughput and peak memory of exporting a tournament, against dumpdata of the whole app"""
+    tournament = create_tournaments(1, teams_per_tournament=100)[0]
+    directory = tempfile.mkdtemp()
+
+    created = 0
+    for size in sizes or [10000, 100000]:
+        create_bets(tournament, created, size)
+        created = size
+
+        out.write(f"--- {size} bets")
+        path = os.path.join(directory, 'export.jsonl.gz')
+
+        def export():
+            tournament_export = TournamentExport([tournament.id])
+            with open(path, 'wb') as file:
+                for data in tournament_export.gzip():
+                    file.write(data)
+            return tournament_export
+
+        out.write(f"{'export_tournaments':<40} {export().summary()}")
+        _, peak = traced_peak(export)
+        out.write(f"{'export_tournaments':<40} {os.path.getsize(path) / 1024 / 1024:10.2f} MiB   peak {peak:8.2f} MiB")
+
+        path = os.path.join(directory, 'dump.json')
+        started = time.perf_counter()
+        call_command('dumpdata', 'api', indent=2, output=path)
+        out.write(f"{'dumpdata api --indent 2':<40} {(time.perf_counter() - started) * 1000:10.2f} ms")
+        _, peak = traced_peak(lambda: call_command('dumpdata', 'api', indent=2, output=path))
+        out.write(f"{'dumpdata api --indent 2':<40} {os.path.getsize(path) / 1024 / 1024:10.2f} MiB   peak {peak:8.2f} MiB")
+
+    shutil.rmtree(directory)
+
+
+# Largest history loaddata is timed on, it takes minutes beyond
+LOADDATA_MAX_BETS = 100000
+
+
+@scenario('restore')
+def bench_restore(out, sizes=None):
+    """Restoring an export of a tournament with import_tournaments, against loaddata"""
+    tournament = create_tournaments(1, teams_per_tournament=100)[0]
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'export.jsonl.gz')
+
+    created = 0
+    for size in sizes or [100000, 1000000]:
+        create_bets(tournament, created, size)
+        created = size
+
+        out.write(f"--- {size} bets")
+        with open(path, 'wb') as file:
+            for data in TournamentExport([tournament.id]).gzip():
+                file.write(data)
+
+        restore = TournamentRestore(replace=True)
+        restore.run(path)
+        out.write(f"{'import_tournaments':<40} {restore.summary()}")
+
+        if size <= LOADDATA_MAX_BETS:
+            started = time.perf_counter()
+            call_command('loaddata', path, verbosity=0)
+            elapsed = time.perf_counter() - started
+            out.write(f"{'loaddata':<40} {restore.total_rows} rows in {elapsed:.2f} s, {restore.total_rows / elapsed:.0f} rows/s")
+
+    shutil.rmtree(directory)
+
+
+def create_history(tournament, numbers, bets_per_team):
+    """
+    Play a benchmark tournament through round numbers 1 to `numbers`: every
+    number gets its betting, joust and bonus rounds with odds, finished games,
+    used bonuses and `bets_per_team` bets of every team. The last betting
+    round is left active.
+    """
+    teams = list(Team.objects.filter(tournament=tournament).order_by('id'))
+    Round.objects.filter(tournament=tournament).update(active=False)
+    first_round = Round.objects.get(tournament=tournament, number=1, stage="betting")
+    Round.objects.bulk_create([
+        Round(tournament=tournament, number=number, stage=stage)
+        for number in range(1, numbers + 1)
+        for stage in ("betting", "joust", "bonus")
+        if (number, stage) != (1, "betting")
+    ])
+    rounds = {(round_obj.number, round_obj.stage): round_obj for round_obj in Round.objects.filter(tournament=tournament)}
+    Round.objects.filter(id=rounds[(numbers, "betting")].id).update(active=True)
+
+    Odds.objects.bulk_create([
+        Odds(tournament=tournament, round=rounds[(number, "betting")], team=team, odd1=10, odd2=5)
+        for number in range(2, numbers + 1)
+        for team in teams
+    ])
+    odds = {(row.round_id, row.team_id): row for row in Odds.objects.filter(tournament=tournament)}
+    Game.objects.bulk_create([
+        Game(
+            tournament=tournament, round=rounds[(number, "joust")], team1=teams[i], team2=teams[i + 1],
+            location=LOCATIONS[i // 2 % len(LOCATIONS)], finished=True, win=bool(i % 4),
+        )
+        for number in range(1, numbers + 1)
+        for i in range(0, len(teams) - 1, 2)
+    ])
+    Bonus.objects.bulk_create([
+        Bonus(
+            tournament=tournament, team=team, round=rounds[(number, "bonus")], finished=True,
+            description="", bonus_type='select_location', bonus_target=LOCATIONS[i % len(LOCATIONS)],
+        )
+        for number in range(1, numbers + 1)
+        for i, team in enumerate(teams)
+    ])
+    for number in range(1, numbers + 1):
+        betting_round = first_round if number == 1 else rounds[(number, "betting")]
+        Bet.objects.bulk_create([
+            Bet(
+                tournament=tournament, team=team, round=betting_round,
+                bet_on_team=teams[(i + j) % len(teams)],
+                odds=odds[(betting_round.id, teams[(i + j) % len(teams)].id)],
+                bet_finish=j == bets_per_team - 1,
+            )
+            for i, team in enumerate(teams)
+            for j in range(bets_per_team)
+        ], batch_size=5000)
+    rebuild_ledger(tournament.id)
+    return rounds
+
+
+def explain(func):
+    """The query plan of every SELECT func runs"""
+    with CaptureQueriesContext(connection) as queries:
+        func()
+    plans = []
+    with connection.cursor() as cursor:
+        for query in queries:
+            if query['sql'].startswith('SELECT'):
+                cursor.execute(f"{connection.ops.explain_query_prefix()} {query['sql']}")
+                plans.append("; ".join(str(row[-1]) for row in cursor.fetchall()))
+    return plans
+
+
+# The migration adding the lookup indexes, and the one before it
+LOOKUP_INDEXES_MIGRATION = '0007_lookup_indexes'
+BEFORE_LOOKUP_INDEXES = '0006_tournament_version'
+
+
+@scenario('indexes')
+def bench_indexes(out, sizes=None):
+    """Plans and latency of the hot lookups on a long tournament history, without and with the lookup indexes"""
+    teams_per_tournament = 100
+    bets_per_team = 40
+    for index, size in enumerate(sizes or [1000000]):
+        tournament = create_tournaments(1, teams_per_tournament=teams_per_tournament, start=index)[0]
+        numbers = max(2, size // (teams_per_tournament * bets_per_team))
+        rounds = create_history(tournament, numbers, bets_per_team)
+        team = Team.objects.filter(tournament=tournament).order_by('id')[teams_per_tournament // 2]
+        number = numbers // 2
+        betting_round = rounds[(number, "betting")]
+        active_round = rounds[(numbers, "betting")]
+
+        lookups = [
+            ("active round", lambda: Round.objects.filter(tournament=tournament, active=True).first()),
+            ("round by number and stage", lambda: Round.objects.filter(
+                tournament=tournament, number=number, stage="joust").first()),
+            ("bets of a team in a round", lambda: Bet.objects.filter(team=team, round=betting_round).count()),
+            ("odds of a team in a round", lambda: Odds.objects.filter(round=betting_round, team=team).first()),
+            ("bonus of a team in a round", lambda: Bonus.objects.filter(
+                team=team, round=rounds[(number, "bonus")], finished=True).first()),
+            ("teams at a selected location", lambda: Bonus.objects.filter(
+                tournament=tournament, round__number=number, bonus_type='select_location',
+                bonus_target=LOCATIONS[0], finished=True).count()),
+            ("game of a team in a round", lambda: Game.objects.filter(
+                Q(team1=team) | Q(team2=team), round=rounds[(number, "joust")]).first()),
+            ("stage statuses", lambda: stage_statuses_by_team(active_round)),
+        ]
+
+        out.write(f"--- {Bet.objects.count()} bets, {Round.objects.count()} rounds")
+        results = {}
+        for state, migration in [("before", BEFORE_LOOKUP_INDEXES), ("after", LOOKUP_INDEXES_MIGRATION)]:
+            call_command('migrate', 'api', migration, verbosity=0)
+            # Planner statistics, like a long-running database has
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+            for label, func in lookups:
+                results[label, state] = (statistics.median(measure(func, 20)), explain(func))
+
+        for label, _ in lookups:
+            before, before_plans = results[label, "before"]
+            after, after_plans = results[label, "after"]
+            out.write(f"{label:<40} before {before:9.2f} ms   after {after:9.2f} ms   {before / after:7.1f}x")
+            for plan in before_plans:
+                out.write(f"    before: {plan}")
+            for plan in after_plans:
+                out.write(f"    after:  {plan}")
+
+
+@scenario('event-log')
+def bench_event_log(out, sizes=None):
+    """Appending an event and tailing the log as the log of one tournament grows"""
+    tournament = create_tournaments(1)[0]
+    other = create_tournaments(1, start=1)[0]
+    created = 0
+    for size in sizes or [10000, 100000, 1000000]:
+        # Another tournament's log of the same length shares the table
+        for owner in (tournament, other):
+            TournamentEvent.objects.bulk_create((
+                TournamentEvent(tournament=owner, seq=seq, event_type='game_marked', data={'game': seq, 'win': True})
+                for seq in range(created + 1, size + 1)
+            ), batch_size=5000)
+        created = size
+        out.write(f"--- {size} events per tournament")
+
+        with transaction.atomic():
+            count_queries(out, "record_event", lambda: record_event(tournament.id, 'teams_moved', teams=[]))
+            report(out, "record_event", measure(
+                lambda: record_event(tournament.id, 'teams_moved', teams=[]), 100))
+            transaction.set_rollback(True)
+        for label, after in (("tail from the start", 0), ("tail from the end", size - TAIL_LIMIT)):
+            report(out, label, measure(lambda: list(tail(tournament.id, after)), 20))
+
+        seq_query = Tournament.objects.filter(id=tournament.id).annotate(next=next_seq(tournament.id)).values('next')
+        for label, func in (("next seq", lambda: list(seq_query)), ("tail", lambda: list(tail(tournament.id, size)))):
+            for plan in explain(func):
+                out.write(f"    {label}: {plan}")
+
+
+@scenario('replay')
+def bench_replay(out, sizes=None):
+    """Rebuilding a tournament from its event log against playing it, as the history grows"""
+    # Rejected bonuses log a warning
+    logging.disable(logging.WARNING)
+    client = Client()
+    for index, rounds in enumerate(sizes or [10, 50, 200]):
+        tournament = create_tournaments(1, start=index)[0]
+        # Nobody finishes before the last round
+        Tournament.objects.filter(id=tournament.id).update(finish_distance=10 * rounds)
+        take_checkpoint(tournament.id)
+
+        started = time.perf_counter()
+        play_rounds(client, tournament, rounds)
+        played = (time.perf_counter() - started) * 1000
+        events = TournamentEvent.objects.filter(tournament=tournament).count()
+        out.write(f"--- {rounds} rounds, {events} events")
+        out.write(f"{'played through the endpoints':<40} {played:10.2f} ms   {events / played * 1000:8.0f} events/s")
+
+        replay = TournamentReplay(tournament.id, save_checkpoints=False)
+        samples = measure(lambda: replay.run(), 5)
+        report(out, "replay from the start", samples)
+        out.write(f"    {events / statistics.median(samples) * 1000:.0f} events/s, "
+                  f"{played / statistics.median(samples):.0f}x faster than playing")
+        differences = database_differences(TournamentReplay(tournament.id, save_checkpoints=False).run())
+        out.write(f"    replayed state {'matches the database' if not differences else f'DIFFERS: {differences[:3]}'}")
+
+        middle = rounds // 2
+        report(out, f"state at round {middle}, no checkpoints", measure(
+            lambda: TournamentReplay(tournament.id, save_checkpoints=False).run(round_number=middle), 5))
+        checkpointing = TournamentReplay(tournament.id)
+        checkpointing.run()
+        out.write(f"    {checkpointing.checkpoints_written} checkpoints written every {CHECKPOINT_ROUNDS} rounds")
+        report(out, f"state at round {middle}, checkpointed", measure(
+            lambda: TournamentReplay(tournament.id, save_checkpoints=False).run(round_number=middle), 5))
+    logging.disable(logging.NOTSET)
+
+
+@scenario('dashboard')
+def bench_dashboard(out, sizes=None):
+    """SQL statements and latency of team-stage-statuses as the number of teams grows"""
+    client = Client()
+    for index, size in enumerate(sizes or [8, 100, 1000]):
+        tournament = create_tournaments(1, teams_per_tournament=size, start=index)[0]
+        bonus_round = create_stage_progress(tournament)
+
+        out.write(f"--- {size} teams")
+        params = {'round_id': bonus_round.id}
+        count_queries(out, "team-stage-statuses", lambda: client.get('/api/team-stage-statuses/', params),
+                      TEAM_STAGE_STATUSES_QUERY_BUDGET)
+        report(out, "team-stage-statuses", measure(lambda: client.get('/api/team-stage-statuses/', params), 20))
+
+
+@scenario('polling')
+def bench_polling(out, sizes=None):
+    """Full responses against 304 Not Modified for the polled read endpoints"""
+    client = Client()
+    for index, size in enumerate(sizes or [8, 1000]):
+        tournament = create_tournaments(1, teams_per_tournament=size, start=index)[0]
+        team = Team.objects.filter(tournament=tournament).first()
+        round_obj = Round.objects.get(tournament=tournament, active=True)
+        out.write(f"--- {size} teams")
+        for label, path, params in [
+            ("get-round-info", '/api/get-round-info/', {'tournament': tournament.slug}),
+            ("get-betting-table", '/api/get-betting-table/', {
+                'identifier': team.identifier, 'round_id': round_obj.id
+            }),
+        ]:
+            etag = client.get(path, params)['ETag']
+            count_queries(out, f"{label} 200", lambda: client.get(path, params))
+            count_queries(out, f"{label} 304", lambda: client.get(path, params, HTTP_IF_NONE_MATCH=etag), 1)
+            report(out, f"{label} 200", measure(lambda: client.get(path, params), 20))
+            report(out, f"{label} 304", measure(lambda: client.get(path, params, HTTP_IF_NONE_MATCH=etag), 20))
+
+
+@scenario('cache')
+def bench_cache(out, sizes=None):
+    """Player read endpoints on a cache miss against a hit, and the identity of both responses"""
+    client = Client()
+    response_cache = get_response_cache()
+    for index, size in enumerate(sizes or [8, 1000]):
+        tournament = create_tournaments(1, teams_per_tournament=size, start=index)[0]
+        team = Team.objects.filter(tournament=tournament).first()
+        round_obj = Round.objects.get(tournament=tournament, active=True)
+        player = {'identifier': team.identifier, 'round_id': round_obj.id}
+        out.write(f"--- {size} teams")
+        for label, path, params in [
+            ("get-bets-available", '/api/get-bets-available/', {'identifier': team.identifier}),
+            ("get-next-opponent", '/api/get-next-opponent/', player),
+            ("get-bonus-for-team", '/api/get-bonus-for-team/', player),
+            ("get-betting-table", '/api/get-betting-table/', player),
+            ("get-tournament-settings", '/api/get-tournament-settings/', {'tournament': tournament.slug}),
+        ]:
+            def miss():
+                response_cache.clear()
+                return client.get(path, params)
+
+            fresh = count_queries(out, f"{label} miss", miss)
+            cached = count_queries(out, f"{label} hit", lambda: client.get(path, params))
+            if cached.content != fresh.content:
+                out.write(f"{label}: cached response differs from the fresh one")
+            report(out, f"{label} miss", measure(miss, 20))
+            report(out, f"{label} hit", measure(lambda: client.get(path, params), 20))
+
+    stats = response_cache.stats()
+    out.write(f"{stats['backend']}: {stats['hits']} hits, {stats['misses']} misses")
+
+
+# Maximum number of SQL statements player-state may issue, independent of
+# the number of teams
+PLAYER_STATE_QUERY_BUDGET = 6
+
+
+@scenario('player-state')
+def bench_player_state(out, sizes=None):
+    """One player-state call against the separate calls a player page made before"""
+    client = Client()
+    for index, size in enumerate(sizes or [8, 1000]):
+        tournament = create_tournaments(1, teams_per_tournament=size, start=index)[0]
+        team = Team.objects.filter(tournament=tournament).first()
+        round_obj = Round.objects.get(tournament=tournament, active=True)
+        player = {'identifier': team.identifier, 'round_id': round_obj.id}
+        separate_calls = [
+            ('/api/get-round-info/', {'tournament': tournament.slug}),
+            ('/api/get-tournament-settings/', {'tournament': tournament.slug}),
+            ('/api/teams/', {'identifier': team.identifier}),
+            ('/api/get-bets-available/', {'identifier': team.identifier}),
+            ('/api/get-next-opponent/', player),
+            ('/api/get-bonus-for-team/', player),
+            ('/api/get-betting-table/', player),
+        ]
+
+        def separately():
+            # Every call misses the response cache, like the first load of a round
+            get_response_cache().clear()
+            return [client.get(path, params) for path, params in separate_calls]
+
+        def player_state(**headers):
+            return client.get('/api/player-state/', {'identifier': team.identifier}, **headers)
+
+        out.write(f"--- {size} teams")
+        count_queries(out, f"{len(separate_calls)} separate calls", separately)
+        response = count_queries(out, "player-state", player_state, PLAYER_STATE_QUERY_BUDGET)
+        report(out, f"{len(separate_calls)} separate calls", measure(separately, 20))
+        report(out, "player-state", measure(player_state, 20))
+
+        # A client knowing every section, after a write changed the tournament
+        section_etags = ", ".join(section['etag'] for section in response.json()['sections'].values())
+        Tournament.objects.filter(id=tournament.id).update(version=F('version') + 1)
+        unchanged = player_state(HTTP_IF_NONE_MATCH=section_etags)
+        out.write(f"{'player-state bytes, all sections':<40} {len(response.content):10d}")
+        out.write(f"{'player-state bytes, nothing changed':<40} {len(unchanged.content):10d}")
+
+# Dashboard clients whose allocations the websocket scenario traces
+WEBSOCKET_MEMORY_SAMPLE = 100
+
+
+async def hold_subscribers(out, tournament, size):
+    """Connect size dashboard clients, publish one diff to all of them, then disconnect them"""
+    scope = {'type': 'websocket', 'path': '/ws/dashboard/', 'query_string': f"tournament={tournament.slug}".encode()}
+    sent = {'count': 0, 'expected': 0}
+    all_sent = asyncio.Event()
+
+    async def send(message):
+        if message['type'] == 'websocket.send':
+            sent['count'] += 1
+            if sent['count'] == sent['expected']:
+                all_sent.set()
+
+    # Every client sends its connect message up front and then idles
+    inboxes = []
+    clients = []
+
+    async def connect(count):
+        sent['count'] = 0
+        sent['expected'] = count
+        all_sent.clear()
+        for _ in range(count):
+            inbox = asyncio.Queue()
+            inbox.put_nowait({'type': 'websocket.connect'})
+            inboxes.append(inbox)
+            clients.append(asyncio.ensure_future(dashboard_feed(scope, inbox.get, send)))
+        # Every client received its snapshot
+        if count:
+            await all_sent.wait()
+
+    # Tracing allocations slows everything down, so only a sample of the
+    # clients is traced for its memory
+    sample = min(size, WEBSOCKET_MEMORY_SAMPLE)
+    started = time.perf_counter()
+    await connect(size - sample)
+    out.write(f"{f'connect and snapshot, {size - sample} clients':<40} {(time.perf_counter() - started) * 1000:10.2f} ms")
+
+    tracemalloc.start()
+    memory_before = tracemalloc.get_traced_memory()[0]
+    await connect(sample)
+    memory = tracemalloc.get_traced_memory()[0] - memory_before
+    tracemalloc.stop()
+    out.write(f"{'memory per idle subscriber':<40} {memory / sample / 1024:10.2f} KiB")
+
+    # Fan one diff out to everybody, like a placed bet would
+    team = await sync_to_async(Team.objects.filter(tournament=tournament).first)()
+    diff = {
+        'type': 'bet_placed',
+        'teams': TeamSerializer([team], many=True).data,
+        'bet': {'id': 1, 'team': team.id, 'bet_on_team': team.id, 'round': 1, 'bet_finish': True},
+    }
+    sent['count'] = 0
+    sent['expected'] = size
+    all_sent.clear()
+    started = time.perf_counter()
+    hub.deliver(DASHBOARD_TOPIC, tournament.id, diff)
+    await all_sent.wait()
+    out.write(f"{'fan-out of one diff':<40} {(time.perf_counter() - started) * 1000:10.2f} ms")
+
+    for inbox in inboxes:
+        inbox.put_nowait({'type': 'websocket.disconnect'})
+    await asyncio.gather(*clients)
+    leaked = hub.has_subscribers(DASHBOARD_TOPIC, tournament.id)
+    out.write(f"{'subscriptions left after disconnect':<40} {'yes' if leaked else 'none'}")
+    await sync_to_async(connections.close_all)()
+
+
+@scenario('websocket', concurrent=True)
+def bench_websocket(out, sizes=None):
+    """Idle dashboard feed subscribers held by one worker, and the fan-out of a diff to all of them"""
+    for index, size in enumerate(sizes or [5000]):
+        tournament = create_tournaments(1, start=index)[0]
+        out.write(f"--- {size} subscribers")
+        asyncio.run(hold_subscribers(out, tournament, size))
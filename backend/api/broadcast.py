@@ -0,0 +1,254 @@
+"""
+Broadcast of tournament changes to long-lived client connections.
+
+Messages are published per tournament on one of two topics. Every committed
+write publishes the round, stage and version of its tournament on the
+"state" topic, served by the Server-Sent Events endpoint through
+`event_stream`. Writes also publish what they changed on the "dashboard"
+topic, served by the dashboard WebSocket feed in `live.py`.
+
+Subscribers live in the in-process `Hub` of the worker serving them, and a
+pluggable backend carries published messages to the hubs: "local" delivers
+inside the publishing process only, "postgres" fans out to every worker
+through LISTEN/NOTIFY, sending RESYNC in place of messages too large for a
+notification. Any other value of TOURNAMENT_BROADCAST_BACKEND is
+imported as the dotted path of a backend class.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils.module_loading import import_string
+
+from .models import Tournament, Round
+
+logger = logging.getLogger(__name__)
+
+# Postgres channel the "postgres" backend notifies on
+CHANNEL = "tournament_broadcast"
+
+# Postgres rejects notification payloads of this many bytes or more
+NOTIFY_PAYLOAD_LIMIT = 8000
+
+STATE_TOPIC = "state"
+DASHBOARD_TOPIC = "dashboard"
+
+# Messages a subscriber may fall behind by. A subscriber overflowing its queue
+# loses the queued messages and receives RESYNC instead, telling it to reload
+# the full state.
+SUBSCRIBER_QUEUE_SIZE = 256
+RESYNC = {'type': 'resync'}
+
+
+class Hub:
+    """Subscribers of this process, grouped by topic and tournament"""
+
+    def __init__(self):
+        self.subscribers = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def subscription(self, topic, tournament_id):
+        """Register a queue receiving the messages published for a tournament"""
+        key = (topic, tournament_id)
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE))
+        with self.lock:
+            self.subscribers.setdefault(key, set()).add(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self.lock:
+                self.subscribers[key].discard(subscriber)
+                if not self.subscribers[key]:
+                    del self.subscribers[key]
+
+    def has_subscribers(self, topic, tournament_id):
+        return (topic, tournament_id) in self.subscribers
+
+    def deliver(self, topic, tournament_id, message):
+        """Hand a message to every subscriber of the tournament, from any thread"""
+        with self.lock:
+            subscribers = list(self.subscribers.get((topic, tournament_id), ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(offer, queue, message)
+            except RuntimeError:
+                # The subscriber's event loop is closed, it unsubscribes on its own
+                pass
+
+
+def offer(queue, message):
+    """Queue a message, or replace the backlog of a lagging subscriber with RESYNC"""
+    if queue.full():
+        while not queue.empty():
+            queue.get_nowait()
+        message = RESYNC
+    queue.put_nowait(message)
+
+
+class LocalBackend:
+    """Delivers messages to the subscribers of the publishing process only"""
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def start(self):
+        pass
+
+    def has_audience(self, topic, tournament_id):
+        return self.hub.has_subscribers(topic, tournament_id)
+
+    def publish(self, topic, tournament_id, message):
+        self.hub.deliver(topic, tournament_id, message)
+
+
+class PostgresBackend:
+    """
+    Fans messages out to every worker process through Postgres NOTIFY. Each
+    process runs one listener thread feeding its own hub.
+    """
+
+    def __init__(self, hub):
+        self.hub = hub
+        self.listener = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.listener is None:
+                self.listener = threading.Thread(target=self.listen, name="tournament-broadcast-listener", daemon=True)
+                self.listener.start()
+
+    def has_audience(self, topic, tournament_id):
+        # Subscribers of other processes are not known here
+        return True
+
+    def publish(self, topic, tournament_id, message):
+        payload = notify_payload(topic, tournament_id, message)
+        with connections['default'].cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, payload])
+
+    def listen(self):
+        database = connections['default']
+        while True:
+            try:
+                connection = database.get_new_connection(database.get_connection_params())
+                connection.autocommit = True
+                with connection:
+                    connection.execute(f"LISTEN {CHANNEL}")
+                    for notification in connection.notifies():
+                        payload = json.loads(notification.payload)
+                        self.hub.deliver(payload['topic'], payload['tournament'], payload['message'])
+            except Exception as e:
+                logger.error("Tournament broadcast listener lost its connection: %s", e)
+                time.sleep(1)
+
+
+def notify_payload(topic, tournament_id, message):
+    """
+    The notification carrying a message to the other workers. A message too
+    large for one, like the diff of a transition in a large tournament, is
+    replaced by RESYNC, so its subscribers reload the full state instead.
+    """
+    payload = json.dumps({'topic': topic, 'tournament': tournament_id, 'message': message}, default=str)
+    if len(payload.encode()) >= NOTIFY_PAYLOAD_LIMIT:
+        logger.debug("Resyncing %s of tournament %s, its %d byte message is too large to notify",
+                     topic, tournament_id, len(payload.encode()))
+        payload = json.dumps({'topic': topic, 'tournament': tournament_id, 'message': RESYNC})
+    return payload
+
+
+BACKENDS = {
+    'local': LocalBackend,
+    'postgres': PostgresBackend,
+}
+
+hub = Hub()
+_backend = None
+
+
+def get_backend():
+    """Return the broadcast backend of this process, configured from settings"""
+    global _backend
+    if _backend is None:
+        name = settings.TOURNAMENT_BROADCAST_BACKEND
+        backend_class = BACKENDS[name] if name in BACKENDS else import_string(name)
+        _backend = backend_class(hub)
+    return _backend
+
+
+def tournament_state(tournament_id):
+    """The active round and version of a tournament, as sent to subscribers"""
+    version = Tournament.objects.values_list('version', flat=True).get(id=tournament_id)
+    active_round = Round.objects.filter(tournament_id=tournament_id, active=True).first()
+    return {
+        'tournament_id': tournament_id,
+        'version': version,
+        'round_id': active_round.id if active_round else None,
+        'stage': active_round.stage if active_round else None,
+        'number': active_round.number if active_round else None,
+    }
+
+
+def publish_on_commit(topic, tournament_id, build_message):
+    """
+    Publish a message once the current transaction commits. The message is
+    only built, by calling build_message, if anybody subscribed to it.
+    """
+    def publish():
+        backend = get_backend()
+        if backend.has_audience(topic, tournament_id):
+            try:
+                backend.publish(topic, tournament_id, build_message())
+            except Exception as e:
+                # Subscribers resync with the next change, the write itself succeeded
+                logger.exception("Failed to publish %s of tournament %s: %s", topic, tournament_id, e)
+    transaction.on_commit(publish)
+
+
+def publish_state_on_commit(tournament_id):
+    """Publish the tournament's state once the current transaction commits"""
+    publish_on_commit(STATE_TOPIC, tournament_id, lambda: tournament_state(tournament_id))
+
+
+def publish_diff_on_commit(tournament_id, build_diff):
+    """Publish what a write changed to the dashboard once it commits"""
+    publish_on_commit(DASHBOARD_TOPIC, tournament_id, build_diff)
+
+
+def format_event(state):
+    return f"id: {state['version']}\nevent: round\ndata: {json.dumps(state)}\n\n"
+
+
+async def event_stream(tournament_id):
+    """
+    Yield the tournament's state as Server-Sent Events: the current state
+    first, then every newer one as it is published.
+    """
+    get_backend().start()
+    with hub.subscription(STATE_TOPIC, tournament_id) as queue:
+        # Subscribed before reading, so a change in between is not missed
+        state = await sync_to_async(tournament_state)(tournament_id)
+        last_version = state['version']
+        yield format_event(state)
+
+        while True:
+            try:
+                state = await asyncio.wait_for(queue.get(), settings.TOURNAMENT_EVENTS_KEEPALIVE)
+            except asyncio.TimeoutError:
+                # Keep proxies from closing an idle connection, and tell
+                # the client the stream is alive
+                yield "event: keepalive\ndata: {}\n\n"
+                continue
+            # Compared by value, RESYNC from other workers is decoded anew
+            if state == RESYNC:
+                state = await sync_to_async(tournament_state)(tournament_id)
+            if state['version'] > last_version:
+                last_version = state['version']
+                yield format_event(state)
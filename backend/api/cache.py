@@ -0,0 +1,103 @@
+"""
+Read-through cache of the polled player endpoints.
+
+Responses are stored in Django's cache under the tournament their data
+comes from, the team they are for, the endpoint and the query parameters.
+Writes bump the cache version of what they changed, in the transaction
+making the change: the teams whose own rows they changed, or the whole
+tournament for stage transitions, admin edits and other writes reaching
+every team. From the next request on exactly those entries are no longer
+read; they expire on their own. Endpoints showing every team of the
+tournament are keyed on its version instead, which every write bumps.
+
+The status and data of a response are cached rather than the rendered
+bytes, so a cached response is rendered exactly like a fresh one. The hit
+and miss counts are kept in the cache too, so every process sharing it
+counts together.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+# Returned by ResponseCache.get on a miss
+MISSING = object()
+
+# Cache keys of the hit and miss counts
+STATS_KEYS = {'hits': 'response-cache:hits', 'misses': 'response-cache:misses'}
+
+
+class ResponseCache:
+    """Cached status and data of read endpoint responses, with their hit and miss counts"""
+
+    def __init__(self, alias, timeout):
+        self.alias = alias
+        self.timeout = timeout
+
+    @staticmethod
+    def key(tournament, team, endpoint, params, every_write=False):
+        """
+        Cache key of a response; params are the request's query parameters.
+        every_write keys it on the tournament version rather than the cache
+        versions of the tournament and the team.
+        """
+        if every_write:
+            scope = f"tournament:{tournament.id}:version:{tournament.version}"
+        else:
+            scope = f"tournament:{tournament.id}:cache:{tournament.cache_version}"
+            if team is not None:
+                scope += f":team:{team.id}:{team.cache_version}"
+        query = "&".join(f"{name}={value}" for name, values in sorted(params.lists()) for value in values)
+        digest = hashlib.sha1(query.encode()).hexdigest()
+        return f"{scope}:{endpoint}:{digest}"
+
+    def get(self, key):
+        data = caches[self.alias].get(key, MISSING)
+        self.count('misses' if data is MISSING else 'hits')
+        return data
+
+    def set(self, key, data):
+        caches[self.alias].set(key, data, self.timeout)
+
+    def count(self, name):
+        cache = caches[self.alias]
+        try:
+            cache.incr(STATS_KEYS[name])
+        except ValueError:
+            # First count since the cache was cleared
+            cache.add(STATS_KEYS[name], 1, None)
+
+    def stats(self):
+        counts = caches[self.alias].get_many(STATS_KEYS.values())
+        hits = counts.get(STATS_KEYS['hits'], 0)
+        misses = counts.get(STATS_KEYS['misses'], 0)
+        return {
+            'backend': caches[self.alias].__class__.__name__,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / (hits + misses) if hits + misses else None,
+        }
+
+    def clear(self):
+        """Drop every cached response, keeping the hit and miss counts"""
+        cache = caches[self.alias]
+        counts = cache.get_many(STATS_KEYS.values())
+        cache.clear()
+        cache.set_many(counts, None)
+
+    def reset_stats(self):
+        caches[self.alias].delete_many(STATS_KEYS.values())
+
+
+_cache = None
+
+
+def get_response_cache():
+    """Return the response cache, configured from settings"""
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache(
+            settings.TOURNAMENT_RESPONSE_CACHE,
+            settings.TOURNAMENT_RESPONSE_CACHE_TIMEOUT,
+        )
+    return _cache
@@ -0,0 +1,250 @@
+"""
+Odds calibrated by simulation.
+
+Instead of the fixed quadratic curve, `calibrated_odds_array` prices every
+team from its simulated chance of finishing first and second. Simulated
+positions are memoised on the sorted distance multiset plus the finish
+distance, in an LRU cache with an optional on-disk store, so a position
+seen in an earlier round or another tournament is never simulated twice.
+
+Simulating a new position can take TOURNAMENT_CALIBRATION_TIME_BUDGET, too
+long to hold the tournament lock for. The write endpoints defer simulations:
+a missing position raises SimulationNeeded, and tournament_locked simulates
+it once the transaction is rolled back and the lock released, then runs the
+request again.
+"""
+import fcntl
+import logging
+import shelve
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+
+from .odds import new_odds_array
+from .simulation import simulate
+
+logger = logging.getLogger(__name__)
+
+# Share of the stake a bet pays back on average
+PAYOUT_RATIO = 0.9
+
+# Odds never exceed what the quadratic curve pays the last team
+MAX_ODD = 31
+
+# Simulated tournaments per batch while a cache miss spends its time budget
+BATCH_RUNS = 1000
+
+
+class SimulationNeeded(BaseException):
+    """
+    Raised for a position missing from the cache while simulations are
+    deferred. Like GeneratorExit it is a BaseException, so the catch-all
+    handlers of the write endpoints let it through to tournament_locked.
+    """
+
+    def __init__(self, key):
+        super().__init__(key)
+        self.key = key
+
+    def simulate(self):
+        """Simulate the position into the cache, False when it cannot be simulated"""
+        return calibrate(self.key) is not None
+
+
+# Whether the current thread defers simulations, see simulations_deferred
+deferral = threading.local()
+
+
+@contextmanager
+def simulations_deferred():
+    """Raise SimulationNeeded for positions missing from the cache, rather than simulating them"""
+    deferral.active = True
+    try:
+        yield
+    finally:
+        deferral.active = False
+
+
+class SimulationCache:
+    """
+    LRU cache of simulated positions, optionally backed by a shelve file.
+    The dbm file behind a shelve may be opened by one writer at a time, so
+    every process opens it holding an exclusive lock on a file next to it.
+    """
+
+    def __init__(self, max_size, path=None):
+        self.max_size = max_size
+        self.path = path
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def shelf_key(key):
+        distances, finish_distance = key
+        return f"{finish_distance}:{','.join(map(str, distances))}"
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+
+            value = None
+            if self.path:
+                with self.shelf() as shelf:
+                    value = shelf.get(self.shelf_key(key))
+            if value is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._remember(key, value)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self._remember(key, value)
+            if self.path:
+                with self.shelf() as shelf:
+                    shelf[self.shelf_key(key)] = value
+
+    @contextmanager
+    def shelf(self):
+        """Open the shelve file, holding its lock against every other process"""
+        with open(f"{self.path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                with shelve.open(self.path) as shelf:
+                    yield shelf
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+    def _remember(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+_cache = None
+
+
+def get_cache():
+    """Return the process-wide simulation cache, configured from settings"""
+    global _cache
+    if _cache is None:
+        _cache = SimulationCache(
+            settings.TOURNAMENT_CALIBRATION_CACHE_SIZE,
+            settings.TOURNAMENT_CALIBRATION_CACHE_PATH,
+        )
+    return _cache
+
+
+def simulate_position(distances, finish_distance):
+    """
+    Simulate a position until the run count or the time budget is reached.
+
+    Returns a dict mapping every distance in the position to the
+    (first, second) place probability of a team standing there.
+    """
+    runs = settings.TOURNAMENT_CALIBRATION_RUNS
+    deadline = time.monotonic() + settings.TOURNAMENT_CALIBRATION_TIME_BUDGET
+    seed = zlib.crc32(repr((distances, finish_distance)).encode())
+
+    first = np.zeros(len(distances))
+    second = np.zeros(len(distances))
+    played = 0
+    while played < runs and (played == 0 or time.monotonic() < deadline):
+        batch = min(BATCH_RUNS, runs - played)
+        result = simulate(distances, finish_distance, runs=batch, workers=1, seed=seed + played)
+        first += result['first'] * batch
+        second += result['second'] * batch
+        played += batch
+
+    if played < runs:
+        logger.warning("Calibration of %s stopped after %d of %d runs", distances, played, runs)
+
+    # Teams at the same distance are interchangeable, so pool their results
+    probabilities = {}
+    for distance in set(distances):
+        at_distance = [i for i, d in enumerate(distances) if d == distance]
+        probabilities[distance] = (
+            float(first[at_distance].sum() / played / len(at_distance)),
+            float(second[at_distance].sum() / played / len(at_distance)),
+        )
+    return probabilities
+
+
+def calibrate(key):
+    """
+    Return the place probabilities of a position, simulating it into the
+    cache when missing, or None when the simulator cannot pair the field
+    """
+    cache = get_cache()
+    probabilities = cache.get(key)
+    if probabilities is None:
+        try:
+            probabilities = simulate_position(list(key[0]), key[1])
+        except ValueError as e:
+            logger.warning("Falling back to quadratic odds: %s", e)
+            return None
+        cache.set(key, probabilities)
+    return probabilities
+
+
+def odds_from_probability(probability):
+    """Odd paying back PAYOUT_RATIO of the stake on average"""
+    if probability <= 0:
+        return MAX_ODD
+    return int(min(MAX_ODD, max(1, round(PAYOUT_RATIO / probability))))
+
+
+def calibrated_odds_array(distances, finish_distance):
+    """
+    Calculate odds for a field of teams from simulated place probabilities.
+
+    The leader and level-field rules of the quadratic curve still apply;
+    only the curve itself is replaced. Fields the simulator cannot pair fall
+    back to the quadratic curve.
+
+    Args:
+        distances: 1-D array of team distances
+        finish_distance: Distance needed to finish the tournament
+
+    Returns:
+        Integer array of shape (teams, 2) holding (odd1, odd2)
+    """
+    odds = new_odds_array(distances, finish_distance)
+    distances = np.asarray(distances, dtype=np.int64)
+    if len(distances) == 0 or distances.min() == distances.max():
+        return odds
+
+    key = (tuple(sorted(distances.tolist())), finish_distance)
+    if getattr(deferral, 'active', False):
+        probabilities = get_cache().get(key)
+        if probabilities is None:
+            raise SimulationNeeded(key)
+    else:
+        probabilities = calibrate(key)
+    if probabilities is None:
+        return odds
+
+    leader = distances == distances.max()
+    for i, distance in enumerate(distances.tolist()):
+        if not leader[i]:
+            first, second = probabilities[distance]
+            odds[i] = (odds_from_probability(first), odds_from_probability(second))
+    return odds
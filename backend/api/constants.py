@@ -0,0 +1,7 @@
+# locations
+LOCATIONS = [
+    "Biblioteka",
+    "Stalas",
+    "Sofa",
+    "Lova"
+]
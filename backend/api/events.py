@@ -0,0 +1,158 @@
+"""
+Append-only log of the changes made to every tournament.
+
+Every write appends a TournamentEvent in the transaction that makes its
+changes, so the log holds exactly the committed writes in the order they
+were made. `seq` numbers the events of a tournament from 1 without gaps:
+the next number is read from the (tournament, seq) index by the insert
+itself, which every write does holding the tournament lock: the write
+endpoints, the ViewSet creates and admin edits alike. A reader
+tails the log by asking for the events after the last seq it has seen.
+
+Rows are recorded as `event_row` writes them: every concrete field but the
+timestamps, the tournament version and the pending counters of rounds,
+which follow from the other rows, with foreign keys as ids under the
+field's name. The data of each
+type is:
+
+- bet_placed: `bet`, the new bet. The betting team has one bet less.
+- game_marked: `game` and `win` of the game. The winner's win streak grows
+  and its location loss streak resets, the loser's win streak resets and
+  its location loss streak grows when the game was at LOCATIONS[0].
+- teams_moved: `teams`, the id and new distance of every team that moved.
+- bonus_used: `bonus`, the used bonus, and `teams`, the id, distance and
+  bets available of every team it changed.
+- round_changed: `round`, the id of the round made active, `previous`, the
+  id of the round made inactive, `created`, the new rows by model label,
+  and `bets_granted`, the bets every team received.
+- rows_saved and rows_deleted: `model`, and the `rows` saved or the `ids`
+  deleted by an admin or a ViewSet create.
+"""
+import threading
+
+from django.db import models
+from django.db.models.functions import Coalesce
+
+from .models import TournamentEvent
+
+# Events returned by one tail request
+TAIL_LIMIT = 500
+MAX_TAIL_LIMIT = 5000
+
+# Not recorded in rows: timestamps and the cache versions change on every
+# write, and the pending counters are set after their round is created
+UNRECORDED_FIELDS = {
+    'created', 'modified', 'version', 'cache_version', 'pending_bets', 'pending_games', 'pending_bonuses',
+}
+
+# Marks a tournament changed as a whole in the changes taken by take_changes
+WHOLE_TOURNAMENT = None
+
+
+# Events recorded by each thread, so a write endpoint can tell whether it wrote
+# anything, and the teams they changed by tournament, for bump_version
+recorded = threading.local()
+
+
+def recorded_fields(model):
+    """The fields of a model events record"""
+    return [field for field in model._meta.concrete_fields if field.name not in UNRECORDED_FIELDS]
+
+
+def event_row(instance):
+    """The fields of a model instance as events record them"""
+    return {field.name: getattr(instance, field.attname) for field in recorded_fields(type(instance))}
+
+
+def team_changes(teams, *fields):
+    """The id and the given fields of every team a write changed"""
+    return [{'id': team.id, **{field: getattr(team, field) for field in fields}} for team in teams]
+
+
+def next_seq(tournament_id):
+    """The seq of a tournament's next event, read by the insert itself"""
+    last_seq = TournamentEvent.objects.filter(tournament_id=tournament_id).order_by('-seq').values('seq')[:1]
+    return Coalesce(models.Subquery(last_seq), 0) + 1
+
+
+def record_event(tournament_id, event_type, changed_teams=WHOLE_TOURNAMENT, **data):
+    """
+    Append an event to the tournament's log, in the current transaction.
+    changed_teams are the ids of the teams whose own rows the event changed,
+    for events that leave the rest of the tournament as it was.
+    """
+    TournamentEvent.objects.create(
+        tournament_id=tournament_id,
+        seq=next_seq(tournament_id),
+        event_type=event_type,
+        data=data,
+    )
+    recorded.count = events_recorded() + 1
+
+    changes = pending_changes()
+    if changed_teams is WHOLE_TOURNAMENT:
+        changes[tournament_id] = WHOLE_TOURNAMENT
+    elif changes.setdefault(tournament_id, set()) is not WHOLE_TOURNAMENT:
+        changes[tournament_id].update(changed_teams)
+
+
+def pending_changes():
+    if not hasattr(recorded, 'changes'):
+        recorded.changes = {}
+    return recorded.changes
+
+
+def take_changes(tournament_id):
+    """
+    The ids of the teams the events recorded by this thread changed since
+    the last call, or WHOLE_TOURNAMENT when one changed the tournament as a
+    whole or none was recorded
+    """
+    return pending_changes().pop(tournament_id, WHOLE_TOURNAMENT)
+
+
+def events_recorded():
+    """How many events the current thread has recorded"""
+    return getattr(recorded, 'count', 0)
+
+
+def record_transition(previous_round, new_round, created=(), bets_granted=0):
+    """Record a stage transition making new_round active, with the rows it created"""
+    rows = {}
+    for instance in created:
+        rows.setdefault(instance._meta.label_lower, []).append(event_row(instance))
+    record_event(
+        new_round.tournament_id,
+        'round_changed',
+        round=new_round.id,
+        previous=previous_round.id if previous_round else None,
+        created=rows,
+        bets_granted=bets_granted,
+    )
+
+
+def record_rows_saved(tournament_id, instances):
+    """Record rows saved outside the game flow, all of one model"""
+    if instances:
+        record_event(
+            tournament_id,
+            'rows_saved',
+            model=instances[0]._meta.label_lower,
+            rows=[event_row(instance) for instance in instances],
+        )
+
+
+def record_rows_deleted(tournament_id, model, ids):
+    """Record rows deleted outside the game flow; rows referring to them go with them"""
+    if ids:
+        record_event(tournament_id, 'rows_deleted', model=model._meta.label_lower, ids=sorted(ids))
+
+
+def tail(tournament_id, after=0, limit=TAIL_LIMIT):
+    """The events of a tournament following seq `after`, oldest first"""
+    return (
+        TournamentEvent.objects
+        .filter(tournament_id=tournament_id, seq__gt=after)
+        .order_by('seq')
+        .values('seq', 'event_type', 'data', 'created')[:limit]
+    )
@@ -0,0 +1,88 @@
+"""
+Streaming export of tournaments as gzip-compressed NDJSON.
+
+Every line is one object in the format of Django's "jsonl" serializer, so an
+export loads back with `manage.py loaddata <file>.jsonl.gz`. A tournament is
+written with its teams, rounds, games, odds, bets, bonuses, event log and
+checkpoints. The bet ledger is left out, as it follows from the bets: a
+restore rebuilds it, and so does `check_bet_ledger --fix` after loaddata.
+Every table is read, serialized and compressed EXPORT_CHUNK_SIZE rows at a
+time, so memory use stays flat however long the history is.
+"""
+import datetime
+import logging
+import time
+import zlib
+from collections import Counter
+from itertools import batched
+
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Tournament, Team, Round, Game, Odds, Bet, Bonus, TournamentEvent, TournamentCheckpoint
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = 2000
+
+# Written in this order, so every row comes after the rows it refers to
+EXPORT_MODELS = [Team, Round, Game, Odds, Bet, Bonus, TournamentEvent, TournamentCheckpoint]
+
+# zlib window bits producing a gzip container rather than a bare zlib stream
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+class ExportJSONEncoder(DjangoJSONEncoder):
+    """Keeps the microseconds DjangoJSONEncoder cuts off, so an export loads back unchanged"""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            value = o.isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        return super().default(o)
+
+
+class TournamentExport:
+    """An export of some tournaments, counting the rows it wrote of every model"""
+
+    def __init__(self, tournament_ids, chunk_size=EXPORT_CHUNK_SIZE):
+        self.tournament_ids = list(tournament_ids)
+        self.chunk_size = chunk_size
+        self.rows = Counter()
+        self.started = None
+        self.finished = None
+
+    def querysets(self):
+        yield Tournament.objects.filter(id__in=self.tournament_ids).order_by('id')
+        for model in EXPORT_MODELS:
+            yield model.objects.filter(tournament_id__in=self.tournament_ids).order_by('id')
+
+    def lines(self):
+        """Yield the export as NDJSON text, a chunk of rows at a time"""
+        self.started = time.perf_counter()
+        for queryset in self.querysets():
+            label = queryset.model._meta.label_lower
+            for chunk in batched(queryset.iterator(chunk_size=self.chunk_size), self.chunk_size):
+                self.rows[label] += len(chunk)
+                yield serializers.serialize('jsonl', chunk, cls=ExportJSONEncoder)
+        self.finished = time.perf_counter()
+        logger.info("Exported tournaments %s: %s", self.tournament_ids, self.summary())
+
+    def gzip(self):
+        """Yield the export compressed with gzip, a chunk of rows at a time"""
+        compressor = zlib.compressobj(wbits=GZIP_WBITS)
+        for text in self.lines():
+            data = compressor.compress(text.encode())
+            if data:
+                yield data
+        yield compressor.flush()
+
+    @property
+    def total_rows(self):
+        return sum(self.rows.values())
+
+    def summary(self):
+        """Rows written, time taken and throughput of a finished export"""
+        elapsed = self.finished - self.started
+        rate = self.total_rows / elapsed if elapsed else 0
+        return f"{self.total_rows} rows in {elapsed:.2f} s, {rate:.0f} rows/s"
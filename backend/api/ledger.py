@@ -0,0 +1,109 @@
+"""
+Ledger of the bets every team placed on every other team.
+
+A BetLedger row per bettor and team bet on holds the odds of those bets
+summed, odd1 for first place and odd2 for second, and how many there are.
+place_bet adds every bet to its row in the transaction creating the bet, so
+the final results and the betting table read one row per pair of teams
+rather than every bet ever placed, and the results take one query however
+long the bet history is.
+
+Writes outside the game flow that may change bets or their odds, admin
+edits and restores, rebuild the ledger of their tournament from its bets.
+`check_bet_ledger` compares the ledger with the bets.
+"""
+import math
+
+from django.db import models
+from django.db.models.functions import Coalesce
+
+from .models import Team, Round, Odds, Bet, BetLedger
+
+# Models whose admin edits can change the ledger: deleting a team or round
+# deletes bets, and editing odds changes the sums of the bets placed at them
+LEDGER_SOURCES = (Team, Round, Odds, Bet)
+
+
+def add_bet(bet):
+    """Add a new bet to the ledger, in the current transaction"""
+    updated = BetLedger.objects.filter(team_id=bet.team_id, bet_on_team_id=bet.bet_on_team_id).update(
+        odd1_sum=models.F('odd1_sum') + bet.odds.odd1,
+        odd2_sum=models.F('odd2_sum') + bet.odds.odd2,
+        bet_count=models.F('bet_count') + 1,
+    )
+    if not updated:
+        BetLedger.objects.create(
+            tournament_id=bet.tournament_id,
+            team_id=bet.team_id,
+            bet_on_team_id=bet.bet_on_team_id,
+            odd1_sum=bet.odds.odd1,
+            odd2_sum=bet.odds.odd2,
+            bet_count=1,
+        )
+
+
+def ledger_totals(tournament_id):
+    """The ledger of a tournament summed from its bets, by bettor and team bet on"""
+    totals = (
+        Bet.objects.filter(tournament_id=tournament_id)
+        .values('team_id', 'bet_on_team_id')
+        .annotate(odd1_sum=models.Sum('odds__odd1'), odd2_sum=models.Sum('odds__odd2'), bet_count=models.Count('id'))
+        .order_by()
+    )
+    return {
+        (row['team_id'], row['bet_on_team_id']): (row['odd1_sum'], row['odd2_sum'], row['bet_count'])
+        for row in totals
+    }
+
+
+def rebuild_ledger(tournament_id):
+    """Replace the ledger of a tournament with the one summed from its bets"""
+    BetLedger.objects.filter(tournament_id=tournament_id).delete()
+    BetLedger.objects.bulk_create([
+        BetLedger(
+            tournament_id=tournament_id,
+            team_id=team_id,
+            bet_on_team_id=bet_on_team_id,
+            odd1_sum=odd1_sum,
+            odd2_sum=odd2_sum,
+            bet_count=bet_count,
+        )
+        for (team_id, bet_on_team_id), (odd1_sum, odd2_sum, bet_count) in ledger_totals(tournament_id).items()
+    ], batch_size=5000)
+
+
+def ledger_differences(tournament_id):
+    """
+    Describe every ledger row of a tournament that differs from its bets.
+    Sums are compared with a tolerance, as floats added one bet at a time
+    round differently than the database summing them.
+    """
+    stored = {
+        (row.team_id, row.bet_on_team_id): (row.odd1_sum, row.odd2_sum, row.bet_count)
+        for row in BetLedger.objects.filter(tournament_id=tournament_id)
+    }
+    expected = ledger_totals(tournament_id)
+    found = []
+    for pair in sorted(stored.keys() | expected.keys()):
+        row, totals = stored.get(pair, (0, 0, 0)), expected.get(pair, (0, 0, 0))
+        if row[2] != totals[2] or not all(math.isclose(a, b, abs_tol=1e-9) for a, b in zip(row[:2], totals[:2])):
+            found.append(f"team {pair[0]} on team {pair[1]}: {row} != {totals}")
+    return found
+
+
+def with_points(teams, first_place, second_place):
+    """
+    Annotate a Team queryset with the points of every team's bets on the
+    winners, from one ledger row each, best first and tied teams by id
+    """
+    ledger = BetLedger.objects.filter(team=models.OuterRef('pk'))
+    return teams.annotate(
+        first_place_points=Coalesce(
+            models.Subquery(ledger.filter(bet_on_team=first_place).values('odd1_sum')), 0.0
+        ),
+        second_place_points=Coalesce(
+            models.Subquery(ledger.filter(bet_on_team=second_place).values('odd2_sum')), 0.0
+        ),
+    ).annotate(
+        total_points=models.F('first_place_points') + models.F('second_place_points'),
+    ).order_by('-total_points', 'id')
@@ -0,0 +1,99 @@
+"""
+Paging and streaming of the ViewSet list endpoints.
+
+A list is returned whole by default. `?cursor=` or `?page_size=` pages it by
+id instead: every page links to the next and previous one, and a page costs
+the same however deep into the table it is. `?format=ndjson`, or
+`Accept: application/x-ndjson`, streams the whole list as one JSON object
+per line, read and serialized a chunk at a time, so a worker holds one
+chunk of the list in memory rather than all of it.
+"""
+import json
+from itertools import batched
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework.pagination import CursorPagination
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+# Rows read from the database and serialized at a time while streaming
+STREAM_CHUNK_SIZE = 2000
+
+
+class ListCursorPagination(CursorPagination):
+    """Pages of a list ordered by id, continuing after the last id of the previous page"""
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def requested(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+
+def ndjson_line(item):
+    return json.dumps(item, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode() + b'\n'
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Renders a list as one JSON object per line, and anything else as a single line"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        items = data if isinstance(data, list) else [data]
+        return b''.join(ndjson_line(item) for item in items)
+
+
+# Renderers of the list endpoints: the defaults and NDJSON
+LIST_RENDERERS = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer]
+
+
+def served_over_asgi(request):
+    """Whether the request came through the ASGI handler rather than WSGI, as under runserver"""
+    # A REST framework request wraps Django's
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
+
+
+async def iterate_in_thread(chunks):
+    """
+    Yield the items of a synchronous iterator, reading each through
+    sync_to_async. Over ASGI Django reads a synchronous iterator to its end
+    before sending anything, so streamed responses are built from database
+    reads this way.
+    """
+    try:
+        while (chunk := await sync_to_async(next)(chunks, None)) is not None:
+            yield chunk
+    finally:
+        # Release the database cursor of a client that left early
+        await sync_to_async(chunks.close)()
+
+
+def streaming_content(request, chunks):
+    """
+    The content of a StreamingHttpResponse sending the chunks as they are
+    read. Over WSGI Django would buffer an asynchronous iterator instead,
+    so the chunks are sent as they are there.
+    """
+    return iterate_in_thread(chunks) if served_over_asgi(request) else chunks
+
+
+def ndjson_chunks(serializer_class, queryset, options):
+    """Yield a queryset serialized as NDJSON, a chunk of rows at a time"""
+    rows = queryset.iterator(chunk_size=STREAM_CHUNK_SIZE)
+    for chunk in batched(rows, STREAM_CHUNK_SIZE):
+        yield b''.join(ndjson_line(item) for item in serializer_class(chunk, many=True, **options).data)
+
+
+def ndjson_response(request, serializer_class, queryset, options):
+    return StreamingHttpResponse(
+        streaming_content(request, ndjson_chunks(serializer_class, queryset, options)),
+        content_type=NDJSONRenderer.media_type,
+    )
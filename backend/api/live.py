@@ -0,0 +1,114 @@
+"""
+Live dashboard feed over a WebSocket.
+
+A client connecting to /ws/dashboard/ first receives a snapshot of its
+tournament, then every diff the tournament's writes publish (see
+`tournament.publish_diff`). Diffs replace teams, games, bets and bonuses
+whole and by id, so a diff already contained in the snapshot does no harm
+when applied again. A client that falls behind receives a fresh snapshot.
+
+The tournament is picked from the query string like for the HTTP endpoints:
+`tournament` (a slug), `player_id`, or else the latest tournament.
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpRequest, QueryDict
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+
+from .broadcast import DASHBOARD_TOPIC, RESYNC, get_backend, hub
+from .models import Tournament, Round, Team, Game
+from .serializers import TeamSerializer
+from .tournament import round_data, game_data, stage_statuses_by_team
+from .views import get_tournament
+
+PATH = "/ws/dashboard/"
+
+# WebSocket close codes sent when the requested tournament does not exist,
+# and when the slug and the player_id name different tournaments
+CLOSE_NOT_FOUND = 4404
+CLOSE_BAD_REQUEST = 4400
+
+
+def resolve_tournament(query_string):
+    """Resolve the tournament of a connection from its query string"""
+    request = HttpRequest()
+    request.GET = QueryDict(query_string)
+    return get_tournament(Request(request))
+
+
+def dashboard_snapshot(tournament_id):
+    """Everything the dashboard shows: the active round, teams, games and stage statuses"""
+    version = Tournament.objects.values_list('version', flat=True).get(id=tournament_id)
+    active_round = Round.objects.filter(tournament_id=tournament_id, active=True).first()
+    teams = Team.objects.filter(tournament_id=tournament_id).order_by('id')
+    snapshot = {
+        'type': 'snapshot',
+        'version': version,
+        'round': round_data(active_round) if active_round else None,
+        'teams': TeamSerializer(teams, many=True).data,
+        'games': [],
+        'statuses': {},
+    }
+    if active_round:
+        # Games of every stage with the active number, so the joust pairs
+        # are known while teams are still betting
+        games = Game.objects.filter(tournament_id=tournament_id, round__number=active_round.number)
+        snapshot['games'] = [game_data(game) for game in games]
+        snapshot['statuses'] = stage_statuses_by_team(active_round)
+    return snapshot
+
+
+async def send_json(send, message):
+    await send({'type': 'websocket.send', 'text': json.dumps(message, default=str)})
+
+
+async def wait_for_disconnect(receive):
+    """Read client messages, which the feed ignores, until the client leaves"""
+    while (await receive())['type'] != 'websocket.disconnect':
+        pass
+
+
+async def dashboard_feed(scope, receive, send):
+    """ASGI application serving the dashboard feed of one tournament"""
+    if (await receive())['type'] != 'websocket.connect':
+        return
+
+    try:
+        tournament = await sync_to_async(resolve_tournament)(scope.get('query_string', b'').decode())
+    except Http404:
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+    except ValidationError:
+        await send({'type': 'websocket.close', 'code': CLOSE_BAD_REQUEST})
+        return
+
+    await send({'type': 'websocket.accept'})
+    get_backend().start()
+    with hub.subscription(DASHBOARD_TOPIC, tournament.id) as queue:
+        # Subscribed before reading, so a change in between is not missed
+        await send_json(send, await sync_to_async(dashboard_snapshot)(tournament.id))
+
+        disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+        try:
+            while True:
+                message = asyncio.ensure_future(queue.get())
+                await asyncio.wait({message, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+                if disconnect.done():
+                    message.cancel()
+                    return
+
+                diff = message.result()
+                if diff == RESYNC:
+                    diff = await sync_to_async(dashboard_snapshot)(tournament.id)
+                await send_json(send, diff)
+        finally:
+            disconnect.cancel()
+
+
+async def websocket_not_found(scope, receive, send):
+    """Refuse WebSocket connections to any other path"""
+    await receive()
+    await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
@@ -0,0 +1,42 @@
+"""
+Per-tournament locks serialising the write endpoints.
+
+`place_bet`, `mark_game` and `use_bonus` check whether their round is
+complete and then run a stage transition. Holding the tournament lock from
+the first read to the transition makes sure only one request completes a
+round, while requests arriving later see the round that replaced it.
+"""
+import zlib
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import Tournament
+
+# First key of the two-key Postgres advisory locks, so they do not collide
+# with advisory locks taken by other applications sharing the database
+ADVISORY_LOCK_NAMESPACE = zlib.crc32(b"swisstournament") & 0x7FFFFFFF
+
+
+@contextmanager
+def tournament_lock(tournament):
+    """
+    Open a transaction holding an exclusive lock on the tournament.
+
+    By default the tournament row is locked with SELECT ... FOR UPDATE. With
+    TOURNAMENT_LOCK_BACKEND = "advisory" Postgres takes a transaction-level
+    advisory lock instead, leaving the row free for readers and admin edits.
+    SQLite ignores row locks, its IMMEDIATE transaction mode serialises the
+    writers instead.
+    """
+    with transaction.atomic():
+        if settings.TOURNAMENT_LOCK_BACKEND == "advisory" and connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT pg_advisory_xact_lock(%s, %s)",
+                    [ADVISORY_LOCK_NAMESPACE, tournament.id]
+                )
+        else:
+            Tournament.objects.select_for_update().filter(id=tournament.id).first()
+        yield
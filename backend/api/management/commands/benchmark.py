@@ -0,0 +1,40 @@
+import logging
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from backend.api.benchmarks import BUDGET_OVERRUNS, SCENARIOS
+
+
+class Command(BaseCommand):
+    help = "Run a performance scenario against a throwaway test database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=sorted(SCENARIOS))
+        parser.add_argument(
+            '--sizes', type=int, nargs='+',
+            help="Override the scenario's default problem sizes"
+        )
+
+    def handle(self, *args, **options):
+        # Per-team debug logging would dominate the timings
+        logging.disable(logging.INFO)
+        run = SCENARIOS[options['scenario']]
+        if run.concurrent and connection.vendor == 'sqlite':
+            # Threads cannot share an in-memory database
+            test_settings = connection.settings_dict.setdefault('TEST', {})
+            test_settings['NAME'] = os.path.join(tempfile.mkdtemp(), 'benchmark.sqlite3')
+
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            run(self.stdout, sizes=options['sizes'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        if BUDGET_OVERRUNS:
+            raise CommandError(f"Over their statement budget: {', '.join(BUDGET_OVERRUNS)}")
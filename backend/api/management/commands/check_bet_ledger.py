@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from backend.api.ledger import ledger_differences, rebuild_ledger
+from backend.api.models import Tournament
+
+
+class Command(BaseCommand):
+    help = "Compare the bet ledger of every tournament with the bets it sums"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tournament',
+            help="Slug of the tournament to check, defaults to every tournament"
+        )
+        parser.add_argument(
+            '--fix', action='store_true',
+            help="Rebuild the ledger of tournaments that disagree with their bets"
+        )
+
+    def handle(self, *args, **options):
+        tournaments = Tournament.objects.order_by('id')
+        if options['tournament']:
+            tournaments = tournaments.filter(slug=options['tournament'])
+            if not tournaments.exists():
+                raise CommandError(f"Tournament {options['tournament']!r} does not exist")
+
+        with transaction.atomic():
+            mismatched = []
+            for tournament in tournaments:
+                differences = ledger_differences(tournament.id)
+                if not differences:
+                    continue
+                mismatched.append(tournament)
+                for difference in differences:
+                    self.stdout.write(f"{tournament.slug}: {difference}")
+                if options['fix']:
+                    rebuild_ledger(tournament.id)
+
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS("The bet ledger is consistent"))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt the ledger of {len(mismatched)} tournaments"))
+        else:
+            raise CommandError(f"{len(mismatched)} tournaments have an inconsistent ledger, rerun with --fix")
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from backend.api.models import Round, Tournament
+from backend.api.tournament import recount_pending
+
+COUNTERS = ('bets', 'games', 'bonuses')
+
+
+class Command(BaseCommand):
+    help = "Compare the pending counters of every round with the rows they count"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tournament',
+            help="Slug of the tournament to check, defaults to every tournament"
+        )
+        parser.add_argument(
+            '--fix', action='store_true',
+            help="Overwrite counters that disagree with the recounted values"
+        )
+
+    def handle(self, *args, **options):
+        rounds = Round.objects.select_related('tournament').order_by('tournament_id', 'number', 'id')
+        if options['tournament']:
+            if not Tournament.objects.filter(slug=options['tournament']).exists():
+                raise CommandError(f"Tournament {options['tournament']!r} does not exist")
+            rounds = rounds.filter(tournament__slug=options['tournament'])
+
+        with transaction.atomic():
+            mismatched = []
+            for round_obj in recount_pending(rounds):
+                differences = {
+                    name: (getattr(round_obj, f'pending_{name}'), getattr(round_obj, f'expected_{name}'))
+                    for name in COUNTERS
+                    if getattr(round_obj, f'pending_{name}') != getattr(round_obj, f'expected_{name}')
+                }
+                if not differences:
+                    continue
+                mismatched.append(round_obj)
+                described = ", ".join(
+                    f"pending_{name} {stored} != {expected}" for name, (stored, expected) in differences.items()
+                )
+                self.stdout.write(f"{round_obj.tournament.slug} {round_obj} (id {round_obj.id}): {described}")
+                for name, (_, expected) in differences.items():
+                    setattr(round_obj, f'pending_{name}', expected)
+
+            if options['fix'] and mismatched:
+                Round.objects.bulk_update(mismatched, [f'pending_{name}' for name in COUNTERS])
+
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS("All pending counters are consistent"))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f"Fixed the counters of {len(mismatched)} rounds"))
+        else:
+            raise CommandError(f"{len(mismatched)} rounds have inconsistent counters, rerun with --fix")
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from backend.api.export import TournamentExport
+from backend.api.models import Tournament
+
+
+class Command(BaseCommand):
+    help = "Export tournaments with their teams, rounds, games, odds, bets, bonuses, events and checkpoints as gzip-compressed NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tournament',
+            help="Slug of the tournament to export, defaults to every tournament"
+        )
+        parser.add_argument(
+            '--output',
+            help="File to write, defaults to tournaments_<timestamp>.jsonl.gz"
+        )
+
+    def handle(self, *args, **options):
+        tournaments = Tournament.objects.all()
+        if options['tournament']:
+            tournaments = tournaments.filter(slug=options['tournament'])
+            if not tournaments.exists():
+                raise CommandError(f"Tournament {options['tournament']!r} does not exist")
+
+        output = options['output'] or f"tournaments_{timezone.now():%Y%m%d_%H%M%S}.jsonl.gz"
+        export = TournamentExport(tournaments.values_list('id', flat=True))
+        with open(output, 'wb') as file:
+            for data in export.gzip():
+                file.write(data)
+
+        for label, count in export.rows.items():
+            self.stdout.write(f"{label:<20} {count:10d} rows")
+        self.stdout.write(f"Exported {export.summary()} to {output}")
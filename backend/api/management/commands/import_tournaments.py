@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.api.restore import IMPORT_BATCH_SIZE, RestoreError, TournamentRestore
+
+
+class Command(BaseCommand):
+    help = "Restore tournaments from an export or a JSON fixture, inserting rows in bulk and checking them afterwards"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Export (.jsonl or .jsonl.gz) or fixture (.json) to restore")
+        parser.add_argument(
+            '--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+            help="Rows of a model inserted at a time"
+        )
+        parser.add_argument(
+            '--replace', action='store_true',
+            help="Delete the tournaments the file restores if they already exist"
+        )
+
+    def handle(self, *args, **options):
+        restore = TournamentRestore(batch_size=options['batch_size'], replace=options['replace'])
+        try:
+            restore.run(options['path'])
+        except (OSError, ValueError, RestoreError) as e:
+            raise CommandError(f"Nothing was restored: {e}")
+
+        for label, count in restore.rows.items():
+            self.stdout.write(f"{label:<20} {count:10d} rows, checksum ok")
+        for label, count in restore.skipped.items():
+            self.stdout.write(f"{label:<20} {count:10d} rows skipped, not a tournament model")
+        self.stdout.write(f"Restored {restore.summary()} from {options['path']}")
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.api.models import Tournament
+from backend.api.tournament import rebuild_streaks
+
+
+class Command(BaseCommand):
+    help = "Recalculate team win and loss streaks from the recorded game history"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tournament',
+            help="Slug of the tournament to rebuild, defaults to every tournament"
+        )
+
+    def handle(self, *args, **options):
+        tournaments = Tournament.objects.all()
+        if options['tournament']:
+            tournaments = tournaments.filter(slug=options['tournament'])
+            if not tournaments.exists():
+                raise CommandError(f"Tournament {options['tournament']!r} does not exist")
+
+        for tournament in tournaments:
+            teams = rebuild_streaks(tournament)
+            self.stdout.write(f"{tournament.slug}: rebuilt streaks of {len(teams)} teams")
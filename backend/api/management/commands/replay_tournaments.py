@@ -0,0 +1,79 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.api.models import Tournament
+from backend.api.replay import (
+    CHECKPOINT_ROUNDS,
+    ReplayError,
+    TournamentReplay,
+    database_differences,
+    take_checkpoint,
+)
+
+
+class Command(BaseCommand):
+    help = "Rebuild tournament state from the event log, writing checkpoints as the replay goes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tournament',
+            help="Slug of the tournament to replay, defaults to every tournament"
+        )
+        parser.add_argument('--round', type=int, help="Replay up to the end of this round number")
+        parser.add_argument('--seq', type=int, help="Replay up to the event with this seq")
+        parser.add_argument(
+            '--checkpoint-rounds', type=int, default=CHECKPOINT_ROUNDS,
+            help="Rounds played between the checkpoints the replay writes"
+        )
+        parser.add_argument(
+            '--take-checkpoint', action='store_true',
+            help="Checkpoint the tournaments as they are in the database instead of replaying them"
+        )
+        parser.add_argument(
+            '--verify', action='store_true',
+            help="Compare the state replayed to the end of the log with the database"
+        )
+        parser.add_argument('--output', help="File to write the replayed rows to as JSON")
+
+    def handle(self, *args, **options):
+        tournaments = Tournament.objects.order_by('id')
+        if options['tournament']:
+            tournaments = tournaments.filter(slug=options['tournament'])
+            if not tournaments.exists():
+                raise CommandError(f"Tournament {options['tournament']!r} does not exist")
+        partial = options['round'] is not None or options['seq'] is not None
+        if options['verify'] and partial:
+            raise CommandError("--verify compares the end of the log, it cannot be combined with --round or --seq")
+
+        states = {}
+        mismatched = []
+        for tournament in tournaments:
+            if options['take_checkpoint']:
+                state = take_checkpoint(tournament.id)
+                self.stdout.write(f"{tournament.slug}: checkpoint at {state.summary()}")
+                continue
+
+            replay = TournamentReplay(tournament.id, checkpoint_rounds=options['checkpoint_rounds'])
+            try:
+                state = replay.run(seq=options['seq'], round_number=options['round'])
+            except ReplayError as e:
+                raise CommandError(f"{tournament.slug}: {e}")
+            states[tournament.slug] = {label: list(table.values()) for label, table in state.rows.items()}
+            self.stdout.write(f"{tournament.slug}: replayed {replay.summary()}")
+            self.stdout.write(f"{tournament.slug}: {state.summary()}")
+
+            if options['verify']:
+                differences = database_differences(state)
+                for difference in differences:
+                    self.stdout.write(f"{tournament.slug}: {difference}")
+                if differences:
+                    mismatched.append(tournament.slug)
+                else:
+                    self.stdout.write(f"{tournament.slug}: matches the database")
+
+        if options['output'] and states:
+            with open(options['output'], 'w') as file:
+                json.dump(states, file)
+        if mismatched:
+            raise CommandError(f"The replayed state of {', '.join(mismatched)} differs from the database")
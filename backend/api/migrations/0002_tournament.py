@@ -0,0 +1,82 @@
+import backend.api.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+TENANT_MODELS = ["team", "round", "game", "odds", "bet", "bonus"]
+
+
+def assign_default_tournament(apps, schema_editor):
+    """Attach rows created before tournaments existed to a single default tournament"""
+    Tournament = apps.get_model("api", "Tournament")
+    if not any(apps.get_model("api", name).objects.exists() for name in TENANT_MODELS):
+        return
+
+    tournament, _ = Tournament.objects.get_or_create(
+        slug="default",
+        defaults={"name": "Default tournament"},
+    )
+    for name in TENANT_MODELS:
+        apps.get_model("api", name).objects.filter(tournament__isnull=True).update(tournament=tournament)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Tournament",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+                ("slug", models.SlugField(max_length=100, unique=True)),
+                (
+                    "finish_distance",
+                    models.IntegerField(default=backend.api.models.default_finish_distance),
+                ),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("modified", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        *[
+            migrations.AddField(
+                model_name=name,
+                name="tournament",
+                field=models.ForeignKey(
+                    null=True,
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name=related_name,
+                    to="api.tournament",
+                ),
+            )
+            for name, related_name in zip(TENANT_MODELS, ["teams", "rounds", "games", "odds", "bets", "bonuses"])
+        ],
+        migrations.RunPython(assign_default_tournament, migrations.RunPython.noop),
+        *[
+            migrations.AlterField(
+                model_name=name,
+                name="tournament",
+                field=models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name=related_name,
+                    to="api.tournament",
+                ),
+            )
+            for name, related_name in zip(TENANT_MODELS, ["teams", "rounds", "games", "odds", "bets", "bonuses"])
+        ],
+        migrations.AddIndex(
+            model_name="round",
+            index=models.Index(fields=["tournament", "active"], name="api_round_tournam_abd37a_idx"),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 02:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_tournament'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tournament',
+            name='odds_mode',
+            field=models.CharField(choices=[('quadratic', 'Quadratic curve'), ('calibrated', 'Calibrated by simulation')], default='quadratic', max_length=20),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.15 on 2026-10-18 02:52
+
+from django.db import migrations, models
+
+
+def rebuild_streaks(apps, schema_editor):
+    """Derive the new streak counters from the games played so far"""
+    Team = apps.get_model('api', 'Team')
+    Game = apps.get_model('api', 'Game')
+
+    teams = {team.id: team for team in Team.objects.all()}
+    games = Game.objects.filter(finished=True).order_by(
+        'tournament_id', 'round__number', 'created'
+    ).values_list('team1_id', 'team2_id', 'location', 'win')
+    for team1_id, team2_id, location, win in games:
+        winner, loser = (teams[team1_id], teams[team2_id]) if win else (teams[team2_id], teams[team1_id])
+        winner.win_streak += 1
+        winner.location_loss_streak = 0
+        loser.win_streak = 0
+        # "Biblioteka" is LOCATIONS[0]
+        loser.location_loss_streak = loser.location_loss_streak + 1 if location == "Biblioteka" else 0
+
+    Team.objects.bulk_update(teams.values(), ['win_streak', 'location_loss_streak'])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_tournament_odds_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='team',
+            name='location_loss_streak',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='win_streak',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(rebuild_streaks, migrations.RunPython.noop),
+    ]
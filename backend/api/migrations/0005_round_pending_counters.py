@@ -0,0 +1,50 @@
+# Generated by Django 5.1.15 on 2026-10-18 02:55
+
+from django.db import migrations, models
+
+
+def count_pending(apps, schema_editor):
+    """Initialise the counters of existing rounds from their bets, games and bonuses"""
+    Round = apps.get_model('api', 'Round')
+    Team = apps.get_model('api', 'Team')
+
+    team_counts = {
+        row['tournament']: row['count']
+        for row in Team.objects.values('tournament').annotate(count=models.Count('id'))
+    }
+    rounds = list(Round.objects.annotate(
+        finished_bettors=models.Count('bets__team', filter=models.Q(bets__bet_finish=True), distinct=True),
+        unfinished_games=models.Count('games', filter=models.Q(games__finished=False), distinct=True),
+        unused_bonuses=models.Count('bonuses', filter=models.Q(bonuses__finished=False), distinct=True),
+    ))
+    for round_obj in rounds:
+        if round_obj.stage == "betting":
+            round_obj.pending_bets = team_counts.get(round_obj.tournament_id, 0) - round_obj.finished_bettors
+        round_obj.pending_games = round_obj.unfinished_games
+        round_obj.pending_bonuses = round_obj.unused_bonuses
+    Round.objects.bulk_update(rounds, ['pending_bets', 'pending_games', 'pending_bonuses'])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_team_streaks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='round',
+            name='pending_bets',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='round',
+            name='pending_bonuses',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='round',
+            name='pending_games',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_pending, migrations.RunPython.noop),
+    ]
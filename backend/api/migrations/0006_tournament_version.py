@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 03:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_round_pending_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tournament',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.1.15 on 2026-10-18 04:05
+
+from django.db import migrations, models
+
+
+def remove_duplicates(apps, schema_editor):
+    """Let existing rows satisfy the new constraints, keeping the latest active round and the first odds"""
+    Round = apps.get_model('api', 'Round')
+    Odds = apps.get_model('api', 'Odds')
+    Bet = apps.get_model('api', 'Bet')
+
+    latest_active = Round.objects.filter(active=True).values('tournament').annotate(latest=models.Max('id')).values('latest')
+    Round.objects.filter(active=True).exclude(id__in=latest_active).update(active=False)
+
+    duplicates = Odds.objects.values('round', 'team').annotate(
+        kept=models.Min('id'), count=models.Count('id')
+    ).filter(count__gt=1)
+    for row in duplicates:
+        extra = Odds.objects.filter(round=row['round'], team=row['team']).exclude(id=row['kept'])
+        # Bets placed on a duplicate keep odds of the same round and team
+        Bet.objects.filter(odds__in=extra).update(odds_id=row['kept'])
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_tournament_version'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='round',
+            name='api_round_tournam_abd37a_idx',
+        ),
+        migrations.AddIndex(
+            model_name='bet',
+            index=models.Index(fields=['team', 'round'], name='api_bet_team_id_1a721f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bet',
+            index=models.Index(fields=['bet_on_team', 'team'], name='api_bet_bet_on__9b03c6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bonus',
+            index=models.Index(fields=['team', 'round', 'finished'], name='api_bonus_team_id_bbb22a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bonus',
+            index=models.Index(fields=['tournament', 'bonus_type', 'bonus_target'], name='api_bonus_tournam_f63aa5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['round', 'team1'], name='api_game_round_i_eb73f4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['round', 'team2'], name='api_game_round_i_b630e1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='round',
+            index=models.Index(fields=['tournament', 'number', 'stage'], name='api_round_tournam_f35213_idx'),
+        ),
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='odds',
+            constraint=models.UniqueConstraint(fields=('round', 'team'), name='one_odds_per_team_and_round'),
+        ),
+        migrations.AddConstraint(
+            model_name='round',
+            constraint=models.UniqueConstraint(condition=models.Q(('active', True)), fields=('tournament',), name='one_active_round_per_tournament'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.15 on 2026-10-18 04:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TournamentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.PositiveBigIntegerField()),
+                ('event_type', models.CharField(choices=[('bet_placed', 'Bet placed'), ('game_marked', 'Game marked'), ('teams_moved', 'Teams moved'), ('bonus_used', 'Bonus used'), ('round_changed', 'Stage transition'), ('rows_saved', 'Rows saved'), ('rows_deleted', 'Rows deleted')], max_length=20)),
+                ('data', models.JSONField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('tournament', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='api.tournament')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('tournament', 'seq'), name='one_event_per_tournament_and_seq')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.15 on 2026-10-18 04:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_tournament_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TournamentCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.PositiveBigIntegerField()),
+                ('round_number', models.IntegerField()),
+                ('state', models.BinaryField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('tournament', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='api.tournament')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('tournament', 'seq'), name='one_checkpoint_per_tournament_and_seq')],
+            },
+        ),
+    ]
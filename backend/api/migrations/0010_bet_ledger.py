@@ -0,0 +1,50 @@
+# Generated by Django 5.1.15 on 2026-10-18 04:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_ledger(apps, schema_editor):
+    """Sum the bets placed so far into the ledger"""
+    Bet = apps.get_model('api', 'Bet')
+    BetLedger = apps.get_model('api', 'BetLedger')
+
+    totals = Bet.objects.values('tournament', 'team', 'bet_on_team').annotate(
+        odd1=models.Sum('odds__odd1'), odd2=models.Sum('odds__odd2'), count=models.Count('id'),
+    ).order_by()
+    BetLedger.objects.bulk_create([
+        BetLedger(
+            tournament_id=row['tournament'],
+            team_id=row['team'],
+            bet_on_team_id=row['bet_on_team'],
+            odd1_sum=row['odd1'],
+            odd2_sum=row['odd2'],
+            bet_count=row['count'],
+        )
+        for row in totals
+    ], batch_size=5000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_tournament_checkpoints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BetLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('odd1_sum', models.FloatField(default=0)),
+                ('odd2_sum', models.FloatField(default=0)),
+                ('bet_count', models.IntegerField(default=0)),
+                ('bet_on_team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='received_ledger', to='api.team')),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger', to='api.team')),
+                ('tournament', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bet_ledger', to='api.tournament')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('team', 'bet_on_team'), name='one_ledger_row_per_team_pair')],
+            },
+        ),
+        migrations.RunPython(fill_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-18 05:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_bet_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='team',
+            name='cache_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tournament',
+            name='cache_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,12 +1,42 @@
+from django.conf import settings
 from django.db import models
 
 
+def default_finish_distance():
+    return settings.TOURNAMENT_FINISH_DISTANCE
+
+class Tournament(models.Model):
+    ODDS_MODES = [
+        ('quadratic', 'Quadratic curve'),
+        ('calibrated', 'Calibrated by simulation'),
+    ]
+
+    name = models.CharField(max_length=100)
+    slug = models.SlugField(max_length=100, unique=True)
+    finish_distance = models.IntegerField(default=default_finish_distance)
+    odds_mode = models.CharField(max_length=20, choices=ODDS_MODES, default='quadratic')
+    # Bumped by every write to the tournament, exposed to pollers as the ETag
+    version = models.PositiveBigIntegerField(default=0, editable=False)
+    # Bumped by writes changing the tournament as a whole, keys every cached response
+    cache_version = models.PositiveBigIntegerField(default=0, editable=False)
+    created = models.DateTimeField(auto_now_add=True)
+    modified = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
 class Team(models.Model):
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='teams')
     identifier = models.CharField(max_length=100, unique=True)
     name = models.CharField(max_length=100)
     description = models.TextField()
     bets_available = models.IntegerField(default=0)
     distance = models.IntegerField(default=0)
+    # Streaks kept up to date as game results are recorded
+    win_streak = models.IntegerField(default=0)
+    location_loss_streak = models.IntegerField(default=0)  # Consecutive losses at LOCATIONS[0]
+    # Bumped by writes changing the team's own rows, keys its cached responses
+    cache_version = models.PositiveBigIntegerField(default=0, editable=False)
     created = models.DateTimeField(auto_now_add=True)
     modified = models.DateTimeField(auto_now=True)
 
@@ -14,16 +44,37 @@ class Team(models.Model):
         return self.name
 
 class Round(models.Model):
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='rounds')
     number = models.IntegerField()
     active = models.BooleanField(default=False)
     stage = models.CharField(max_length=100)
+    # What still has to happen before the round is complete, kept up to date by
+    # the write endpoints so completion checks read a single row
+    pending_bets = models.IntegerField(default=0)  # Teams yet to place their last bet
+    pending_games = models.IntegerField(default=0)  # Unfinished games
+    pending_bonuses = models.IntegerField(default=0)  # Unused bonuses
     created = models.DateTimeField(auto_now_add=True)
     modified = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['tournament', 'number', 'stage']),
+        ]
+        constraints = [
+            # Stage transitions deactivate the current round before activating the
+            # next. Its partial index also finds the active round of a tournament.
+            models.UniqueConstraint(
+                fields=['tournament'],
+                condition=models.Q(active=True),
+                name='one_active_round_per_tournament',
+            ),
+        ]
+
     def __str__(self):
         return f"Round {self.number} - {self.stage}"
 
 class Game(models.Model):
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='games')
     team1 = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='team1_games')
     team2 = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='team2_games')
     win = models.BooleanField(null=True, blank=True)  # True if team1 wins, False if team2 wins
@@ -33,21 +84,35 @@ class Game(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     modified = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # The game of a team in a round is looked up as team1 or team2
+        indexes = [
+            models.Index(fields=['round', 'team1']),
+            models.Index(fields=['round', 'team2']),
+        ]
+
     def __str__(self):
         return f"{self.team1} vs {self.team2} (Round {self.round.number})"
 
 class Odds(models.Model):
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='odds')
     round = models.ForeignKey(Round, on_delete=models.CASCADE)
     team = models.ForeignKey(Team, on_delete=models.CASCADE)
     odd1 = models.FloatField()
     odd2 = models.FloatField()
     created = models.DateTimeField(auto_now_add=True)
     modified = models.DateTimeField(auto_now=True)
-    
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['round', 'team'], name='one_odds_per_team_and_round'),
+        ]
+
     def __str__(self):
         return f"{self.team.name} - Round {self.round.number}: {self.odd1}/{self.odd2}"
 
 class Bet(models.Model):
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='bets')
     team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='placed_bets')
     bet_on_team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='received_bets')
     odds = models.ForeignKey(Odds, on_delete=models.CASCADE, related_name='bets')
@@ -56,10 +121,36 @@ class Bet(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     modified = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['team', 'round']),
+            # The betting table sums every team's received bets of one player
+            models.Index(fields=['bet_on_team', 'team']),
+        ]
+
     def __str__(self):
         return f"Bet: {self.team} on {self.bet_on_team} (Round {self.round.number})"
 
+class BetLedger(models.Model):
+    """The bets one team placed on another, summed as they are placed; see ledger.py"""
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='bet_ledger')
+    team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='ledger')  # The betting team
+    bet_on_team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='received_ledger')
+    odd1_sum = models.FloatField(default=0)  # Points if bet_on_team finishes first
+    odd2_sum = models.FloatField(default=0)  # Points if bet_on_team finishes second
+    bet_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Its index is the lookup of a bettor's row for a team
+            models.UniqueConstraint(fields=['team', 'bet_on_team'], name='one_ledger_row_per_team_pair'),
+        ]
+
+    def __str__(self):
+        return f"Ledger: {self.team} on {self.bet_on_team} ({self.bet_count} bets)"
+
 class Bonus(models.Model):
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='bonuses')
     team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='bonuses')
     round = models.ForeignKey(Round, on_delete=models.CASCADE, related_name='bonuses')
     finished = models.BooleanField(default=False)
@@ -69,5 +160,57 @@ class Bonus(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     modified = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['team', 'round', 'finished']),
+            # Selected locations are counted per tournament, type and target
+            models.Index(fields=['tournament', 'bonus_type', 'bonus_target']),
+        ]
+
     def __str__(self):
         return f"Bonus for {self.team.name} in Round {self.round.number}"
+
+class TournamentEvent(models.Model):
+    """One committed change of a tournament; see events.py for the types and their data"""
+    EVENT_TYPES = [
+        ('bet_placed', 'Bet placed'),
+        ('game_marked', 'Game marked'),
+        ('teams_moved', 'Teams moved'),
+        ('bonus_used', 'Bonus used'),
+        ('round_changed', 'Stage transition'),
+        ('rows_saved', 'Rows saved'),
+        ('rows_deleted', 'Rows deleted'),
+    ]
+
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='events')
+    # Position in the tournament's log, counting from 1 without gaps
+    seq = models.PositiveBigIntegerField()
+    event_type = models.CharField(max_length=20, choices=EVENT_TYPES)
+    data = models.JSONField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # Its index is the cursor events are tailed and numbered by
+            models.UniqueConstraint(fields=['tournament', 'seq'], name='one_event_per_tournament_and_seq'),
+        ]
+
+    def __str__(self):
+        return f"{self.tournament_id}#{self.seq} {self.event_type}"
+
+class TournamentCheckpoint(models.Model):
+    """The whole state of a tournament after one event of its log; see replay.py"""
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='checkpoints')
+    # Seq of the last event the state includes, 0 before the first
+    seq = models.PositiveBigIntegerField()
+    round_number = models.IntegerField()  # Number of the round active at that point
+    state = models.BinaryField()  # zlib-compressed JSON of the rows
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tournament', 'seq'], name='one_checkpoint_per_tournament_and_seq'),
+        ]
+
+    def __str__(self):
+        return f"{self.tournament_id}@{self.seq} round {self.round_number}"
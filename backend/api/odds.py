@@ -0,0 +1,130 @@
+"""
+Odds curve used in the betting stage.
+
+`new_odds_logic` is the reference implementation working on a plain list of
+distances. `new_odds_array` and `new_odds_batch` compute the same odds with
+NumPy for a whole field, or for many tournaments at once, and must stay
+result-for-result identical to it.
+"""
+import numpy as np
+
+# Odds handed to every team but the last when all teams are level
+DEFAULT_ODDS = (2, 1)
+
+
+def new_odds_logic(distances: list[int], finish_distance: int) -> list[tuple]:
+    """
+    Calculate odds for teams based on their distances from the finish line.
+    
+    Args:
+        distances: List of team distances
+        finish_distance: Distance needed to finish the tournament
+    
+    Returns:
+        List of tuples (odd1, odd2) for each team
+    """
+    # Find max and min distances
+    max_distance = max(distances) if distances else 0
+    min_distance = min(distances) if distances else 0
+    
+    results = []
+    
+    # If all teams are at the same distance, assign default odds
+    if max_distance == min_distance:
+        default_odd1, default_odd2 = DEFAULT_ODDS
+        return [(default_odd1, default_odd2) if i < len(distances) - 1 else (0, 0) 
+                for i in range(len(distances))]
+    
+    # Range of distances between teams
+    distance_range = max_distance - min_distance
+    
+    for distance in distances:
+        # Check if this team is the leader (closest to finish)
+        if distance == max_distance and len(distances) > 1:
+            # Leading team gets odds of 0
+            results.append((0, 0))
+            continue
+        
+        # Calculate relative position (0 = furthest behind, 1 = closest to leader)
+        relative_position = (distance - min_distance) / distance_range
+        
+        # Gap factor: teams further from leader get higher odds
+        # Non-linear relationship to accentuate differences
+        position_factor = 1 - relative_position  # 0 = closest to leader, 1 = furthest back
+        
+        # Base multiplier depends only on relative position
+        # Using a cubic function for more dramatic differences
+        base_multiplier = 3.0 + (position_factor ** 2) * 28.0
+        
+        # Calculate odds
+        odd1 = max(0, base_multiplier)
+        
+        # odd2 is always lower than odd1 but still proportional
+        odd2 = max(0, odd1 * 0.7)
+        
+        # Round to nearest integer
+        odd1 = round(odd1)
+        odd2 = round(odd2)
+        
+        results.append((odd1, odd2))
+    
+    return results
+
+
+def new_odds_batch(distances, finish_distance: int = None) -> np.ndarray:
+    """
+    Calculate odds for many tournaments at once.
+
+    Args:
+        distances: 2-D array of shape (tournaments, teams) with team distances
+        finish_distance: Distance needed to finish the tournament
+
+    Returns:
+        Integer array of shape (tournaments, teams, 2) holding (odd1, odd2)
+    """
+    distances = np.asarray(distances, dtype=np.int64)
+    if distances.ndim != 2:
+        raise ValueError("distances must be a 2-D array of shape (tournaments, teams)")
+
+    tournament_count, team_count = distances.shape
+    odds = np.zeros((tournament_count, team_count, 2), dtype=np.int64)
+    if team_count == 0:
+        return odds
+
+    max_distance = distances.max(axis=1, keepdims=True)
+    min_distance = distances.min(axis=1, keepdims=True)
+    distance_range = max_distance - min_distance
+
+    # Rows where everybody is level get the default odds further down, so
+    # any non-zero divisor will do for them
+    level = distance_range[:, 0] == 0
+    relative_position = (distances - min_distance) / np.where(distance_range == 0, 1, distance_range)
+    position_factor = 1 - relative_position
+    base_multiplier = 3.0 + (position_factor ** 2) * 28.0
+
+    # np.rint rounds half to even, exactly like the built-in round()
+    odds[..., 0] = np.rint(base_multiplier)
+    odds[..., 1] = np.rint(base_multiplier * 0.7)
+
+    # Leading teams get odds of 0
+    odds[distances == max_distance] = 0
+
+    odds[level] = DEFAULT_ODDS
+    odds[level, -1] = 0
+
+    return odds
+
+
+def new_odds_array(distances, finish_distance: int = None) -> np.ndarray:
+    """
+    Calculate odds for a single field of teams.
+
+    Args:
+        distances: 1-D array of team distances
+        finish_distance: Distance needed to finish the tournament
+
+    Returns:
+        Integer array of shape (teams, 2) holding (odd1, odd2)
+    """
+    distances = np.asarray(distances, dtype=np.int64)
+    return new_odds_batch(distances.reshape(1, -1), finish_distance)[0]
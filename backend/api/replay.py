@@ -0,0 +1,300 @@
+"""
+Replay of the event log into tournament state held in memory.
+
+A TournamentState holds the rows of one tournament: the tournament itself
+and its teams, rounds, games, odds, bets and bonuses, as dicts in the format
+of `events.event_row`, by model label and id. `apply` plays one event on it
+by the rules listed in events.py. Nothing is read from or written to the
+database while events are applied, so a replay runs far faster than the
+requests that wrote the log.
+
+Replays start from a checkpoint: the state after a given seq, stored
+compressed. A tournament gets its first checkpoint when it is created, or
+from its rows in the database with `replay_tournaments --take-checkpoint`,
+for tournaments loaded from fixtures or from backups made before the log
+existed. A replay writes a new checkpoint every CHECKPOINT_ROUNDS rounds it
+plays, so the state at any round is one checkpoint load plus the events of
+at most that many rounds.
+"""
+import json
+import time
+import zlib
+
+from .constants import LOCATIONS
+from .events import recorded_fields
+from .models import Tournament, Team, Round, Game, Odds, Bet, Bonus, TournamentCheckpoint, TournamentEvent
+
+CHECKPOINT_ROUNDS = 5
+
+# Events read from the database at a time
+REPLAY_CHUNK_SIZE = 2000
+
+# Models of a tournament's state, every one referring only to those before it
+STATE_MODELS = [Tournament, Team, Round, Game, Odds, Bet, Bonus]
+
+PENDING_COUNTERS = ('pending_bets', 'pending_games', 'pending_bonuses')
+
+
+class ReplayError(Exception):
+    pass
+
+
+class TournamentState:
+    """The rows of one tournament after the event with the given seq"""
+
+    def __init__(self, tournament_id, rows=None, seq=0):
+        self.tournament_id = tournament_id
+        self.seq = seq
+        self.rows = {model._meta.label_lower: {} for model in STATE_MODELS}
+        for label, table in (rows or {}).items():
+            for row in table:
+                self.rows[label][row['id']] = row
+        self.active_round_id = next(
+            (round_id for round_id, row in self.rows['api.round'].items() if row['active']), None
+        )
+
+    @classmethod
+    def from_database(cls, tournament_id):
+        """The state of a tournament as its rows are now, after the last event of its log"""
+        rows = {}
+        for model in STATE_MODELS:
+            fields = recorded_fields(model)
+            if model is Tournament:
+                queryset = model.objects.filter(id=tournament_id)
+            else:
+                queryset = model.objects.filter(tournament_id=tournament_id)
+            rows[model._meta.label_lower] = [
+                dict(zip((field.name for field in fields), values))
+                for values in queryset.order_by('id').values_list(*(field.attname for field in fields))
+            ]
+        seq = TournamentEvent.objects.filter(tournament_id=tournament_id).order_by('-seq').values_list('seq', flat=True).first()
+        return cls(tournament_id, rows, seq or 0)
+
+    @classmethod
+    def from_checkpoint(cls, checkpoint):
+        rows = json.loads(zlib.decompress(checkpoint.state))
+        return cls(checkpoint.tournament_id, rows, checkpoint.seq)
+
+    def compressed(self):
+        """The rows as a checkpoint stores them"""
+        rows = {label: list(table.values()) for label, table in self.rows.items()}
+        return zlib.compress(json.dumps(rows, separators=(',', ':')).encode())
+
+    @property
+    def round_number(self):
+        """Number of the active round, 0 before the first"""
+        return self.rows['api.round'][self.active_round_id]['number'] if self.active_round_id else 0
+
+    def team(self, team_id):
+        return self.rows['api.team'][team_id]
+
+    def upsert(self, label, rows):
+        table = self.rows[label]
+        for row in rows:
+            table[row['id']] = {**table.get(row['id'], {}), **row}
+            if label == 'api.round' and row.get('active'):
+                self.active_round_id = row['id']
+            elif label == 'api.round' and row['id'] == self.active_round_id and row.get('active') is False:
+                self.active_round_id = None
+
+    def delete(self, label, ids):
+        """Delete rows and, like the database cascades, the rows referring to them"""
+        ids = set(ids)
+        for row_id in ids:
+            self.rows[label].pop(row_id, None)
+        if label == 'api.round' and self.active_round_id in ids:
+            self.active_round_id = None
+        for model in STATE_MODELS:
+            for field in recorded_fields(model):
+                if field.is_relation and field.related_model._meta.label_lower == label:
+                    table = self.rows[model._meta.label_lower]
+                    referring = [row_id for row_id, row in table.items() if row[field.name] in ids]
+                    if referring:
+                        self.delete(model._meta.label_lower, referring)
+
+    def next_round_number(self, data):
+        """Number of the round a round_changed event makes active"""
+        for row in data['created'].get('api.round', ()):
+            if row['id'] == data['round']:
+                return row['number']
+        return self.rows['api.round'][data['round']]['number']
+
+    def apply(self, seq, event_type, data):
+        """Play one event of the log on the state"""
+        if seq != self.seq + 1:
+            raise ReplayError(f"Expected event {self.seq + 1} of tournament {self.tournament_id}, got {seq}")
+        handler = getattr(self, f'apply_{event_type}', None)
+        if handler is None:
+            raise ReplayError(f"Event {seq} of tournament {self.tournament_id} has unknown type {event_type!r}")
+        handler(data)
+        self.seq = seq
+
+    def apply_bet_placed(self, data):
+        self.upsert('api.bet', [data['bet']])
+        self.team(data['bet']['team'])['bets_available'] -= 1
+
+    def apply_game_marked(self, data):
+        game = self.rows['api.game'][data['game']]
+        game['win'] = data['win']
+        game['finished'] = True
+        # As in record_game_result
+        winner_id, loser_id = (game['team1'], game['team2']) if data['win'] else (game['team2'], game['team1'])
+        winner, loser = self.team(winner_id), self.team(loser_id)
+        winner['win_streak'] += 1
+        winner['location_loss_streak'] = 0
+        loser['win_streak'] = 0
+        loser['location_loss_streak'] = loser['location_loss_streak'] + 1 if game['location'] == LOCATIONS[0] else 0
+
+    def apply_teams_moved(self, data):
+        self.upsert('api.team', data['teams'])
+
+    def apply_bonus_used(self, data):
+        self.upsert('api.bonus', [data['bonus']])
+        self.upsert('api.team', data['teams'])
+
+    def apply_round_changed(self, data):
+        if data['previous'] is not None:
+            self.upsert('api.round', [{'id': data['previous'], 'active': False}])
+        for label, rows in data['created'].items():
+            self.upsert(label, rows)
+        self.upsert('api.round', [{'id': data['round'], 'active': True}])
+        if data['bets_granted']:
+            for team in self.rows['api.team'].values():
+                team['bets_available'] += data['bets_granted']
+
+    def apply_rows_saved(self, data):
+        self.upsert(data['model'], data['rows'])
+
+    def apply_rows_deleted(self, data):
+        self.delete(data['model'], data['ids'])
+
+    def pending_counters(self):
+        """The pending counters of every round, counted from the rows as in recount_pending"""
+        counters = {round_id: dict.fromkeys(PENDING_COUNTERS, 0) for round_id in self.rows['api.round']}
+        finished_bettors = {}
+        for bet in self.rows['api.bet'].values():
+            if bet['bet_finish']:
+                finished_bettors.setdefault(bet['round'], set()).add(bet['team'])
+        for round_id, row in self.rows['api.round'].items():
+            if row['stage'] == 'betting':
+                counters[round_id]['pending_bets'] = len(self.rows['api.team']) - len(finished_bettors.get(round_id, ()))
+        for game in self.rows['api.game'].values():
+            if not game['finished']:
+                counters[game['round']]['pending_games'] += 1
+        for bonus in self.rows['api.bonus'].values():
+            if not bonus['finished']:
+                counters[bonus['round']]['pending_bonuses'] += 1
+        return counters
+
+    def differences(self, other):
+        """Describe every row that differs between two states"""
+        found = []
+        for label, table in self.rows.items():
+            other_table = other.rows[label]
+            for row_id in sorted(table.keys() | other_table.keys()):
+                row, other_row = table.get(row_id), other_table.get(row_id)
+                if row != other_row:
+                    found.append(f"{label} {row_id}: {row} != {other_row}")
+        return found
+
+    def summary(self):
+        counts = ", ".join(f"{len(table)} {label.split('.')[1]}" for label, table in self.rows.items() if label != 'api.tournament')
+        return f"round {self.round_number} at seq {self.seq}: {counts}"
+
+
+def save_checkpoint(state):
+    """
+    Store the state as a checkpoint, unless the tournament has one at its seq
+    already. Return whether it was stored.
+    """
+    if TournamentCheckpoint.objects.filter(tournament_id=state.tournament_id, seq=state.seq).exists():
+        return False
+    TournamentCheckpoint.objects.create(
+        tournament_id=state.tournament_id,
+        seq=state.seq,
+        round_number=state.round_number,
+        state=state.compressed(),
+    )
+    return True
+
+
+def take_checkpoint(tournament_id):
+    """Checkpoint a tournament as its rows are now"""
+    state = TournamentState.from_database(tournament_id)
+    save_checkpoint(state)
+    return state
+
+
+def database_differences(state):
+    """
+    Describe every row, and every round's stored pending counters, that
+    differ between the database and a state replayed to the end of the log
+    """
+    found = state.differences(TournamentState.from_database(state.tournament_id))
+    counters = state.pending_counters()
+    stored = Round.objects.filter(tournament_id=state.tournament_id).values_list('id', *PENDING_COUNTERS)
+    for round_id, *values in stored:
+        stored_counters = dict(zip(PENDING_COUNTERS, values))
+        if round_id in counters and counters[round_id] != stored_counters:
+            found.append(f"pending counters of round {round_id}: {counters[round_id]} != {stored_counters}")
+    return found
+
+
+class TournamentReplay:
+    """A replay of one tournament's log, counting the events it applied and the checkpoints it wrote"""
+
+    def __init__(self, tournament_id, checkpoint_rounds=CHECKPOINT_ROUNDS, save_checkpoints=True):
+        self.tournament_id = tournament_id
+        self.checkpoint_rounds = checkpoint_rounds
+        self.save_checkpoints = save_checkpoints
+        self.checkpoint = None
+        self.events = 0
+        self.checkpoints_written = 0
+        self.started = None
+        self.finished = None
+
+    def run(self, seq=None, round_number=None):
+        """
+        Replay the log up to the event with the given seq, or up to the end
+        of the round with the given number, or to its end
+        """
+        self.started = time.perf_counter()
+        checkpoints = TournamentCheckpoint.objects.filter(tournament_id=self.tournament_id)
+        if seq is not None:
+            checkpoints = checkpoints.filter(seq__lte=seq)
+        if round_number is not None:
+            checkpoints = checkpoints.filter(round_number__lte=round_number)
+        self.checkpoint = checkpoints.order_by('-seq').first()
+        if self.checkpoint is None:
+            raise ReplayError(
+                f"Tournament {self.tournament_id} has no checkpoint to replay from, "
+                f"take one with replay_tournaments --take-checkpoint"
+            )
+        state = TournamentState.from_checkpoint(self.checkpoint)
+        checkpointed_round = state.round_number
+
+        events = TournamentEvent.objects.filter(tournament_id=self.tournament_id, seq__gt=state.seq)
+        if seq is not None:
+            events = events.filter(seq__lte=seq)
+        events = events.order_by('seq').values_list('seq', 'event_type', 'data')
+        for event_seq, event_type, data in events.iterator(chunk_size=REPLAY_CHUNK_SIZE):
+            if (round_number is not None and event_type == 'round_changed'
+                    and state.next_round_number(data) > round_number):
+                break
+            state.apply(event_seq, event_type, data)
+            self.events += 1
+            if event_type == 'round_changed' and state.round_number >= checkpointed_round + self.checkpoint_rounds:
+                checkpointed_round = state.round_number
+                if self.save_checkpoints and save_checkpoint(state):
+                    self.checkpoints_written += 1
+        self.finished = time.perf_counter()
+        return state
+
+    def summary(self):
+        """Events applied, time taken and throughput of a finished replay"""
+        elapsed = self.finished - self.started
+        rate = self.events / elapsed if elapsed else 0
+        return (
+            f"{self.events} events from the checkpoint at seq {self.checkpoint.seq} in {elapsed:.2f} s, "
+            f"{rate:.0f} events/s, {self.checkpoints_written} checkpoints written"
+        )
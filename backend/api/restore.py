@@ -0,0 +1,288 @@
+"""
+Bulk restore of tournament exports and fixtures.
+
+Reads the NDJSON written by `export.TournamentExport`, gzip-compressed or
+not, and JSON fixtures such as dumpdata output or the fixtures of
+scripts/create_initial_data.py. Fixtures are a single JSON array and are read
+whole; exports are read line by line.
+
+Rows are inserted IMPORT_BATCH_SIZE at a time with executemany, exactly as
+written: no model instances are built, so no signals fire and auto_now does
+not stamp the current time. Everything happens in one transaction. Foreign keys are
+checked when it commits, so a model's rows may come before the rows they
+refer to. Before committing, database sequences are moved past the restored
+ids, and the row count and checksum of every model are compared with the
+file. The bet ledger, which exports leave out, is then rebuilt from the
+restored bets, and the streaks and pending counters that rows of older
+fixtures lack are derived from the games, bets and bonuses like migrations
+0004 and 0005 did.
+
+Every restored tournament is created by the restore: one that already
+exists is an error unless `replace` deletes it first. Rows of fixtures
+older than tournaments, which have no tournament field, are attached to a
+new tournament like migration 0002 did.
+"""
+import datetime
+import gzip
+import json
+import time
+from collections import Counter, defaultdict
+from itertools import chain
+
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, models, IntegrityError, connection, connections, transaction
+from django.utils import timezone
+
+from .export import EXPORT_MODELS
+from .ledger import rebuild_ledger
+from .models import Tournament, Round
+from .tournament import bump_version, rebuild_streaks, recount_pending
+
+IMPORT_BATCH_SIZE = 5000
+
+# Restored in this order, so rows are inserted after the rows they refer to
+# whenever the file allows it
+IMPORT_MODELS = [Tournament, *EXPORT_MODELS]
+
+# Checksums are sums of row digests, so the order rows are read in does not
+# matter. Digests are Python hashes, as checksums are only compared within a run.
+CHECKSUM_MODULUS = 2 ** 64
+
+# Field types whose values database drivers take as to_python returns them, so
+# Django does not prepare them, the costliest step of a restore otherwise
+PASSTHROUGH_TYPES = {
+    'AutoField', 'BigAutoField', 'BigIntegerField', 'BooleanField', 'CharField', 'FloatField',
+    'ForeignKey', 'IntegerField', 'PositiveBigIntegerField', 'PositiveIntegerField',
+    'PositiveSmallIntegerField', 'SlugField', 'SmallIntegerField', 'TextField',
+}
+
+# Fields following from other rows, derived after the restore when a row lacks them
+DERIVED_FIELDS = {
+    'api.team': {'win_streak', 'location_loss_streak'},
+    'api.round': {'pending_bets', 'pending_games', 'pending_bonuses'},
+}
+
+
+class RestoreError(Exception):
+    pass
+
+
+def open_dump(path):
+    return gzip.open(path, 'rt', encoding='utf-8') if path.endswith('.gz') else open(path, encoding='utf-8')
+
+
+def read_objects(path, only=None):
+    """
+    Yield the objects of an export or fixture. With `only`, a model label,
+    NDJSON lines of other models are skipped without being parsed.
+    """
+    with open_dump(path) as file:
+        first = file.read(1)
+        while first.isspace():
+            first = file.read(1)
+        if first == '[':
+            objects = json.loads(first + file.read())
+            yield from (obj for obj in objects if only is None or obj['model'] == only)
+            return
+
+        for line in chain([first + file.readline()], file):
+            if line.strip() and (only is None or f'"{only}"' in line):
+                obj = json.loads(line)
+                if only is None or obj['model'] == only:
+                    yield obj
+
+
+def canonical(value):
+    """
+    A value as the database returns it, in a hashable form: times are aware,
+    in UTC, like Django stores naive ones, and JSON values are their text
+    """
+    if isinstance(value, datetime.datetime):
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return value.astimezone(datetime.timezone.utc)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, sort_keys=True)
+    return value
+
+
+def row_digest(values, canonicalized):
+    """Digest of a row's values, in field order, canonicalizing the values at the given positions"""
+    values = list(values)
+    for index in canonicalized:
+        values[index] = canonical(values[index])
+    return hash(tuple(values))
+
+
+def insert_sql(model):
+    """INSERT statement of one row of a model, every concrete field included"""
+    quote = connection.ops.quote_name
+    columns = [quote(field.column) for field in model._meta.concrete_fields]
+    placeholders = ", ".join(["%s"] * len(columns))
+    return f"INSERT INTO {quote(model._meta.db_table)} ({', '.join(columns)}) VALUES ({placeholders})"
+
+
+class TournamentRestore:
+    """A restore of one file, counting and checksumming the rows it inserted of every model"""
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE, replace=False, legacy_slug='default'):
+        self.batch_size = batch_size
+        self.replace = replace
+        self.legacy_slug = legacy_slug
+        self.models = {model._meta.label_lower: model for model in IMPORT_MODELS}
+        self.fields = {label: {field.name: field for field in model._meta.concrete_fields}
+                       for label, model in self.models.items()}
+        self.inserts = {label: insert_sql(model) for label, model in self.models.items()}
+        # Per model, the positions of datetime and JSON values, and of values
+        # Django has to prepare
+        self.canonicalized = {}
+        self.prepared = {}
+        for label, fields in self.fields.items():
+            self.canonicalized[label] = [
+                index for index, field in enumerate(fields.values())
+                if isinstance(field, (models.DateTimeField, models.JSONField))
+            ]
+            self.prepared[label] = [
+                (index, field) for index, field in enumerate(fields.values())
+                if field.get_internal_type() not in PASSTHROUGH_TYPES
+            ]
+        # The connection itself rather than the proxy, which is looked up on every use
+        self.db = connections[DEFAULT_DB_ALIAS]
+        self.rows = Counter()
+        self.skipped = Counter()
+        self.checksums = Counter()
+        self.pending = defaultdict(list)
+        self.tournament_ids = set()
+        # Per model label, the tournaments with rows lacking derived fields
+        self.underived = defaultdict(set)
+        self.legacy_tournament = None
+        self.started = None
+        self.finished = None
+
+    def run(self, path):
+        """Restore a file, rolling everything back if any row fails or the checks do not match"""
+        self.started = time.perf_counter()
+        try:
+            with transaction.atomic():
+                self.claim_tournaments(path)
+                for obj in read_objects(path):
+                    self.add(obj)
+                for label in self.models:
+                    self.flush(label)
+                self.reset_sequences()
+                self.verify()
+                self.derive()
+                for tournament_id in self.tournament_ids:
+                    rebuild_ledger(tournament_id)
+                    # Clients may hold cached responses of a replaced tournament's version
+                    bump_version(tournament_id, resync=True)
+        except IntegrityError as e:
+            raise RestoreError(f"Rows conflict with the database: {e}") from e
+        self.finished = time.perf_counter()
+
+    @property
+    def total_rows(self):
+        return sum(self.rows.values())
+
+    def summary(self):
+        """Rows restored, time taken and throughput of a finished restore"""
+        elapsed = self.finished - self.started
+        rate = self.total_rows / elapsed if elapsed else 0
+        return f"{self.total_rows} rows in {elapsed:.2f} s, {rate:.0f} rows/s"
+
+    def claim_tournaments(self, path):
+        """Delete, or refuse to overwrite, the existing tournaments the file restores"""
+        ids = [obj['pk'] for obj in read_objects(path, only='api.tournament')]
+        existing = Tournament.objects.filter(id__in=ids)
+        if existing.exists() and not self.replace:
+            slugs = ", ".join(existing.values_list('slug', flat=True))
+            raise RestoreError(f"Tournaments {slugs} already exist, restore with replace to overwrite them")
+        existing.delete()
+
+    def get_legacy_tournament(self):
+        """The tournament rows without a tournament field are attached to"""
+        if self.legacy_tournament is None:
+            existing = Tournament.objects.filter(slug=self.legacy_slug)
+            if existing.exists() and not self.replace:
+                raise RestoreError(f"Tournament {self.legacy_slug} already exists, restore with replace to overwrite it")
+            existing.delete()
+            self.legacy_tournament = Tournament.objects.create(slug=self.legacy_slug, name="Default tournament")
+            self.tournament_ids.add(self.legacy_tournament.id)
+            self.rows['api.tournament'] += 1
+            fields = self.fields['api.tournament'].values()
+            values = [getattr(self.legacy_tournament, field.attname) for field in fields]
+            self.checksums['api.tournament'] += row_digest(values, self.canonicalized['api.tournament'])
+        return self.legacy_tournament
+
+    def add(self, obj):
+        label = obj['model']
+        if label not in self.models:
+            self.skipped[label] += 1
+            return
+        if obj.get('pk') is None:
+            raise RestoreError(f"A row of {label} has no pk")
+
+        fields = self.fields[label]
+        data = obj['fields']
+        if not data.keys() <= fields.keys():
+            raise RestoreError(f"{label} has no fields {', '.join(sorted(data.keys() - fields.keys()))}")
+        data = {**data, self.models[label]._meta.pk.name: obj['pk']}
+        if label != 'api.tournament' and 'tournament' not in data:
+            data['tournament'] = self.get_legacy_tournament().id
+        values = [field.to_python(data[name]) if name in data else field.get_default() for name, field in fields.items()]
+        if not DERIVED_FIELDS.get(label, set()) <= data.keys():
+            self.underived[label].add(fields['tournament'].to_python(data['tournament']))
+
+        if label == 'api.tournament':
+            self.tournament_ids.add(self.models[label]._meta.pk.to_python(obj['pk']))
+        self.rows[label] += 1
+        self.checksums[label] += row_digest(values, self.canonicalized[label])
+
+        for index, field in self.prepared[label]:
+            values[index] = field.get_db_prep_save(values[index], self.db)
+        self.pending[label].append(values)
+        if len(self.pending[label]) >= self.batch_size:
+            self.flush(label)
+
+    def flush(self, label):
+        """Insert the pending rows of a model as they are, pk and timestamps included"""
+        rows = self.pending.pop(label, [])
+        if rows:
+            with self.db.cursor() as cursor:
+                cursor.executemany(self.inserts[label], rows)
+
+    def reset_sequences(self):
+        """Move the id sequences past the restored ids, on databases that have them"""
+        statements = connection.ops.sequence_reset_sql(no_style(), IMPORT_MODELS)
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+    def derive(self):
+        """Derive the streaks and pending counters rows were restored without"""
+        for tournament_id in self.underived['api.team']:
+            rebuild_streaks(tournament_id)
+        rounds = list(recount_pending(Round.objects.filter(tournament_id__in=self.underived['api.round'])))
+        for round_obj in rounds:
+            round_obj.pending_bets = round_obj.expected_bets
+            round_obj.pending_games = round_obj.expected_games
+            round_obj.pending_bonuses = round_obj.expected_bonuses
+        Round.objects.bulk_update(rounds, ['pending_bets', 'pending_games', 'pending_bonuses'])
+
+    def verify(self):
+        """Compare the row count and checksum of every model in the database with the file"""
+        for label, model in self.models.items():
+            fields = list(self.fields[label].values())
+            if label == 'api.tournament':
+                queryset = model.objects.filter(id__in=self.tournament_ids)
+            else:
+                queryset = model.objects.filter(tournament_id__in=self.tournament_ids)
+            count = 0
+            checksum = 0
+            for values in queryset.values_list(*(field.attname for field in fields)).iterator(chunk_size=self.batch_size):
+                count += 1
+                checksum += row_digest(values, self.canonicalized[label])
+            if count != self.rows[label]:
+                raise RestoreError(f"{label}: {self.rows[label]} rows in the file, {count} in the database")
+            if checksum % CHECKSUM_MODULUS != self.checksums[label] % CHECKSUM_MODULUS:
+                raise RestoreError(f"{label}: the restored rows do not match the file")
@@ -1,18 +1,62 @@
 from rest_framework import serializers
-from .models import Team, Round, Game, Odds, Bet, Bonus
+from .models import Tournament, Team, Round, Game, Odds, Bet, Bonus
 
 
-class TeamSerializer(serializers.ModelSerializer):
+class DynamicFieldsMixin:
+    """
+    Let callers choose the fields of a serializer through keyword arguments:
+    `fields` keeps only the listed fields, `expand` keeps only the nested
+    objects whose source is listed, and `compact` drops every nested object,
+    leaving foreign keys as IDs. Without them every field is returned.
+    """
+
+    def __init__(self, *args, fields=None, expand=None, compact=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None and expand is None and not compact:
+            return
+        for name, field in list(self.fields.items()):
+            nested = isinstance(field, serializers.BaseSerializer)
+            if (
+                (fields is not None and name not in fields)
+                or (nested and compact)
+                or (nested and expand is not None and field.source not in expand)
+            ):
+                self.fields.pop(name)
+
+
+def related_paths(serializer, prefix=''):
+    """
+    The select_related paths covering every nested object a serializer
+    returns, so serializing a queryset takes a single query
+    """
+    paths = []
+    for field in serializer.fields.values():
+        if isinstance(field, serializers.BaseSerializer):
+            path = prefix + field.source
+            paths.append(path)
+            paths.extend(related_paths(field, path + '__'))
+    return paths
+
+
+class TournamentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Tournament
+        fields = '__all__'
+
+class TeamSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Team
         fields = '__all__'
+        read_only_fields = ('tournament',)
 
-class RoundSerializer(serializers.ModelSerializer):
+class RoundSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Round
         fields = '__all__'
+        # The counters follow from the round's bets, games and bonuses
+        read_only_fields = ('tournament', 'pending_bets', 'pending_games', 'pending_bonuses')
 
-class GameSerializer(serializers.ModelSerializer):
+class GameSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     team1_details = TeamSerializer(source='team1', read_only=True)
     team2_details = TeamSerializer(source='team2', read_only=True)
     round_details = RoundSerializer(source='round', read_only=True)
@@ -20,16 +64,18 @@ class GameSerializer(serializers.ModelSerializer):
     class Meta:
         model = Game
         fields = '__all__'
+        read_only_fields = ('tournament',)
 
-class OddsSerializer(serializers.ModelSerializer):
+class OddsSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     round_details = RoundSerializer(source='round', read_only=True)
     team_details = TeamSerializer(source='team', read_only=True)
     
     class Meta:
         model = Odds
         fields = '__all__'
+        read_only_fields = ('tournament',)
 
-class BetSerializer(serializers.ModelSerializer):
+class BetSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     team_details = TeamSerializer(source='team', read_only=True)
     bet_on_team_details = TeamSerializer(source='bet_on_team', read_only=True)
     odds_details = OddsSerializer(source='odds', read_only=True)
@@ -38,8 +84,9 @@ class BetSerializer(serializers.ModelSerializer):
     class Meta:
         model = Bet
         fields = '__all__'
+        read_only_fields = ('tournament',)
 
-class BonusSerializer(serializers.ModelSerializer):
+class BonusSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Bonus
         fields = ('id', 'team', 'round', 'finished', 'description', 'bonus_type', 'bonus_target', 'created')
\ No newline at end of file
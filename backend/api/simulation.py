@@ -0,0 +1,272 @@
+"""
+Monte Carlo simulator for the tournament rules.
+
+Replays the rules of `tournament.py` in memory, without touching the
+database: location ladder pairing (`generate_new_game_pairs`), the
+every-3-distance and lost-3-times-at-LOCATIONS[0] bonuses
+(`move_to_bonus_stage`) and the tie handling of `check_tournament_winner`
+and the final stages. Running many tournaments from a starting distance
+vector gives every team's probability of finishing first and second.
+"""
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .constants import LOCATIONS
+
+# Safety net against a bonus policy that keeps the field level forever
+MAX_ROUNDS = 1000
+
+BONUS_POLICIES = ('greedy', 'random', 'none')
+
+
+def active_location_count(team_count):
+    """Number of locations in play for a field, as in generate_new_game_pairs"""
+    return min(len(LOCATIONS), max(2, team_count // 2))
+
+
+def seats_per_location(team_count):
+    """
+    Teams seated at every location, as in generate_new_game_pairs: two, or
+    as many pairs as a field with more than two teams per location needs
+    """
+    pairs = -(-team_count // (2 * active_location_count(team_count)))
+    return 2 * max(1, pairs)
+
+
+def pair_first_round(team_count, rng):
+    """Random pairs filling the locations in order, as in generate_new_game_pairs_first_round"""
+    teams = list(range(team_count))
+    rng.shuffle(teams)
+    seats = seats_per_location(team_count)
+    return [teams[i:i + seats] for i in range(0, team_count, seats)]
+
+
+def pair_by_ladder(locations, won, preferences, location_count, rng):
+    """
+    Seat teams on the location ladder, as in generate_new_game_pairs.
+
+    Teams with a location preference take their seat first. Everybody else
+    moves one location up after a win and one down after a loss, in random
+    order, and teams finding their location full take the first free seat.
+    A location left with an odd number of teams passes its last one on to
+    the next location.
+    """
+    seats = [[] for _ in range(location_count)]
+    capacity = seats_per_location(len(locations))
+    for team, location in preferences.items():
+        if len(seats[location]) < capacity:
+            seats[location].append(team)
+
+    remaining = [team for team in range(len(locations)) if team not in preferences]
+    rng.shuffle(remaining)
+    misplaced = []
+    for team in remaining:
+        if won[team]:
+            location = min(locations[team] + 1, location_count - 1)
+        else:
+            location = max(locations[team] - 1, 0)
+        if len(seats[location]) < capacity:
+            seats[location].append(team)
+        else:
+            misplaced.append(team)
+
+    for team in misplaced:
+        for location in range(location_count):
+            if len(seats[location]) < capacity:
+                seats[location].append(team)
+                break
+
+    for location in range(location_count - 1):
+        if len(seats[location]) % 2:
+            seats[location + 1].insert(0, seats[location].pop())
+    return seats
+
+
+def place_winners(distances, rng, win_probability):
+    """
+    Decide first and second place once a team reached the finish, or return
+    None when more than two teams share the lead and the tournament goes on.
+    """
+    max_distance = max(distances)
+    leaders = [team for team, distance in enumerate(distances) if distance == max_distance]
+
+    if len(leaders) == 2:
+        # Tiebreaker game for first place, the loser comes second
+        if rng.random() < win_probability:
+            return leaders[0], leaders[1]
+        return leaders[1], leaders[0]
+    if len(leaders) > 2:
+        return None
+
+    first_place = leaders[0]
+    chasers = [distance for distance in distances if distance < max_distance]
+    if not chasers:
+        return first_place, None
+    second_distance = max(chasers)
+    seconds = [team for team, distance in enumerate(distances) if distance == second_distance]
+    if len(seconds) == 1:
+        return first_place, seconds[0]
+    if len(seconds) == 2:
+        # Tiebreaker game for second place
+        return first_place, seconds[0] if rng.random() < win_probability else seconds[1]
+    # More than two ties for second place are settled by hand on the dashboard
+    return first_place, rng.choice(seconds)
+
+
+def use_bonus(team, distances, finish_distance, policy, preferences, location_count, rng):
+    """Spend a bonus the way a player following the given policy would"""
+    options = []
+    # Players must finish on their own
+    if distances[team] < finish_distance - 1:
+        options.append(('plus_distance', team))
+    rivals = [rival for rival in range(len(distances)) if rival != team and distances[rival] > 0]
+    if rivals:
+        leader = max(rivals, key=lambda rival: distances[rival])
+        options.append(('minus_distance', leader))
+
+    if policy == 'none' or not options:
+        return
+    if policy == 'greedy':
+        bonus_type, target = options[0]
+    else:
+        free_locations = [
+            location for location in range(location_count)
+            if list(preferences.values()).count(location) < seats_per_location(len(distances))
+        ]
+        options.append(('select_location', rng.choice(free_locations)))
+        options.append(('extra_bet', None))
+        bonus_type, target = rng.choice(options)
+
+    if bonus_type == 'plus_distance':
+        distances[target] += 1
+    elif bonus_type == 'minus_distance':
+        distances[target] -= 1
+    elif bonus_type == 'select_location':
+        preferences[team] = target
+
+
+def simulate_tournament(distances, finish_distance, rng, win_probability=0.5, bonus_policy='greedy',
+                        locations=None, won=None):
+    """
+    Play one tournament to the end from the given distances.
+
+    Args:
+        distances: Starting distance of every team
+        finish_distance: Distance needed to finish the tournament
+        rng: random.Random instance driving every decision
+        win_probability: Chance that the first team of a game wins it
+        bonus_policy: How bonuses are spent, one of BONUS_POLICIES
+        locations: Location index of every team's previous game, if known
+        won: Whether every team won its previous game, if known
+
+    Returns:
+        Tuple (first_place, second_place) of team indexes
+    """
+    distances = list(distances)
+    team_count = len(distances)
+    location_count = active_location_count(team_count)
+    if team_count % 2:
+        raise ValueError(f"Cannot pair {team_count} teams on {location_count} locations")
+
+    locations = list(locations) if locations is not None else None
+    won = list(won) if won is not None else [False] * team_count
+    loss_streaks = [0] * team_count
+    preferences = {}
+
+    for _ in range(MAX_ROUNDS):
+        # Joust stage
+        if locations is None:
+            seats = pair_first_round(team_count, rng)
+            locations = [0] * team_count
+        else:
+            seats = pair_by_ladder(locations, won, preferences, location_count, rng)
+        preferences = {}
+
+        winners = []
+        games = [
+            (location, seated[i], seated[i + 1])
+            for location, seated in enumerate(seats)
+            for i in range(0, len(seated), 2)
+        ]
+        for location, team1, team2 in games:
+            winner, loser = (team1, team2) if rng.random() < win_probability else (team2, team1)
+            distances[winner] += 1
+            winners.append(winner)
+            locations[team1] = locations[team2] = location
+            won[winner], won[loser] = True, False
+            loss_streaks[winner] = 0
+            loss_streaks[loser] = loss_streaks[loser] + 1 if location == 0 else 0
+
+        # Final stages
+        if max(distances) >= finish_distance:
+            places = place_winners(distances, rng, win_probability)
+            if places is not None:
+                return places
+            # More than two teams tied for first place skip the bonus stage
+            continue
+
+        # Bonus stage
+        for team in range(team_count):
+            stepped = team in winners and distances[team] % 3 == 0
+            if stepped or loss_streaks[team] >= 3:
+                use_bonus(team, distances, finish_distance, bonus_policy, preferences, location_count, rng)
+
+    raise RuntimeError(f"Tournament did not finish within {MAX_ROUNDS} rounds")
+
+
+def simulate_chunk(distances, finish_distance, runs, seed, options):
+    """Play `runs` tournaments and count first and second places per team"""
+    rng = random.Random(seed)
+    first = np.zeros(len(distances), dtype=np.int64)
+    second = np.zeros(len(distances), dtype=np.int64)
+    for _ in range(runs):
+        first_place, second_place = simulate_tournament(distances, finish_distance, rng, **options)
+        first[first_place] += 1
+        if second_place is not None:
+            second[second_place] += 1
+    return first, second
+
+
+def simulate(distances, finish_distance, runs=100_000, workers=None, seed=None, **options):
+    """
+    Estimate every team's chance of finishing first and second.
+
+    Runs are split into chunks spread over a process pool; `workers=1` plays
+    them in the calling process instead.
+
+    Args:
+        distances: Starting distance of every team
+        finish_distance: Distance needed to finish the tournament
+        runs: Number of tournaments to simulate
+        workers: Size of the process pool, defaults to the CPU count
+        seed: Seed for reproducible results
+        **options: Passed on to simulate_tournament
+
+    Returns:
+        Dict with 'first' and 'second' probability arrays and the 'runs' count
+    """
+    distances = [int(distance) for distance in distances]
+    if options.get('bonus_policy', 'greedy') not in BONUS_POLICIES:
+        raise ValueError(f"Unknown bonus policy {options['bonus_policy']!r}")
+
+    chunk_count = 1 if workers == 1 else min(runs, 4 * (workers or os.cpu_count() or 1))
+    chunk_runs = [runs // chunk_count + (i < runs % chunk_count) for i in range(chunk_count)]
+    seeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(chunk_count)]
+    arguments = [(distances, finish_distance, count, s, options) for count, s in zip(chunk_runs, seeds)]
+
+    if workers == 1:
+        results = [simulate_chunk(*args) for args in arguments]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(simulate_chunk, *zip(*arguments)))
+
+    first = sum(result[0] for result in results)
+    second = sum(result[1] for result in results)
+    return {
+        'first': first / runs,
+        'second': second / runs,
+        'runs': runs,
+    }
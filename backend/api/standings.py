@@ -0,0 +1,62 @@
+"""
+Standings of a tournament: its teams ranked by distance.
+
+Every team is read with its rank and dense rank in one query, computed by
+window functions in the database. Teams level on distance share a rank and
+are listed by id. Winner, tie and podium logic read the places from here
+rather than sorting the teams again, and usually only need the first two
+places.
+"""
+from django.db import models
+from django.db.models.functions import DenseRank, Rank
+
+from .models import Team
+
+
+def ranked_teams(teams):
+    """Annotate a Team queryset with its rank and dense rank by distance, leaders first"""
+    by_distance = models.F('distance').desc()
+    return teams.annotate(
+        rank=models.Window(Rank(), order_by=by_distance),
+        dense_rank=models.Window(DenseRank(), order_by=by_distance),
+    ).order_by('-distance', 'id')
+
+
+class Standings:
+    """
+    The teams of a tournament in order of distance, read when created. With
+    `places`, only the teams within that many dense ranks of the top are read.
+    """
+
+    def __init__(self, tournament_id, places=None):
+        self.tournament_id = tournament_id
+        teams = ranked_teams(Team.objects.filter(tournament_id=tournament_id))
+        if places is not None:
+            teams = teams.filter(dense_rank__lte=places)
+        self.teams = list(teams)
+
+    def place(self, dense_rank):
+        """Teams at the given dense rank, 1 being the teams furthest ahead"""
+        return [team for team in self.teams if team.dense_rank == dense_rank]
+
+    @property
+    def first_place(self):
+        """The team furthest ahead, the lowest id among teams level with it"""
+        return self.teams[0] if self.teams else None
+
+    @property
+    def second_place(self):
+        """The team after first_place in the standings"""
+        return self.teams[1] if len(self.teams) > 1 else None
+
+    def finish_ties(self, finish_distance):
+        """
+        Teams tied for first place and for second place once the leaders
+        reached finish_distance, (None, None, None) before that. Second place
+        is only decided when a single team is first.
+        """
+        if not self.teams or self.teams[0].distance < finish_distance:
+            return None, None, None
+        first = self.place(1)
+        second = self.place(2) if len(first) == 1 else []
+        return first, second, True
@@ -0,0 +1,183 @@
+"""
+Fixtures and SQL counters shared by the tests and the benchmark scenarios.
+
+The query budgets below are what both enforce: the tests fail, and
+`manage.py benchmark` reports an overrun, when a block issues more.
+"""
+import random
+import threading
+
+from django.db import connections
+from django.test import Client
+
+from .constants import LOCATIONS
+from .models import Tournament, Team, Round, Game, Odds, Bet, Bonus
+
+# Maximum number of SQL statements each stage transition may issue,
+# independent of the number of teams. They are round trips too, as long as
+# the database sends every bulk write in one; SQLite splits the larger ones.
+# Every transition but generate_new_odds appends one event to the log
+TRANSITION_QUERY_BUDGETS = {
+    'generate_new_odds': 3,
+    'move_to_joust_stage': 8,
+    'process_winners': 4,
+    'move_to_bonus_stage': 6,
+    'move_to_new_round': 14,
+}
+
+# Maximum number of SQL statements the winner and tie check may issue,
+# independent of the number of teams
+STANDINGS_QUERY_BUDGET = 1
+
+# Maximum number of SQL statements team-stage-statuses may issue,
+# independent of the number of teams
+TEAM_STAGE_STATUSES_QUERY_BUDGET = 5
+
+TRANSACTION_CONTROL = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE SAVEPOINT')
+
+
+def count_round_trips(queries):
+    """Count the queries a block sent to the database, transaction control aside"""
+    return sum(1 for query in queries if not query['sql'].startswith(TRANSACTION_CONTROL))
+
+
+def count_statements(queries):
+    """
+    Count the SQL statements a block issued.
+
+    Transaction control is ignored and the batches one bulk insert is split
+    into (SQLite caps the number of parameters per query) count as one write.
+    """
+    count = 0
+    previous_insert = None
+    for query in queries:
+        sql = query['sql']
+        if sql.startswith(TRANSACTION_CONTROL):
+            continue
+        insert = sql.split(' VALUES ')[0] if sql.startswith('INSERT') else None
+        if insert is None or insert != previous_insert:
+            count += 1
+        previous_insert = insert
+    return count
+
+
+def create_tournaments(count, teams_per_tournament=8, start=0):
+    """Create tournaments sitting in the betting stage of round 1"""
+    tournaments = Tournament.objects.bulk_create([
+        Tournament(name=f"Benchmark {i}", slug=f"bench-{i}", finish_distance=9)
+        for i in range(start, start + count)
+    ])
+    teams = Team.objects.bulk_create([
+        Team(
+            tournament=tournament,
+            identifier=f"{tournament.slug}-team-{i}",
+            name=f"Team {i}",
+            description="",
+            bets_available=1,
+            distance=random.randint(0, 8),
+        )
+        for tournament in tournaments
+        for i in range(teams_per_tournament)
+    ])
+    rounds = Round.objects.bulk_create([
+        Round(tournament=tournament, number=1, active=True, stage="betting", pending_bets=teams_per_tournament)
+        for tournament in tournaments
+    ])
+    rounds_by_tournament = {round_obj.tournament_id: round_obj for round_obj in rounds}
+    Odds.objects.bulk_create([
+        Odds(
+            tournament_id=team.tournament_id,
+            round=rounds_by_tournament[team.tournament_id],
+            team=team,
+            odd1=10,
+            odd2=5,
+        )
+        for team in teams
+    ])
+    return tournaments
+
+
+def create_stage_progress(tournament):
+    """Create the joust and bonus rounds of a benchmark tournament's round 1, every stage half done"""
+    teams = list(Team.objects.filter(tournament=tournament))
+    betting_round = Round.objects.get(tournament=tournament, active=True)
+    joust_round, bonus_round = Round.objects.bulk_create([
+        Round(tournament=tournament, number=1, stage="joust"),
+        Round(tournament=tournament, number=1, stage="bonus"),
+    ])
+
+    odds = {odd.team_id: odd for odd in Odds.objects.filter(round=betting_round)}
+    Bet.objects.bulk_create([
+        Bet(tournament=tournament, team=team, bet_on_team=team, odds=odds[team.id],
+            round=betting_round, bet_finish=True)
+        for team in teams[::2]
+    ])
+    Game.objects.bulk_create([
+        Game(tournament=tournament, round=joust_round, team1=teams[i], team2=teams[i + 1],
+             location=LOCATIONS[0], finished=i % 4 == 0, win=True)
+        for i in range(0, len(teams) - 1, 2)
+    ])
+    Bonus.objects.bulk_create([
+        Bonus(tournament=tournament, team=team, round=bonus_round, finished=i % 2 == 0)
+        for i, team in enumerate(teams)
+    ])
+    return bonus_round
+
+
+def fire_concurrently(requests):
+    """
+    POST every (path, data) pair from its own thread, all released at once,
+    and return the status code of every response
+    """
+    barrier = threading.Barrier(len(requests))
+    statuses = [None] * len(requests)
+
+    def post(index, path, data):
+        try:
+            client = Client()
+            barrier.wait()
+            statuses[index] = client.post(path, data, content_type='application/json').status_code
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=post, args=(i, *request)) for i, request in enumerate(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return statuses
+
+
+BONUS_CHOICES = ['extra_bet', 'plus_distance', 'minus_distance']
+
+
+def play_rounds(client, tournament, rounds):
+    """
+    Play a tournament through the write endpoints up to the end of the given
+    round number, every team spending its bets and bonuses at random
+    """
+    rng = random.Random(tournament.id)
+    team_ids = list(Team.objects.filter(tournament=tournament).values_list('id', flat=True))
+
+    def post(path, data):
+        return client.post(path, data, content_type='application/json').status_code
+
+    while (round_obj := Round.objects.get(tournament=tournament, active=True)).number <= rounds:
+        if round_obj.stage == 'betting':
+            for team_id, bets_available in Team.objects.filter(tournament=tournament).values_list('id', 'bets_available'):
+                for _ in range(bets_available):
+                    post('/api/place-bet/', {
+                        'team_id': team_id, 'bet_on_team_id': rng.choice(team_ids), 'round_id': round_obj.id
+                    })
+        elif round_obj.stage == 'joust':
+            for game in Game.objects.filter(round=round_obj, finished=False):
+                post('/api/mark-game/', {
+                    'team_id': game.team1_id, 'game_id': game.id, 'round_id': round_obj.id,
+                    'winner_id': rng.choice([game.team1_id, game.team2_id]),
+                })
+        else:
+            for team_id in Bonus.objects.filter(round=round_obj, finished=False).values_list('team_id', flat=True):
+                data = {'team_id': team_id, 'round_id': round_obj.id}
+                if post('/api/use-bonus/', {**data, 'bonus_type': rng.choice(BONUS_CHOICES),
+                                            'bonus_target': str(rng.choice(team_ids))}) != 200:
+                    post('/api/use-bonus/', {**data, 'bonus_type': 'extra_bet', 'bonus_target': None})
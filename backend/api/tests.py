@@ -1,3 +1,941 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import io
+import itertools
+import json
+import random
+import tempfile
+import threading
+from unittest.mock import patch
 
-# Create your tests here.
\ No newline at end of file
+from django.apps import apps
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import AsyncClient, Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+
+from .testing import (
+    STANDINGS_QUERY_BUDGET,
+    TEAM_STAGE_STATUSES_QUERY_BUDGET,
+    TRANSITION_QUERY_BUDGETS,
+    count_round_trips,
+    count_statements,
+    create_stage_progress,
+    create_tournaments,
+    fire_concurrently,
+    play_rounds,
+)
+from .broadcast import DASHBOARD_TOPIC, NOTIFY_PAYLOAD_LIMIT, RESYNC, notify_payload
+from .cache import get_response_cache
+from .constants import LOCATIONS
+from .ledger import ledger_differences, with_points
+from .calibration import get_cache, simulate_position
+from .odds import new_odds_array, new_odds_batch, new_odds_logic
+from .models import (
+    Round,
+    Team,
+    Game,
+    Odds,
+    Bet,
+    BetLedger,
+    Bonus,
+    Tournament,
+    TournamentCheckpoint,
+    TournamentEvent,
+)
+from .replay import (
+    CHECKPOINT_ROUNDS,
+    ReplayError,
+    TournamentReplay,
+    TournamentState,
+    database_differences,
+    take_checkpoint,
+)
+from .restore import IMPORT_MODELS, TournamentRestore
+from .simulation import active_location_count, pair_by_ladder, place_winners, simulate
+from .tournament import (
+    bump_version,
+    check_tournament_winner,
+    generate_new_game_pairs,
+    generate_new_odds,
+    move_to_bonus_stage,
+    move_to_joust_stage,
+    move_to_new_round,
+    previous_games_by_team,
+    process_winners,
+    record_game_result,
+)
+
+# Requests to this view return once as many of them run at the same time
+rendezvous = threading.Barrier(3, timeout=5)
+
+
+def wait_for_each_other(request):
+    rendezvous.wait()
+    return HttpResponse()
+
+
+urlpatterns = [path('rendezvous/', wait_for_each_other)]
+
+# Fixture of the deployment before tournaments, streaks and pending counters
+LEGACY_FIXTURE = settings.BASE_ROOT / 'heroku_db_data.json'
+
+
+class RestoreTests(TestCase):
+    def test_legacy_fixture_gets_derived_fields(self):
+        TournamentRestore().run(str(LEGACY_FIXTURE))
+
+        round_obj = Round.objects.get(tournament__slug='default', active=True)
+        self.assertEqual(round_obj.stage, 'betting')
+        self.assertEqual(round_obj.pending_bets, Team.objects.filter(tournament__slug='default').count())
+        self.assertEqual(round_obj.pending_bets, 8)
+        self.assertEqual(round_obj.pending_games, 0)
+        self.assertEqual(round_obj.pending_bonuses, 0)
+        self.assertFalse(Team.objects.exclude(win_streak=0, location_loss_streak=0).exists())
+
+
+class ExportRestoreTests(TestCase):
+    def setUp(self):
+        self.tournaments = create_tournaments(2)
+        # Nobody finishes while the rounds are played
+        Tournament.objects.update(finish_distance=100)
+        for tournament in self.tournaments:
+            take_checkpoint(tournament.id)
+            play_rounds(Client(), tournament, 2)
+
+    def rows(self):
+        """Every row of the tournaments by model, but the versions and times the restore bumps"""
+        ids = [tournament.id for tournament in self.tournaments]
+        rows = {'api.tournament': list(Tournament.objects.filter(id__in=ids).order_by('id').values(
+            *(field.name for field in Tournament._meta.concrete_fields
+              if field.name not in ('version', 'cache_version', 'modified'))
+        ))}
+        for model in IMPORT_MODELS[1:]:
+            rows[model._meta.label_lower] = list(model.objects.filter(tournament_id__in=ids).order_by('id').values())
+        # Rebuilt by the restore, under new ids
+        rows['api.betledger'] = sorted(BetLedger.objects.filter(tournament_id__in=ids).values_list(
+            'tournament_id', 'team_id', 'bet_on_team_id', 'odd1_sum', 'odd2_sum', 'bet_count'))
+        return rows
+
+    def test_export_restores_every_row(self):
+        before = self.rows()
+        self.assertTrue(before['api.bet'])
+        self.assertTrue(before['api.tournamentcheckpoint'])
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = f"{directory}/export.jsonl.gz"
+            call_command('export_tournaments', output=path, stdout=io.StringIO())
+            Tournament.objects.all().delete()
+            self.assertFalse(Team.objects.exists())
+            self.assertFalse(TournamentCheckpoint.objects.exists())
+            call_command('import_tournaments', path, stdout=io.StringIO())
+
+        after = self.rows()
+        for label in before:
+            with self.subTest(model=label):
+                self.assertEqual(after[label], before[label])
+
+
+class PendingCounterTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.tournament = create_tournaments(1)[0]
+        self.round = Round.objects.get(tournament=self.tournament, active=True)
+
+    def post(self, url, data):
+        response = self.client.post(url, json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_round_created_through_api_waits_for_every_team(self):
+        data = self.post('/api/rounds/', {
+            'tournament': self.tournament.slug, 'number': 2, 'stage': 'betting', 'pending_bets': 0,
+        })
+        self.assertEqual(data['pending_bets'], 8)
+        self.assertEqual(Round.objects.get(id=data['id']).pending_bets, 8)
+
+    def test_bet_created_through_api_counts_the_finished_bettor(self):
+        team = Team.objects.filter(tournament=self.tournament).first()
+        odds = Odds.objects.filter(round=self.round).first()
+        self.post('/api/bets/', {
+            'tournament': self.tournament.slug, 'team': team.id, 'bet_on_team': odds.team_id,
+            'odds': odds.id, 'round': self.round.id, 'bet_finish': True,
+        })
+        self.round.refresh_from_db()
+        self.assertEqual(self.round.pending_bets, 7)
+
+    def test_joust_round_is_returned_with_its_games_pending(self):
+        joust_round = move_to_joust_stage(self.round.id)
+        self.assertEqual(joust_round.pending_games, 4)
+        self.assertEqual(Round.objects.get(id=joust_round.id).pending_games, 4)
+
+
+class VersionTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.tournament = create_tournaments(1)[0]
+        self.round = Round.objects.get(tournament=self.tournament, active=True)
+        self.team = Team.objects.filter(tournament=self.tournament).first()
+
+    def place_bet(self, round_id):
+        return self.client.post('/api/place-bet/', json.dumps({
+            'team_id': self.team.id, 'bet_on_team_id': self.team.id, 'round_id': round_id,
+        }), content_type='application/json')
+
+    def version(self):
+        self.tournament.refresh_from_db(fields=['version'])
+        return self.tournament.version
+
+    def test_only_writes_bump_the_version(self):
+        version = self.version()
+        self.assertEqual(self.place_bet(self.round.id + 1000).status_code, 400)
+        self.assertEqual(self.version(), version)
+
+        self.assertEqual(self.place_bet(self.round.id).status_code, 200)
+        self.assertEqual(self.version(), version + 1)
+
+        # The team has no bets left
+        self.assertEqual(self.place_bet(self.round.id).status_code, 400)
+        self.assertEqual(self.version(), version + 1)
+
+    def test_reads_are_versioned_by_the_teams_tournament(self):
+        response = self.client.get('/api/get-bets-available/', {'identifier': self.team.identifier})
+        self.assertEqual(response['ETag'], f'"{self.tournament.id}-{self.version()}"')
+
+        elsewhere = create_tournaments(1, start=1)[0]
+        response = self.client.get('/api/get-bets-available/', {
+            'tournament': elsewhere.slug, 'identifier': self.team.identifier,
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('ETag', response)
+
+        response = self.client.get('/api/team-stage-statuses/', {
+            'tournament': elsewhere.slug, 'round_id': self.round.id,
+        })
+        self.assertNotEqual(response.status_code, 200)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.tournament = create_tournaments(1)[0]
+        self.round = Round.objects.get(tournament=self.tournament, active=True)
+        self.team, self.other = Team.objects.filter(tournament=self.tournament).order_by('id')[:2]
+        self.cache = get_response_cache()
+        self.cache.clear()
+        self.cache.reset_stats()
+
+    def bets_available(self, team):
+        response = self.client.get('/api/get-bets-available/', {'identifier': team.identifier})
+        self.assertEqual(response.status_code, 200)
+
+    def betting_table(self):
+        response = self.client.get('/api/get-betting-table/', {
+            'identifier': self.other.identifier, 'round_id': self.round.id,
+        })
+        self.assertEqual(response.status_code, 200)
+
+    def assertCounted(self, hits, misses, func):
+        before = self.cache.stats()
+        func()
+        after = self.cache.stats()
+        self.assertEqual((after['hits'] - before['hits'], after['misses'] - before['misses']), (hits, misses))
+
+    def test_bet_drops_the_bettors_entries_only(self):
+        for read in (lambda: self.bets_available(self.team), lambda: self.bets_available(self.other), self.betting_table):
+            self.assertCounted(0, 1, read)
+            self.assertCounted(1, 0, read)
+
+        response = self.client.post('/api/place-bet/', json.dumps({
+            'team_id': self.team.id, 'bet_on_team_id': self.other.id, 'round_id': self.round.id,
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertCounted(0, 1, lambda: self.bets_available(self.team))
+        self.assertCounted(1, 0, lambda: self.bets_available(self.other))
+        # The table shows every team's bets
+        self.assertCounted(0, 1, self.betting_table)
+
+    def test_transition_drops_every_entry(self):
+        self.assertCounted(0, 1, lambda: self.bets_available(self.other))
+        move_to_joust_stage(self.round.id)
+        bump_version(self.tournament.id)
+        self.assertCounted(0, 1, lambda: self.bets_available(self.other))
+
+
+class BettingTableTests(TestCase):
+    def setUp(self):
+        self.tournament = create_tournaments(1)[0]
+        self.round = Round.objects.get(tournament=self.tournament, active=True)
+        self.player, self.other, self.favourite = Team.objects.filter(tournament=self.tournament).order_by('id')[:3]
+        Team.objects.filter(tournament=self.tournament).update(bets_available=2)
+        for bettor in (self.player, self.player, self.other):
+            response = self.client.post('/api/place-bet/', json.dumps({
+                'team_id': bettor.id, 'bet_on_team_id': self.favourite.id, 'round_id': self.round.id,
+            }), content_type='application/json')
+            self.assertEqual(response.status_code, 200, response.content)
+
+    def test_betting_table(self):
+        response = self.client.get('/api/get-betting-table/', {
+            'identifier': self.player.identifier, 'round_id': self.round.id,
+        })
+        self.assertEqual(response.status_code, 200)
+        table = response.json()
+        self.assertEqual(table['bets_available'], 0)
+        self.assertEqual(table['round_stage'], 'betting')
+
+        teams = table['teams']
+        self.assertEqual(len(teams), 8)
+        self.assertEqual([team['distance'] for team in teams], sorted((team['distance'] for team in teams), reverse=True))
+        self.assertEqual([team['id'] for team in teams if team['is_player_team']], [self.player.id])
+        by_id = {team['id']: team for team in teams}
+        # Only the player's own bets add up, every player's bets are counted
+        self.assertEqual(
+            {key: by_id[self.favourite.id][key] for key in ('odd1', 'odd2', 'bet1', 'bet2', 'total_bet_count')},
+            {'odd1': 10, 'odd2': 5, 'bet1': 20, 'bet2': 10, 'total_bet_count': 3},
+        )
+        for team_id, team in by_id.items():
+            if team_id != self.favourite.id:
+                self.assertEqual((team['bet1'], team['bet2'], team['total_bet_count']), (0, 0, 0))
+
+    def test_bets_of_earlier_rounds_count(self):
+        next_round = Round.objects.create(tournament=self.tournament, number=2, stage='betting')
+        response = self.client.get('/api/get-betting-table/', {
+            'identifier': self.player.identifier, 'round_id': next_round.id,
+        })
+        favourite = next(team for team in response.json()['teams'] if team['id'] == self.favourite.id)
+        # No odds drawn for the new round yet
+        self.assertEqual((favourite['odd1'], favourite['odd2']), (1.0, 1.0))
+        self.assertEqual((favourite['bet1'], favourite['total_bet_count']), (20, 3))
+
+
+class PlayerStateTests(TestCase):
+    def setUp(self):
+        self.tournament = create_tournaments(1)[0]
+        self.round = Round.objects.get(tournament=self.tournament, active=True)
+        self.team, self.other = Team.objects.filter(tournament=self.tournament).order_by('id')[:2]
+
+    def player_state(self, **headers):
+        response = self.client.get('/api/player-state/', {'identifier': self.team.identifier}, **headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['sections']
+
+    def test_sections_hold_what_their_endpoints_return(self):
+        sections = self.player_state()
+        self.assertEqual(set(sections), {
+            'round', 'settings', 'team', 'bets_available', 'next_opponent', 'bonus', 'betting_table',
+        })
+        self.assertEqual(sections['settings']['data'], {'tournament': self.tournament.slug, 'finish_distance': 9})
+        self.assertEqual(sections['bets_available']['data'], {'bets_available': 1})
+        self.assertEqual(sections['team']['data']['id'], self.team.id)
+        self.assertEqual(len(sections['betting_table']['data']['teams']), 8)
+        # No game or bonus in the betting stage
+        self.assertIsNone(sections['next_opponent']['data'])
+        self.assertIsNone(sections['bonus']['data'])
+
+    def test_unchanged_sections_are_omitted(self):
+        before = self.player_state()
+        etags = ", ".join(section['etag'] for section in before.values())
+        for name, section in self.player_state(HTTP_IF_NONE_MATCH=etags).items():
+            self.assertEqual(section, {'etag': before[name]['etag'], 'unchanged': True}, name)
+
+        response = self.client.post('/api/place-bet/', json.dumps({
+            'team_id': self.team.id, 'bet_on_team_id': self.other.id, 'round_id': self.round.id,
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+        after = self.player_state(HTTP_IF_NONE_MATCH=etags)
+        self.assertEqual(after['bets_available'], {
+            'etag': after['bets_available']['etag'], 'data': {'bets_available': 0},
+        })
+        self.assertNotEqual(after['bets_available']['etag'], before['bets_available']['etag'])
+        self.assertEqual(after['settings'], {'etag': before['settings']['etag'], 'unchanged': True})
+        # Every section comes back in full exactly when its ETag changed
+        for name, section in after.items():
+            self.assertEqual('data' in section, section['etag'] != before[name]['etag'], name)
+
+
+class BroadcastTests(SimpleTestCase):
+    def test_oversized_notifications_resync(self):
+        diff = {'type': 'teams_moved', 'teams': [{'id': 1, 'distance': 3}]}
+        payload = notify_payload(DASHBOARD_TOPIC, 1, diff)
+        self.assertEqual(json.loads(payload)['message'], diff)
+
+        diff['teams'] *= NOTIFY_PAYLOAD_LIMIT
+        payload = notify_payload(DASHBOARD_TOPIC, 1, diff)
+        self.assertLess(len(payload.encode()), NOTIFY_PAYLOAD_LIMIT)
+        self.assertEqual(json.loads(payload), {'topic': DASHBOARD_TOPIC, 'tournament': 1, 'message': RESYNC})
+
+
+class OddsTests(SimpleTestCase):
+    def assertMatchesLogic(self, fields, finish_distance):
+        """Check both vectorised paths return exactly the odds of new_odds_logic for every field"""
+        expected = [new_odds_logic(list(field), finish_distance) for field in fields]
+        for field, odds in zip(fields, expected):
+            self.assertEqual([tuple(pair) for pair in new_odds_array(field, finish_distance).tolist()], odds, field)
+        batch = new_odds_batch(fields, finish_distance)
+        self.assertEqual([[tuple(pair) for pair in row] for row in batch.tolist()], expected)
+
+    def test_every_small_field_matches_the_scalar_odds(self):
+        for finish_distance in (5, 9):
+            for team_count in range(1, 5):
+                fields = list(itertools.product(range(finish_distance + 1), repeat=team_count))
+                with self.subTest(teams=team_count, finish_distance=finish_distance):
+                    self.assertMatchesLogic(fields, finish_distance)
+
+    def test_large_fields_match_the_scalar_odds(self):
+        generator = random.Random(3)
+        for finish_distance in (9, 20, 100):
+            for team_count in (8, 17, 64, 1000):
+                fields = [
+                    [generator.randint(0, finish_distance) for _ in range(team_count)]
+                    for _ in range(20)
+                ]
+                # Fields with every team level, or tied at the front and back
+                fields.append([finish_distance // 2] * team_count)
+                fields.append(([0, finish_distance] * team_count)[:team_count])
+                with self.subTest(teams=team_count, finish_distance=finish_distance):
+                    self.assertMatchesLogic(fields, finish_distance)
+
+    def test_empty_field(self):
+        self.assertEqual(new_odds_logic([], 9), [])
+        self.assertEqual(new_odds_array([], 9).shape, (0, 2))
+
+
+class SimulationTests(SimpleTestCase):
+    def test_winners_move_up_the_ladder_and_losers_down(self):
+        # Teams 0 and 1 played at the first location, 2 and 3 at the second
+        seats = pair_by_ladder([0, 0, 1, 1], [True, False, True, False], {}, 2, random.Random(0))
+        self.assertEqual([sorted(seated) for seated in seats], [[1, 3], [0, 2]])
+
+    def test_location_preferences_are_seated_first(self):
+        for seed in range(10):
+            seats = pair_by_ladder([0, 0, 1, 1], [True, False, True, False], {1: 1}, 2, random.Random(seed))
+            self.assertIn(1, seats[1])
+            self.assertEqual(sorted(team for seated in seats for team in seated), [0, 1, 2, 3])
+            self.assertEqual([len(seated) for seated in seats], [2, 2])
+
+    def test_places(self):
+        rng = random.Random(0)
+        self.assertEqual(place_winners([9, 7, 8, 3], rng, 0.5), (0, 2))
+        # The tiebreaker goes to the first team when it always wins
+        self.assertEqual(place_winners([9, 9, 8, 3], rng, 1.0), (0, 1))
+        self.assertEqual(place_winners([9, 9, 8, 3], rng, 0.0), (1, 0))
+        self.assertEqual(place_winners([9, 8, 2, 8], rng, 0.0), (0, 3))
+        self.assertEqual(place_winners([9, 5, 5, 5], rng, 0.5)[0], 0)
+        self.assertIn(place_winners([9, 5, 5, 5], rng, 0.5)[1], (1, 2, 3))
+        # More than two teams tied for first place play on
+        self.assertIsNone(place_winners([9, 9, 9, 3], rng, 0.5))
+
+    def test_simulate(self):
+        result = simulate([8, 0, 0, 0, 0, 0], 9, runs=200, workers=1, seed=1)
+        self.assertEqual(result['runs'], 200)
+        # Every tournament has a winner, and the team one win from the finish nearly always is
+        self.assertAlmostEqual(result['first'].sum(), 1.0)
+        self.assertLessEqual(result['second'].sum(), 1.0)
+        self.assertGreater(result['first'][0], 0.9)
+
+        again = simulate([8, 0, 0, 0, 0, 0], 9, runs=200, workers=1, seed=1)
+        self.assertEqual(again['first'].tolist(), result['first'].tolist())
+        self.assertEqual(again['second'].tolist(), result['second'].tolist())
+
+    def test_simulate_rejects_an_unknown_bonus_policy(self):
+        with self.assertRaises(ValueError):
+            simulate([0, 0], 9, runs=1, workers=1, bonus_policy='hoard')
+
+    def test_active_location_count(self):
+        self.assertEqual(active_location_count(2), 2)
+        self.assertEqual(active_location_count(8), 4)
+        self.assertEqual(active_location_count(1000), len(LOCATIONS))
+
+
+class ReplayTests(TestCase):
+    def setUp(self):
+        self.tournament = create_tournaments(1)[0]
+        # Nobody finishes while the rounds are played
+        Tournament.objects.filter(id=self.tournament.id).update(finish_distance=100)
+        self.first_checkpoint = take_checkpoint(self.tournament.id)
+        play_rounds(Client(), self.tournament, CHECKPOINT_ROUNDS + 2)
+
+    def test_replayed_state_matches_the_database(self):
+        replay = TournamentReplay(self.tournament.id)
+        state = replay.run()
+        self.assertEqual(replay.checkpoint.seq, self.first_checkpoint.seq)
+        self.assertEqual(replay.checkpoints_written, 1)
+        self.assertEqual(database_differences(state), [])
+
+        # From the checkpoint the first replay wrote
+        replay = TournamentReplay(self.tournament.id)
+        state = replay.run()
+        self.assertGreater(replay.checkpoint.seq, self.first_checkpoint.seq)
+        self.assertEqual(replay.checkpoint.round_number, CHECKPOINT_ROUNDS + 1)
+        self.assertEqual(replay.checkpoints_written, 0)
+        self.assertEqual(database_differences(state), [])
+
+    def test_unknown_event_type(self):
+        state = TournamentState(self.tournament.id)
+        with self.assertRaises(ReplayError):
+            state.apply(1, 'tournament_renamed', {})
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.tournament = create_tournaments(1)[0]
+        self.round = Round.objects.get(tournament=self.tournament, active=True)
+        self.teams = list(Team.objects.filter(tournament=self.tournament).order_by('id'))
+        Team.objects.filter(tournament=self.tournament).update(bets_available=2)
+        for bettor in self.teams[:4]:
+            for bet_on in self.teams[:2]:
+                response = self.client.post('/api/place-bet/', json.dumps({
+                    'team_id': bettor.id, 'bet_on_team_id': bet_on.id, 'round_id': self.round.id,
+                }), content_type='application/json')
+                self.assertEqual(response.status_code, 200, response.content)
+
+    def test_placed_bets_keep_the_ledger_in_step(self):
+        self.assertEqual(BetLedger.objects.filter(tournament=self.tournament).count(), 8)
+        self.assertEqual(Bet.objects.filter(tournament=self.tournament).count(), 8)
+        self.assertEqual(ledger_differences(self.tournament.id), [])
+
+    def test_check_bet_ledger_repairs_drift(self):
+        BetLedger.objects.filter(team=self.teams[0], bet_on_team=self.teams[1]).update(odd1_sum=1000, bet_count=5)
+        BetLedger.objects.filter(team=self.teams[1]).first().delete()
+        self.assertEqual(len(ledger_differences(self.tournament.id)), 2)
+
+        with self.assertRaises(CommandError):
+            call_command('check_bet_ledger', tournament=self.tournament.slug, stdout=io.StringIO())
+        call_command('check_bet_ledger', tournament=self.tournament.slug, fix=True, stdout=io.StringIO())
+        self.assertEqual(ledger_differences(self.tournament.id), [])
+
+    def test_tied_teams_are_ranked_by_id(self):
+        # Every bettor holds the same odds on both winners, the others none.
+        # Teams further ahead come later, so only the ids rank them
+        for distance, team in enumerate(self.teams):
+            Team.objects.filter(id=team.id).update(distance=distance)
+        teams = with_points(Team.objects.filter(tournament=self.tournament), self.teams[0], self.teams[1])
+        self.assertEqual([team.id for team in teams], [team.id for team in self.teams])
+
+
+class StreakTests(TestCase):
+    def setUp(self):
+        self.tournament = create_tournaments(1)[0]
+        self.team, self.opponent = Team.objects.filter(tournament=self.tournament).order_by('id')[:2]
+        # The games are played in rounds of their own
+        Round.objects.filter(tournament=self.tournament).update(active=False)
+        self.rounds = 0
+
+    def play(self, location, team_won):
+        """Play one game of team against opponent in a new joust round and return the round"""
+        self.rounds += 1
+        round_obj = Round.objects.create(tournament=self.tournament, number=self.rounds + 1, stage='joust')
+        game = Game.objects.create(tournament=self.tournament, round=round_obj, team1=self.team,
+                                   team2=self.opponent, location=location)
+        record_game_result(game, team_won)
+        return round_obj
+
+    def streaks(self, team):
+        team.refresh_from_db(fields=['win_streak', 'location_loss_streak'])
+        return team.win_streak, team.location_loss_streak
+
+    def test_losses_at_the_first_location_earn_compensation(self):
+        for losses in range(1, 4):
+            joust_round = self.play(LOCATIONS[0], False)
+            self.assertEqual(self.streaks(self.team), (0, losses))
+            self.assertEqual(self.streaks(self.opponent), (losses, 0))
+
+        bonus_round = move_to_bonus_stage(joust_round.id, [])
+        bonus = Bonus.objects.get(round=bonus_round, team=self.team)
+        self.assertFalse(bonus.finished)
+        self.assertEqual(bonus.description, "Compensation bonus for losing 3 times in a row")
+        self.assertTrue(Bonus.objects.get(round=bonus_round, team=self.opponent).finished)
+
+    def test_streaks_reset(self):
+        self.play(LOCATIONS[0], False)
+        self.play(LOCATIONS[0], False)
+        # A loss elsewhere ends the location streak
+        self.play(LOCATIONS[1], False)
+        self.assertEqual(self.streaks(self.team), (0, 0))
+        self.assertEqual(self.streaks(self.opponent), (3, 0))
+
+        self.play(LOCATIONS[0], False)
+        self.play(LOCATIONS[0], True)
+        self.assertEqual(self.streaks(self.team), (1, 0))
+        self.assertEqual(self.streaks(self.opponent), (0, 1))
+
+    def test_migration_backfills_the_streaks_of_played_games(self):
+        for location, team_won in [(LOCATIONS[0], True), (LOCATIONS[0], False), (LOCATIONS[2], False),
+                                   (LOCATIONS[0], False), (LOCATIONS[0], False)]:
+            self.play(location, team_won)
+        played = [self.streaks(self.team), self.streaks(self.opponent)]
+        self.assertEqual(played, [(0, 2), (4, 0)])
+
+        Team.objects.update(win_streak=0, location_loss_streak=0)
+        migration = importlib.import_module('backend.api.migrations.0004_team_streaks')
+        migration.rebuild_streaks(apps, None)
+        self.assertEqual([self.streaks(self.team), self.streaks(self.opponent)], played)
+
+
+class PairingTests(TestCase):
+    def setUp(self):
+        self.tournament = create_tournaments(1)[0]
+        self.teams = list(Team.objects.filter(tournament=self.tournament).order_by('id'))
+        Round.objects.filter(tournament=self.tournament).update(active=False)
+        joust_round = Round.objects.create(tournament=self.tournament, number=1, stage='joust')
+        # Pairs of teams at the four locations, the first team winning all but the second game
+        for i, location in enumerate(LOCATIONS[:4]):
+            Game.objects.create(tournament=self.tournament, round=joust_round, team1=self.teams[2 * i],
+                                team2=self.teams[2 * i + 1], location=location, finished=True, win=i != 1)
+
+    def test_previous_games_by_team(self):
+        teams = self.teams
+        self.assertEqual(previous_games_by_team(self.tournament.id, 1), {
+            teams[0].id: (LOCATIONS[0], True), teams[1].id: (LOCATIONS[0], False),
+            teams[2].id: (LOCATIONS[1], False), teams[3].id: (LOCATIONS[1], True),
+            teams[4].id: (LOCATIONS[2], True), teams[5].id: (LOCATIONS[2], False),
+            teams[6].id: (LOCATIONS[3], True), teams[7].id: (LOCATIONS[3], False),
+        })
+        self.assertEqual(previous_games_by_team(self.tournament.id, 2), {})
+
+    def test_teams_move_along_the_ladder(self):
+        new_round = Round.objects.create(tournament=self.tournament, number=2, stage='joust', active=True)
+        games = generate_new_game_pairs(new_round.id)
+        seated = {game.location: {game.team1.id, game.team2.id} for game in games}
+        teams = [team.id for team in self.teams]
+        self.assertEqual(seated, {
+            LOCATIONS[0]: {teams[1], teams[2]},
+            LOCATIONS[1]: {teams[0], teams[5]},
+            LOCATIONS[2]: {teams[3], teams[7]},
+            LOCATIONS[3]: {teams[4], teams[6]},
+        })
+
+
+class StandingsTests(TestCase):
+    def setUp(self):
+        # Finishing at 9
+        self.tournament = create_tournaments(1, teams_per_tournament=6)[0]
+        self.teams = list(Team.objects.filter(tournament=self.tournament).order_by('id'))
+
+    def finish(self, leaders):
+        """Move the first teams to the given distances, the others to the start, and check the winner"""
+        for position, team in enumerate(self.teams):
+            team.distance = leaders[position] if position < len(leaders) else 0
+        Team.objects.bulk_update(self.teams, ['distance'])
+        with self.assertNumQueries(STANDINGS_QUERY_BUDGET):
+            first, second, finished = check_tournament_winner(self.tournament)
+        if finished is None:
+            return None
+        return [team.id for team in first], [team.id for team in second]
+
+    def ids(self, *positions):
+        return [self.teams[position].id for position in positions]
+
+    def test_clear_podium(self):
+        self.assertEqual(self.finish([10, 9, 8]), (self.ids(0), self.ids(1)))
+
+    def test_two_tied_first(self):
+        # Second place waits until first is decided
+        self.assertEqual(self.finish([9, 9, 8]), (self.ids(0, 1), []))
+
+    def test_tied_second(self):
+        self.assertEqual(self.finish([8, 10, 8, 8, 7]), (self.ids(1), self.ids(0, 2, 3)))
+
+    def test_nobody_at_the_finish(self):
+        self.assertIsNone(self.finish([8, 8]))
+
+
+class StatementCountMixin:
+    def statements(self, func, count=count_statements):
+        """
+        Run func and return the SQL statements it issued, as the benchmark
+        budgets count them, and its result. Unlike assertNumQueries, the
+        batches SQLite splits one bulk insert into count as one statement;
+        pass count=count_round_trips to count every one of them.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            result = func()
+        return count(queries), result
+
+
+class TransitionQueryTests(StatementCountMixin, TestCase):
+    def play_transitions(self, team_count, count):
+        """Run every stage transition of a round once, returning what count makes of their queries"""
+        tournament = create_tournaments(1, teams_per_tournament=team_count, start=team_count)[0]
+        betting_round = Round.objects.get(tournament=tournament, active=True)
+        counts = {}
+
+        def measure(func):
+            return self.statements(func, count)
+
+        probe_round = Round.objects.create(tournament=tournament, number=0, stage="betting")
+        counts['generate_new_odds'], _ = measure(lambda: generate_new_odds(probe_round.id))
+        counts['move_to_joust_stage'], joust_round = measure(lambda: move_to_joust_stage(betting_round.id))
+        Game.objects.filter(round=joust_round).update(win=True, finished=True)
+        counts['process_winners'], winners = measure(lambda: process_winners(joust_round.id))
+        counts['move_to_bonus_stage'], bonus_round = measure(lambda: move_to_bonus_stage(joust_round.id, winners))
+        Bonus.objects.filter(round=bonus_round).update(finished=True)
+        counts['move_to_new_round'], _ = measure(lambda: move_to_new_round(bonus_round.id))
+        return counts
+
+    def assertWithinBudgets(self, counts, team_count):
+        for transition, budget in TRANSITION_QUERY_BUDGETS.items():
+            with self.subTest(teams=team_count, transition=transition):
+                self.assertLessEqual(counts[transition], budget)
+
+    def test_round_trips_stay_within_budget(self):
+        # Up to 100 teams SQLite sends every bulk write in one query, like Postgres
+        counts = {team_count: self.play_transitions(team_count, count_round_trips) for team_count in (8, 100)}
+        self.assertEqual(counts[8], counts[100])
+        self.assertWithinBudgets(counts[8], 8)
+
+    def test_statements_stay_within_budget(self):
+        # Beyond, SQLite splits bulk writes into batches of 999 parameters
+        self.assertWithinBudgets(self.play_transitions(5000, count_statements), 5000)
+
+
+class StageStatusQueryTests(StatementCountMixin, TestCase):
+    def test_statement_count_does_not_grow_with_teams(self):
+        client = Client()
+        counts = {}
+        for team_count in (8, 100, 1000):
+            tournament = create_tournaments(1, teams_per_tournament=team_count, start=team_count)[0]
+            bonus_round = create_stage_progress(tournament)
+            params = {'round_id': bonus_round.id}
+            if not counts:
+                counts[team_count], response = self.statements(
+                    lambda: client.get('/api/team-stage-statuses/', params))
+            else:
+                with self.assertNumQueries(counts[8]):
+                    response = client.get('/api/team-stage-statuses/', params)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()), team_count)
+        self.assertLessEqual(counts[8], TEAM_STAGE_STATUSES_QUERY_BUDGET)
+
+
+class ConcurrentTransitionTests(TransactionTestCase):
+    """The last submission of a stage arriving many times at once completes it once"""
+    copies = 20
+
+    def setUp(self):
+        self.client = Client()
+        self.tournament = create_tournaments(1)[0]
+        self.teams = list(Team.objects.filter(tournament=self.tournament).order_by('id'))
+
+    def post(self, url, data):
+        response = self.client.post(url, json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def assertTransitionedOnce(self, round_obj, statuses):
+        """Check one copy was accepted and every round left once, returning the round after round_obj"""
+        # The others find their round already replaced
+        self.assertEqual(sorted(set(statuses)), [200, 400])
+        self.assertEqual(statuses.count(200), 1, statuses)
+        previous = list(TournamentEvent.objects.filter(
+            tournament=self.tournament, event_type='round_changed').values_list('data__previous', flat=True))
+        self.assertEqual(previous.count(round_obj.id), 1)
+        self.assertEqual(len(previous), len(set(previous)))
+
+        rounds = Round.objects.filter(tournament=self.tournament)
+        self.assertEqual(rounds.filter(active=True).count(), 1)
+        self.assertEqual(rounds.values('number', 'stage').distinct().count(), rounds.count())
+        transition = TournamentEvent.objects.get(
+            tournament=self.tournament, event_type='round_changed', data__previous=round_obj.id)
+        return Round.objects.get(id=transition.data['round'])
+
+    def test_place_bet_and_mark_game_transition_once(self):
+        betting_round = Round.objects.get(tournament=self.tournament, active=True)
+        for team in self.teams[:-1]:
+            self.post('/api/place-bet/', {
+                'team_id': team.id, 'bet_on_team_id': team.id, 'round_id': betting_round.id,
+            })
+        statuses = fire_concurrently([
+            ('/api/place-bet/', {
+                'team_id': self.teams[-1].id, 'bet_on_team_id': self.teams[0].id, 'round_id': betting_round.id,
+            })
+        ] * self.copies)
+        joust_round = self.assertTransitionedOnce(betting_round, statuses)
+        self.assertEqual(joust_round.stage, 'joust')
+
+        games = list(Game.objects.filter(round=joust_round).order_by('id'))
+        for game in games[:-1]:
+            self.post('/api/mark-game/', {
+                'team_id': game.team1_id, 'game_id': game.id, 'winner_id': game.team1_id,
+                'round_id': joust_round.id,
+            })
+        last_game = games[-1]
+        statuses = fire_concurrently([
+            ('/api/mark-game/', {
+                'team_id': team_id, 'game_id': last_game.id, 'winner_id': team_id, 'round_id': joust_round.id,
+            })
+            for team_id in [last_game.team1_id, last_game.team2_id] * (self.copies // 2)
+        ])
+        self.assertTransitionedOnce(joust_round, statuses)
+
+
+class SecondPlaceTests(TestCase):
+    def test_team_of_another_tournament_is_not_found(self):
+        tournament, elsewhere = create_tournaments(2)
+        team = Team.objects.filter(tournament=tournament).first()
+        response = self.client.post('/api/set-second-place-winner/', json.dumps({
+            'tournament': elsewhere.slug, 'team_id': team.id,
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(TournamentEvent.objects.filter(event_type='teams_moved').exists())
+
+
+@override_settings(TOURNAMENT_CALIBRATION_RUNS=200)
+class CalibrationTests(TransactionTestCase):
+    def post(self, url, data):
+        response = self.client.post(url, json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_positions_are_simulated_outside_the_tournament_lock(self):
+        tournament = create_tournaments(1)[0]
+        Tournament.objects.filter(id=tournament.id).update(odds_mode='calibrated', finish_distance=20)
+        # Nobody reaches a bonus, so the last game result starts round 2
+        Team.objects.filter(tournament=tournament).update(distance=0)
+        get_cache().clear()
+        betting_round = Round.objects.get(tournament=tournament, active=True)
+
+        in_transaction = []
+
+        def simulate(*args, **kwargs):
+            in_transaction.append(connection.in_atomic_block)
+            return simulate_position(*args, **kwargs)
+
+        with patch('backend.api.calibration.simulate_position', simulate):
+            for team in Team.objects.filter(tournament=tournament):
+                self.post('/api/place-bet/', {
+                    'team_id': team.id, 'bet_on_team_id': team.id, 'round_id': betting_round.id,
+                })
+            joust_round = Round.objects.get(tournament=tournament, active=True)
+            for game in Game.objects.filter(round=joust_round):
+                self.post('/api/mark-game/', {
+                    'team_id': game.team1_id, 'game_id': game.id, 'winner_id': game.team1_id,
+                    'round_id': joust_round.id,
+                })
+
+        new_round = Round.objects.get(tournament=tournament, active=True)
+        self.assertEqual((new_round.number, new_round.stage), (2, 'betting'))
+        self.assertEqual(Odds.objects.filter(round=new_round).count(), 8)
+        self.assertEqual(in_transaction, [False])
+
+
+class ASGITests(SimpleTestCase):
+    @override_settings(ROOT_URLCONF=__name__)
+    def test_sync_views_run_concurrently(self):
+        from backend.app.asgi import application
+
+        async def get():
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': '/rendezvous/', 'query_string': b'', 'headers': [],
+                'server': ('testserver', 80),
+            }
+            messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+            sent = []
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                await asyncio.Event().wait()
+
+            async def send(message):
+                sent.append(message)
+
+            await application(scope, receive, send)
+            return sent[0]['status']
+
+        async def get_all():
+            return await asyncio.gather(*[get() for _ in range(rendezvous.parties)])
+
+        # A worker serving one request at a time would break the barrier
+        self.assertEqual(asyncio.run(get_all()), [200] * rendezvous.parties)
+
+
+class ListingTests(TestCase):
+    def setUp(self):
+        self.tournament = create_tournaments(1)[0]
+        self.round = Round.objects.get(tournament=self.tournament, active=True)
+        self.odds_ids = list(Odds.objects.filter(tournament=self.tournament).order_by('id').values_list('id', flat=True))
+
+    def odds(self, **params):
+        response = self.client.get('/api/odds/', {'tournament': self.tournament.slug, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_every_field_by_default(self):
+        row = self.odds()[0]
+        self.assertEqual(row['team_details']['id'], row['team'])
+        self.assertEqual(row['round_details']['id'], self.round.id)
+
+    def test_fields(self):
+        rows = self.odds(fields='id,odd1')
+        self.assertEqual([set(row) for row in rows], [{'id', 'odd1'}] * 8)
+
+    def test_expand(self):
+        row = self.odds(expand='team')[0]
+        self.assertIn('team_details', row)
+        self.assertNotIn('round_details', row)
+
+    def test_compact(self):
+        row = self.odds(compact='1')[0]
+        self.assertNotIn('team_details', row)
+        self.assertNotIn('round_details', row)
+        self.assertIsInstance(row['team'], int)
+
+    def test_nested_objects_take_one_query(self):
+        counts = []
+        for tournament in (self.tournament, create_tournaments(1, teams_per_tournament=40, start=1)[0]):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get('/api/odds/', {'tournament': tournament.slug})
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_cursor_pages_survive_inserts(self):
+        first = self.odds(page_size=5)
+        self.assertEqual([row['id'] for row in first['results']], self.odds_ids[:5])
+
+        # Rows added while paging come after the rows already listed
+        later_round = Round.objects.create(tournament=self.tournament, number=2, stage='betting')
+        added = Odds.objects.create(tournament=self.tournament, round=later_round,
+                                    team=Team.objects.filter(tournament=self.tournament).first(), odd1=3, odd2=2)
+
+        response = self.client.get(first['next'])
+        self.assertEqual(response.status_code, 200)
+        second = response.json()
+        self.assertEqual([row['id'] for row in second['results']], self.odds_ids[5:] + [added.id])
+        self.assertIsNone(second['next'])
+        previous = self.client.get(second['previous']).json()
+        self.assertEqual([row['id'] for row in previous['results']], self.odds_ids[:5])
+
+    def test_ndjson_rows_match_the_json_list(self):
+        for params in ({}, {'compact': '1'}, {'fields': 'id,team,odd2'}):
+            with self.subTest(**params):
+                response = self.client.get('/api/odds/', {
+                    'tournament': self.tournament.slug, 'format': 'ndjson', **params,
+                })
+                self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+                lines = b''.join(response.streaming_content).decode().splitlines()
+                self.assertEqual([json.loads(line) for line in lines], self.odds(**params))
+
+
+class StreamingTests(TestCase):
+    def setUp(self):
+        self.tournament = create_tournaments(1)[0]
+
+    def test_event_stream_over_wsgi_answers_no_content(self):
+        response = Client().get('/api/events/', {'tournament': self.tournament.slug})
+        self.assertEqual(response.status_code, 204)
+
+    def test_ndjson_is_streamed_over_wsgi(self):
+        response = Client().get('/api/teams/', {'tournament': self.tournament.slug, 'format': 'ndjson'})
+        self.assertFalse(response.is_async)
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 8)
+
+    async def test_ndjson_is_streamed_over_asgi(self):
+        response = await AsyncClient().get('/api/teams/', {'tournament': self.tournament.slug, 'format': 'ndjson'})
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(content.splitlines()), 8)
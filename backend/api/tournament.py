@@ -1,126 +1,123 @@
 import random
-from .models import Round, Team, Game, Odds, Bet, Bonus
+from .models import Tournament, Round, Team, Game, Odds, Bet, Bonus
+from .constants import LOCATIONS
+from .odds import new_odds_array
+from .calibration import calibrated_odds_array
+from .simulation import seats_per_location
+from .broadcast import RESYNC, publish_state_on_commit, publish_diff_on_commit
+from .serializers import TeamSerializer, BonusSerializer
+from .standings import Standings
+from .ledger import with_points
+from .events import WHOLE_TOURNAMENT, record_event, record_transition, take_changes, team_changes
 import logging
-from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, Now
 
 # Get a logger for this file
 logger = logging.getLogger(__name__)
 
+# Odds generators selectable per tournament through Tournament.odds_mode
+ODDS_GENERATORS = {
+    'quadratic': new_odds_array,
+    'calibrated': calibrated_odds_array,
+}
 
-# locations
-LOCATIONS = [
-    "Biblioteka",
-    "Stalas",
-    "Sofa",
-    "Lova"
-]
 
-def new_odds_logic(distances: list[int], finish_distance: int) -> list[tuple]:
+def bump_version(tournament_id, resync=False):
     """
-    Calculate odds for teams based on their distances from the finish line.
-    
-    Args:
-        distances: List of team distances
-        finish_distance: Distance needed to finish the tournament
-    
-    Returns:
-        List of tuples (odd1, odd2) for each team
+    Mark the tournament as changed, so clients fetch it again. Writes that
+    publish no dashboard diff of their own pass resync, making dashboards
+    reload their snapshot instead.
+
+    Cached responses are dropped as far as the events this thread recorded
+    reach: those of the teams they changed, or every one of the tournament.
     """
-    # Find max and min distances
-    max_distance = max(distances) if distances else 0
-    min_distance = min(distances) if distances else 0
-    
-    results = []
-    
-    # If all teams are at the same distance, assign default odds
-    if max_distance == min_distance:
-        default_odd1 = 2
-        default_odd2 = 1
-        return [(default_odd1, default_odd2) if i < len(distances) - 1 else (0, 0) 
-                for i in range(len(distances))]
-    
-    # Range of distances between teams
-    distance_range = max_distance - min_distance
-    
-    for distance in distances:
-        # Check if this team is the leader (closest to finish)
-        if distance == max_distance and len(distances) > 1:
-            # Leading team gets odds of 0
-            results.append((0, 0))
-            continue
-        
-        # Calculate relative position (0 = furthest behind, 1 = closest to leader)
-        relative_position = (distance - min_distance) / distance_range
-        
-        # Gap factor: teams further from leader get higher odds
-        # Non-linear relationship to accentuate differences
-        position_factor = 1 - relative_position  # 0 = closest to leader, 1 = furthest back
-        
-        # Base multiplier depends only on relative position
-        # Using a cubic function for more dramatic differences
-        base_multiplier = 3.0 + (position_factor ** 2) * 28.0
-        
-        # Calculate odds
-        odd1 = max(0, base_multiplier)
-        
-        # odd2 is always lower than odd1 but still proportional
-        odd2 = max(0, odd1 * 0.7)
-        
-        # Round to nearest integer
-        odd1 = round(odd1)
-        odd2 = round(odd2)
-        
-        results.append((odd1, odd2))
-    
-    return results
+    changed_teams = take_changes(tournament_id)
+    whole_tournament = resync or changed_teams is WHOLE_TOURNAMENT
+    Tournament.objects.filter(id=tournament_id).update(
+        version=models.F('version') + 1,
+        modified=Now(),
+        **({'cache_version': models.F('cache_version') + 1} if whole_tournament else {})
+    )
+    if not whole_tournament and changed_teams:
+        Team.objects.filter(id__in=changed_teams).update(cache_version=models.F('cache_version') + 1)
+    publish_state_on_commit(tournament_id)
+    if resync:
+        publish_diff_on_commit(tournament_id, lambda: RESYNC)
 
+# Dashboard diffs, built from the rows a write already holds
+
+def round_data(round_obj):
+    """The fields of a round the dashboard shows, as returned by get-round-info"""
+    return {
+        'round_id': round_obj.id,
+        'stage': round_obj.stage,
+        'number': round_obj.number
+    }
+
+def game_data(game):
+    """The fields of a game the dashboard shows"""
+    return {
+        'id': game.id,
+        'round': game.round_id,
+        'team1': game.team1_id,
+        'team2': game.team2_id,
+        'location': game.location,
+        'finished': game.finished,
+        'win': game.win
+    }
+
+def publish_diff(tournament_id, diff_type, teams=(), **changes):
+    """
+    Publish a dashboard diff once the current transaction commits. teams are
+    the Team instances the write changed and are sent whole, changes are the
+    other fields of the diff.
+    """
+    publish_diff_on_commit(tournament_id, lambda: {
+        'type': diff_type,
+        'teams': TeamSerializer(teams, many=True).data,
+        **changes
+    })
+
+def publish_round_changed(new_round, **changes):
+    """Publish the round a transition made active"""
+    publish_diff(new_round.tournament_id, 'round_changed', round=round_data(new_round), **changes)
 
 def generate_new_odds(round_id):
     """Generate new odds for the given round based on team distances."""
-    round_obj = Round.objects.get(id=round_id)
-    teams = Team.objects.all()
+    round_obj = Round.objects.select_related('tournament').get(id=round_id)
+    tournament = round_obj.tournament
+    teams = list(Team.objects.filter(tournament=tournament))
     
-    # Get finish distance from settings
-    finish_distance = settings.TOURNAMENT_FINISH_DISTANCE
+    # Get finish distance from the tournament
+    finish_distance = tournament.finish_distance
     
     # Get all team distances
     team_distances = [team.distance for team in teams]
     
-    # Calculate odds using the logic function
-    odds_results = new_odds_logic(team_distances, finish_distance)
+    # Calculate odds for the whole field at once with the tournament's generator
+    odds_generator = ODDS_GENERATORS[tournament.odds_mode]
+    odds_results = odds_generator(team_distances, finish_distance).tolist()
     
-    # Create the odds objects in the database
+    # Build the odds objects in memory and write them in one go
+    odds_objects = []
     for team, (odd1, odd2) in zip(teams, odds_results):
-        Odds.objects.create(
+        odds_objects.append(Odds(
+            tournament=tournament,
             round=round_obj,
             team=team,
             odd1=odd1,
             odd2=odd2
-        )
+        ))
         
         logger.debug(f"Team {team.name}: distance={team.distance}, odds={odd1}/{odd2}")
-    
-    return True
+    return Odds.objects.bulk_create(odds_objects)
 
 def all_bets_placed(round_id):
-    """Check if all teams have placed bets for this round"""
-    round_obj = Round.objects.get(id=round_id)
-    teams = Team.objects.all()
-
-    # For each team, check if they have atleast one bet with bet_finished=True
-    for team in teams:
-        bets = Bet.objects.filter(team=team, round=round_obj)
-        
-        bet_finished = False
-        for bet in bets:
-            if bet.bet_finish:
-                bet_finished = True
-                break
-        if not bet_finished:
-            return False
-    return True
+    """Check if all teams have placed their last bet for this round"""
+    return Round.objects.values_list('pending_bets', flat=True).get(id=round_id) <= 0
 
+@transaction.atomic
 def move_to_joust_stage(round_id):
     """Move from betting stage to joust stage"""
     current_round = Round.objects.get(id=round_id)
@@ -128,27 +125,39 @@ def move_to_joust_stage(round_id):
     
     # Set current round as inactive
     current_round.active = False
-    current_round.save()
+    current_round.save(update_fields=['active', 'modified'])
 
     # Generate game pairs only for the first round
+    games = []
+    created = []
     if current_round.number == 1:
         
         # Create new round with joust stage
         new_round = Round.objects.create(
+            tournament_id=current_round.tournament_id,
             number=current_round.number,
             active=True,
             stage="joust"
         )
 
         games = generate_new_game_pairs_first_round(new_round.id)
+        # Stored by the pairing, set on the round returned too
+        new_round.pending_games = len(games)
+        created = [new_round, *games]
         logger.info("Generated %d initial game pairs for round 1", len(games))
     else:
         # Get the next joust round and set it as active
-        new_round = Round.objects.get(number=current_round.number, stage="joust")
+        new_round = Round.objects.get(
+            tournament_id=current_round.tournament_id,
+            number=current_round.number,
+            stage="joust"
+        )
         new_round.active = True
-        new_round.save()
+        new_round.save(update_fields=['active', 'modified'])
     
     logger.info("Moving to joust stage for round %s", new_round.number)
+    record_transition(current_round, new_round, created)
+    publish_round_changed(new_round, games=[game_data(game) for game in games])
     return new_round
 
 # Joust stage
@@ -156,58 +165,77 @@ def move_to_joust_stage(round_id):
 def generate_new_game_pairs_first_round(round_id):
     """Generate game pairs for the first round with random locations"""
     round_obj = Round.objects.get(id=round_id)
-    teams = list(Team.objects.all())
+    teams = list(Team.objects.filter(tournament_id=round_obj.tournament_id))
     
     # Determine how many locations to use based on team count
     team_count = len(teams)
     location_count = min(len(LOCATIONS), max(2, team_count // 2))
     active_locations = LOCATIONS[:location_count]
     
+    seats = seats_per_location(team_count)
+    
     random.shuffle(teams)
     games=[]
     for i in range(0, len(teams), 2):
-        location = active_locations[i // 2]
-        game = Game.objects.create(
-        team1=teams[i],
-        team2=teams[i + 1],
-        round=round_obj,
-        location=location,
-        finished=False
-    )
-    games.append(game)
+        location = active_locations[i // seats]
+        games.append(Game(
+            tournament_id=round_obj.tournament_id,
+            team1=teams[i],
+            team2=teams[i + 1],
+            round=round_obj,
+            location=location,
+            finished=False
+        ))
 
-    return games
+    Round.objects.filter(id=round_id).update(pending_games=len(games))
+    return Game.objects.bulk_create(games)
+
+def previous_games_by_team(tournament_id, round_number):
+    """
+    Map every team that played in the given round number to the location of
+    its game and whether it won, loaded in one query.
+    """
+    games = Game.objects.filter(
+        tournament_id=tournament_id,
+        round__number=round_number
+    ).order_by('created').values_list('team1_id', 'team2_id', 'location', 'win')
+    
+    # Later games overwrite earlier ones, so every team keeps its most recent game
+    previous_games = {}
+    for team1_id, team2_id, location, win in games:
+        # Team won if it was team1 and win is True, or team2 and win is False
+        previous_games[team1_id] = (location, bool(win))
+        previous_games[team2_id] = (location, not win)
+    return previous_games
 
 def generate_new_game_pairs(round_id):
     """Generate game pairs for the given round based on team locations"""
     round_obj = Round.objects.get(id=round_id)
-    teams = list(Team.objects.all())
+    teams = list(Team.objects.filter(tournament_id=round_obj.tournament_id))
     
     # Determine how many locations to use based on team count
     team_count = len(teams)
     location_count = min(len(LOCATIONS), max(2, team_count // 2))
     active_locations = LOCATIONS[:location_count]
+    seats = seats_per_location(team_count)
     
     # Check for location preferences from bonuses
     team_preferences = {}
     team_locations = {}
     misplaced_teams = []
     
-    # Get the previous bonus round for this round number - 1
+    # Get location selections from the bonus round of round number - 1
     try:
         prev_round_number = round_obj.number - 1
-        prev_bonus_rounds = Round.objects.filter(number=prev_round_number, stage="bonus")
+        location_bonuses = Bonus.objects.filter(
+            tournament_id=round_obj.tournament_id,
+            round__number=prev_round_number,
+            round__stage="bonus",
+            bonus_type='select_location',
+            finished=True
+        ).select_related('team')
         
-        if prev_bonus_rounds.exists():
-            prev_bonus_round = prev_bonus_rounds.first()
-            
-            # Get location selections from bonuses
-            location_bonuses = Bonus.objects.filter(
-                round=prev_bonus_round,
-                bonus_type='select_location',
-                finished=True
-            )
-            
+        if location_bonuses:
             # Create a mapping of locations to the teams that selected them
             location_selections = {}
             for bonus in location_bonuses:
@@ -220,10 +248,10 @@ def generate_new_game_pairs(round_id):
             
             logger.info(f"Found location preferences: {location_selections}")
             
-            # Assign teams to their preferred locations (max 2 teams per location)
+            # Assign teams to their preferred locations (max `seats` teams per location)
             for location, location_teams in location_selections.items():
                 for idx, team in enumerate(location_teams):
-                    if idx < 2:  # Only consider the first 2 teams for each location
+                    if idx < seats:  # Only consider the first teams that fit each location
                         if location not in team_locations:
                             team_locations[location] = []
                         team_locations[location].append(team)
@@ -235,22 +263,15 @@ def generate_new_game_pairs(round_id):
     # Shuffle the remaining teams to avoid bias
     random.shuffle(remaining_teams)
     
+    # Index the previous round's games by team in a single query
+    previous_games = previous_games_by_team(round_obj.tournament_id, round_obj.number - 1)
+    
     # Determine location for teams with no preference based on previous game results
     for team in remaining_teams:
-        # Find the team's most recent game
-        prev_games = Game.objects.filter(
-            models.Q(team1=team) | models.Q(team2=team),
-            round__number=round_obj.number - 1
-        ).order_by('-created')
-        
-        if prev_games.exists():
-            prev_game = prev_games.first()
-            prev_location = prev_game.location
+        if team.id in previous_games:
+            prev_location, won = previous_games[team.id]
             prev_location_index = active_locations.index(prev_location)
             
-            # Team won if it was team1 and win is True, or team2 and win is False
-            won = (team == prev_game.team1 and prev_game.win) or (team == prev_game.team2 and not prev_game.win)
-            
             if won:
                 # Move up one location if won, unless already at top
                 new_location_index = min(prev_location_index + 1, location_count - 1)
@@ -264,54 +285,144 @@ def generate_new_game_pairs(round_id):
             logger.error(f"Couldn't determine location for team {team.name} based on previous games")
             raise Exception("Couldn't determine location for all teams")
         
-        # Check if we can add this team to the location (max 2 teams per location)
+        # Check if we can add this team to the location (max `seats` teams per location)
         if location not in team_locations:
             team_locations[location] = [team]
-        elif len(team_locations[location]) < 2:
+        elif len(team_locations[location]) < seats:
             team_locations[location].append(team)
         else:
             # This location is full, add to misplaced teams
             misplaced_teams.append(team)
     
-    # Handle misplaced teams - assign them to locations with fewer than 2 teams
+    # Handle misplaced teams - assign them to locations with free seats
     for team in misplaced_teams:
         for location in active_locations:
             if location not in team_locations:
                 team_locations[location] = [team]
                 break
-            elif len(team_locations[location]) < 2:
+            elif len(team_locations[location]) < seats:
                 team_locations[location].append(team)
                 break
     
+    # A location left with an odd number of teams passes its last one on
+    for location, next_location in zip(active_locations, active_locations[1:]):
+        if len(team_locations.get(location, [])) % 2:
+            team_locations.setdefault(next_location, []).insert(0, team_locations[location].pop())
+    
     # Create games for each location
     games = []
     
     for location, location_teams in team_locations.items():
-        # Only create games for locations with exactly 2 teams
-        if len(location_teams) == 2:
-            game = Game.objects.create(
-                team1=location_teams[0],
-                team2=location_teams[1],
-                round=round_obj,
-                location=location,
-                finished=False
-            )
-            games.append(game)
-            logger.info(f"Created game at {location} between {location_teams[0].name} and {location_teams[1].name}")
+        # Only create games for locations with an even number of teams, paired in seating order
+        if len(location_teams) % 2 == 0:
+            for team1, team2 in zip(location_teams[::2], location_teams[1::2]):
+                games.append(Game(
+                    tournament_id=round_obj.tournament_id,
+                    team1=team1,
+                    team2=team2,
+                    round=round_obj,
+                    location=location,
+                    finished=False
+                ))
+                logger.info("Created game at %s between %s and %s", location, team1.name, team2.name)
         else:
             logger.error(f"Location {location} has {len(location_teams)} teams")
             raise Exception("Invalid number of teams per location")
     
-    return games
+    Round.objects.filter(id=round_id).update(pending_games=len(games))
+    return Game.objects.bulk_create(games)
+
+@transaction.atomic
+def record_game_result(game, team1_won):
+    """Record the winner of a game and update both teams' streaks"""
+    game.win = team1_won
+    game.finished = True
+    game.save()
+    Round.objects.filter(id=game.round_id).update(pending_games=models.F('pending_games') - 1)
+    record_event(game.tournament_id, 'game_marked', changed_teams=[game.team1_id, game.team2_id],
+                 game=game.id, win=team1_won)
+    publish_diff(game.tournament_id, 'game_marked', game=game_data(game))
+    
+    winner_id, loser_id = (game.team1_id, game.team2_id) if team1_won else (game.team2_id, game.team1_id)
+    Team.objects.filter(id=winner_id).update(
+        win_streak=models.F('win_streak') + 1,
+        location_loss_streak=0,
+        modified=Now()
+    )
+    Team.objects.filter(id=loser_id).update(
+        win_streak=0,
+        location_loss_streak=models.F('location_loss_streak') + 1 if game.location == LOCATIONS[0] else 0,
+        modified=Now()
+    )
+    return game
+
+@transaction.atomic
+def rebuild_streaks(tournament):
+    """Recalculate every team's streaks from the finished games of a tournament"""
+    teams = {team.id: team for team in Team.objects.filter(tournament=tournament)}
+    for team in teams.values():
+        team.win_streak = 0
+        team.location_loss_streak = 0
+    
+    games = Game.objects.filter(tournament=tournament, finished=True).order_by(
+        'round__number', 'created'
+    ).values_list('team1_id', 'team2_id', 'location', 'win')
+    for team1_id, team2_id, location, win in games:
+        winner, loser = (teams[team1_id], teams[team2_id]) if win else (teams[team2_id], teams[team1_id])
+        winner.win_streak += 1
+        winner.location_loss_streak = 0
+        loser.win_streak = 0
+        loser.location_loss_streak = loser.location_loss_streak + 1 if location == LOCATIONS[0] else 0
+    
+    Team.objects.bulk_update(teams.values(), ['win_streak', 'location_loss_streak'])
+    return list(teams.values())
 
 def all_games_finished(round_id):
     """Check if all games in the round are finished"""
-    round_obj = Round.objects.get(id=round_id)
-    games = Game.objects.filter(round=round_obj)
-    for game in games:
-        if not game.finished:
-            return False
-    return True
+    return Round.objects.values_list('pending_games', flat=True).get(id=round_id) <= 0
+
+def recount_pending(rounds):
+    """
+    Annotate rounds with their pending counters recounted from the bets,
+    games and bonuses they hold, as expected_bets, expected_games and
+    expected_bonuses.
+    """
+    team_count = Team.objects.filter(
+        tournament=models.OuterRef('tournament')
+    ).values('tournament').annotate(count=models.Count('id')).values('count')
+    return rounds.annotate(
+        team_count=models.Subquery(team_count),
+        finished_bettors=models.Count(
+            'bets__team', filter=models.Q(bets__bet_finish=True), distinct=True
+        ),
+        expected_games=models.Count('games', filter=models.Q(games__finished=False), distinct=True),
+        expected_bonuses=models.Count('bonuses', filter=models.Q(bonuses__finished=False), distinct=True),
+    ).annotate(
+        # Only betting rounds wait for bets
+        expected_bets=models.Case(
+            models.When(
+                stage="betting",
+                then=Coalesce('team_count', 0) - models.F('finished_bettors')
+            ),
+            default=0,
+        ),
+    )
+
+# Models whose rows the pending counters count, the teams for pending_bets
+PENDING_SOURCES = (Team, Round, Game, Bet, Bonus)
+
+def refresh_pending(tournament_id):
+    """
+    Store the pending counters of every round of a tournament recounted from
+    its rows, after writes made outside the game flow
+    """
+    rounds = list(recount_pending(Round.objects.filter(tournament_id=tournament_id)))
+    for round_obj in rounds:
+        round_obj.pending_bets = round_obj.expected_bets
+        round_obj.pending_games = round_obj.expected_games
+        round_obj.pending_bonuses = round_obj.expected_bonuses
+    Round.objects.bulk_update(rounds, ['pending_bets', 'pending_games', 'pending_bonuses'])
+    return rounds
 
 def move_track(team_id, distance=1):
     """Update team's distance based on win"""
@@ -322,283 +433,307 @@ def move_track(team_id, distance=1):
 
 def process_winners(round_id):
     """Process all winners of the round's games, increasing their distance"""
-    round_obj = Round.objects.get(id=round_id)
-    games = Game.objects.filter(round=round_obj)
+    games = Game.objects.filter(round_id=round_id).values_list('team1_id', 'team2_id', 'win')
+    winner_ids = [team1_id if win else team2_id for team1_id, team2_id, win in games]
     
-    winners = []
-    for game in games:
-        winner_team = game.team1 if game.win else game.team2
-        move_track(winner_team.id)
-        winners.append(winner_team)
+    # Move every winner one step forward with a single update
+    Team.objects.filter(id__in=winner_ids).update(distance=models.F('distance') + 1, modified=Now())
     
+    winners = list(Team.objects.filter(id__in=winner_ids))
+    if winners:
+        record_event(winners[0].tournament_id, 'teams_moved', changed_teams=winner_ids,
+                     teams=team_changes(winners, 'distance'))
+        publish_diff(winners[0].tournament_id, 'teams_moved', winners)
     return winners
 
+@transaction.atomic
 def move_to_bonus_stage(round_id, winners):
     """Move from joust stage to bonus stage"""
     current_round = Round.objects.get(id=round_id)
     
-    # Create new round with bonus stage
-    new_round = Round.objects.create(
-        number=current_round.number,
-        active=True,
-        stage="bonus"
-    )
-    
     # Set current round as inactive
     current_round.active = False
-    current_round.save()
+    current_round.save(update_fields=['active', 'modified'])
     
     # Create bonuses for all teams
     # Set bonus as finished for not winning teams
     # Winning teams will get bonus every 3 distance
-    teams = Team.objects.all()
+    teams = Team.objects.filter(tournament_id=current_round.tournament_id)
+    winner_ids = {team.id for team in winners}
+    bonuses = []
     for team in teams:
-        if team in winners and team.distance % 3 == 0:
-            Bonus.objects.create(
+        if team.id in winner_ids and team.distance % 3 == 0:
+            bonuses.append(Bonus(
+                tournament_id=current_round.tournament_id,
                 team=team,
-                round=new_round,
                 finished=False,
                 description="Bonus for stepping every 3 distance"
-            )
+            ))
             logger.info(f"Team {team.name} got a bonus for stepping every 3 distance")
         else:
             # Check if the team has lost 3 times in a row in the LOCATIONS[0]
-            prev_games = Game.objects.filter(
-                models.Q(team1=team) | models.Q(team2=team)
-            ).order_by('-created')
-            loser_3_times = False
-            if prev_games.count() >= 3:
-                loses_in_row = 0
-                for i in range(3):
-                    if prev_games[i].location == LOCATIONS[0] and prev_games[i].win is False:
-                        loses_in_row += 1
-                    else:
-                        break
-
-                if loses_in_row > 0 and loses_in_row % 3 == 0:
-                    loser_3_times = True
+            loser_3_times = team.location_loss_streak >= 3
 
             if loser_3_times:
-                Bonus.objects.create(
+                bonuses.append(Bonus(
+                    tournament_id=current_round.tournament_id,
                     team=team,
-                    round=new_round,
                     finished=False,
                     description="Compensation bonus for losing 3 times in a row"
-                )
+                ))
                 logger.info(f"Team {team.name} got a bonus for losing 3 times in a row")
             else:
-                Bonus.objects.create(
+                bonuses.append(Bonus(
+                    tournament_id=current_round.tournament_id,
                     team=team,
-                    round=new_round,
                     finished=True,
                     description="No bonus this round"
-                )
+                ))
     
+    # Create new round with bonus stage, waiting for the bonuses handed out
+    new_round = Round.objects.create(
+        tournament_id=current_round.tournament_id,
+        number=current_round.number,
+        active=True,
+        stage="bonus",
+        pending_bonuses=sum(1 for bonus in bonuses if not bonus.finished)
+    )
+    for bonus in bonuses:
+        bonus.round = new_round
+    Bonus.objects.bulk_create(bonuses)
+    
+    record_transition(current_round, new_round, [new_round, *bonuses])
+    publish_round_changed(new_round, bonuses=BonusSerializer(bonuses, many=True).data)
     return new_round
 
 # Bonus stage
 
 def all_bonuses_used(round_id):
     """Check if all teams have used their bonuses for this round"""
-    round_obj = Round.objects.get(id=round_id)
-    bonuses = Bonus.objects.filter(round=round_obj)
-    for bonus in bonuses:
-        if not bonus.finished:
-            return False
-    return True
+    return Round.objects.values_list('pending_bonuses', flat=True).get(id=round_id) <= 0
 
+@transaction.atomic
 def move_to_new_round(round_id):
     """Start a new round with betting stage after bonus stage"""
     current_round = Round.objects.get(id=round_id)
-    teams = list(Team.objects.all())
 
     # Increase the number of bets_available for all teams
-    for team in teams:
-        team.bets_available += 1
-        team.save()
-    
-    # Create new round with betting stage
-    new_round = Round.objects.create(
-        number=current_round.number + 1,
-        active=True,
-        stage="betting"
+    team_count = Team.objects.filter(tournament_id=current_round.tournament_id).update(
+        bets_available=models.F('bets_available') + 1,
+        modified=Now()
     )
     
     # Set current round as inactive
     current_round.active = False
-    current_round.save()
+    current_round.save(update_fields=['active', 'modified'])
+    
+    # Create the betting round and the joust round that follows it
+    new_round, new_joust_round = Round.objects.bulk_create([
+        Round(
+            tournament_id=current_round.tournament_id,
+            number=current_round.number + 1,
+            active=True,
+            stage="betting",
+            pending_bets=team_count
+        ),
+        Round(
+            tournament_id=current_round.tournament_id,
+            number=current_round.number + 1,
+            active=False,
+            stage="joust"
+        ),
+    ])
     
     # Generate odds for the new round
-    generate_new_odds(new_round.id)
+    odds = generate_new_odds(new_round.id)
     
     # Generate game pairs for the new round
-    new_joust_round = Round.objects.create(
-        number=new_round.number,
-        active=False,
-        stage="joust"
-    )
     games = generate_new_game_pairs(new_joust_round.id)
+    new_joust_round.pending_games = len(games)
     logger.info("Generated %d game pairs for round %s", len(games), new_round.number)
     
+    record_transition(current_round, new_round, [new_round, new_joust_round, *odds, *games], bets_granted=1)
+    # Every team got one more bet above
+    publish_round_changed(new_round, games=[game_data(game) for game in games], bets_granted=1)
     return new_round
 
+def stage_statuses_by_team(round_obj):
+    """
+    Map every team of the tournament to whether it finished betting, played
+    its joust and used its bonus in the rounds with the number of round_obj,
+    in two queries
+    """
+    def rounds(stage):
+        """The rounds of a stage with this number, for the indexes on team and round"""
+        return Round.objects.filter(
+            tournament_id=round_obj.tournament_id, number=round_obj.number, stage=stage
+        ).values('id')
+    
+    # Teams that played a finished game in a joust round with this number
+    joust_finished = set()
+    for team1_id, team2_id in Game.objects.filter(
+        round__in=rounds('joust'), finished=True
+    ).values_list('team1_id', 'team2_id'):
+        joust_finished.update((team1_id, team2_id))
+    
+    # Every team, with whether it placed its last bet in a betting round and
+    # used a bonus in a bonus round with this number
+    teams = Team.objects.filter(tournament_id=round_obj.tournament_id).annotate(
+        bet_finished=models.Exists(Bet.objects.filter(
+            team=models.OuterRef('pk'), round__in=rounds('betting'), bet_finish=True
+        )),
+        bonus_used=models.Exists(Bonus.objects.filter(
+            team=models.OuterRef('pk'), round__in=rounds('bonus'), finished=True
+        )),
+    )
+    
+    result = {}
+    for team_id, bet_finished, bonus_used in teams.values_list('id', 'bet_finished', 'bonus_used'):
+        result[team_id] = {
+            'bet_finished': bet_finished,
+            'joust_finished': team_id in joust_finished,
+            'bonus_used': bonus_used
+        }
+    return result
+
 # Final and Finished stages
 
-def check_tournament_winner():
-    """Check if there's a winner or tie at the finish line"""
-    finish_distance = settings.TOURNAMENT_FINISH_DISTANCE
-    
-    # Find all teams at or beyond finish distance
-    potential_winners = Team.objects.filter(distance__gte=finish_distance).order_by('-distance')
-    
-    if not potential_winners.exists():
-        return None, None, None
-    
-    # Get the highest distance achieved
-    max_distance = potential_winners.first().distance
-    
-    # Get all teams at the highest distance (could be ties)
-    teams_at_max = Team.objects.filter(distance=max_distance).order_by('id')
-    
-    # Get second highest distance teams (for second place consideration)
-    if teams_at_max.count() == 1:
-        # If we have a clear winner, look for second place
-        second_highest = Team.objects.filter(distance__lt=max_distance).order_by('-distance')
-        if second_highest.exists():
-            second_max_distance = second_highest.first().distance
-            teams_at_second_max = Team.objects.filter(distance=second_max_distance).order_by('id')
-        else:
-            teams_at_second_max = []
-    else:
-        # If we have ties for first, there's no second place yet
-        teams_at_second_max = []
-    
-    # Return the tie situation
-    return teams_at_max, teams_at_second_max, max_distance >= finish_distance
+def check_tournament_winner(tournament):
+    """
+    Check if there's a winner or tie at the finish line: the lists of teams
+    tied for first and for second place, and whether the finish was reached
+    """
+    return Standings(tournament.id, places=2).finish_ties(tournament.finish_distance)
 
+@transaction.atomic
 def move_to_final_stage(round_id, first_place_ties=None, second_place_ties=None):
     """Create a final round for resolving ties"""
     current_round = Round.objects.get(id=round_id)
     
+    # Set current round as inactive
+    current_round.active = False
+    current_round.save(update_fields=['active', 'modified'])
+    
     # Create new round with final stage
     new_round = Round.objects.create(
+        tournament_id=current_round.tournament_id,
         number=current_round.number,
         active=True,
         stage="final"
     )
     
-    # Set current round as inactive
-    current_round.active = False
-    current_round.save()
-    
     # Create games for first place ties if needed
+    games = []
     if first_place_ties and len(first_place_ties) == 2:
-        Game.objects.create(
+        games.append(Game.objects.create(
+            tournament_id=current_round.tournament_id,
             team1=first_place_ties[0],
             team2=first_place_ties[1],
             round=new_round,
             finished=False
-        )
+        ))
         logger.info(f"Created final game for first place between {first_place_ties[0].name} and {first_place_ties[1].name}")
     
     # Create games for second place ties if needed
     if second_place_ties and len(second_place_ties) == 2:
-        Game.objects.create(
+        games.append(Game.objects.create(
+            tournament_id=current_round.tournament_id,
             team1=second_place_ties[0],
             team2=second_place_ties[1],
             round=new_round,
             finished=False
-        )
+        ))
         logger.info(f"Created final game for second place between {second_place_ties[0].name} and {second_place_ties[1].name}")
     
+    # Count the tiebreakers that have to be played
+    new_round.pending_games = len(games)
+    new_round.save(update_fields=['pending_games', 'modified'])
+    
+    record_transition(current_round, new_round, [new_round, *games])
+    publish_round_changed(new_round, games=[game_data(game) for game in games])
     return new_round
 
+@transaction.atomic
 def move_to_final_multiple_ties_stage(round_id, first_place, second_place_ties):
     """Create a special final round for resolving multiple ties for second place"""
     current_round = Round.objects.get(id=round_id)
     
+    # Set current round as inactive
+    current_round.active = False
+    current_round.save(update_fields=['active', 'modified'])
+    
     # Create new round with special final-multiple-ties stage
     new_round = Round.objects.create(
+        tournament_id=current_round.tournament_id,
         number=current_round.number,
         active=True,
         stage="final-multiple-ties"
     )
     
-    # Set current round as inactive
-    current_round.active = False
-    current_round.save()
-    
     # Log the first place winner and the ties for second place
     logger.info(f"Moving to final-multiple-ties stage with {first_place.name} as first place.")
     logger.info(f"Second place ties: {', '.join([team.name for team in second_place_ties])}")
     
+    record_transition(current_round, new_round, [new_round])
+    publish_round_changed(new_round)
     return new_round
 
+@transaction.atomic
 def move_to_finished_stage(round_id, first_place=None, second_place=None):
     """Create a final round marking the tournament as finished with winners"""
     current_round = Round.objects.get(id=round_id)
     
+    # Set current round as inactive
+    current_round.active = False
+    current_round.save(update_fields=['active', 'modified'])
+    
     # Create new round with finished stage
     new_round = Round.objects.create(
+        tournament_id=current_round.tournament_id,
         number=current_round.number,
         active=True,
         stage="finished"
     )
     
-    # Set current round as inactive
-    current_round.active = False
-    current_round.save()
-    
     # Store winners in round description or properties
     if first_place:
         logger.info(f"Tournament finished with {first_place.name} in first place!")
     if second_place:
         logger.info(f"Tournament finished with {second_place.name} in second place!")
     
+    record_transition(current_round, new_round, [new_round])
+    publish_round_changed(new_round)
     return new_round
 
-def calculate_betting_results():
+def calculate_betting_results(tournament):
     """Calculate betting results based on first and second place winners"""
     # Find the active round with 'finished' stage
     try:
-        finished_round = Round.objects.get(active=True, stage='finished')
+        finished_round = Round.objects.get(tournament=tournament, active=True, stage='finished')
     except Round.DoesNotExist:
         logger.error("No active finished round found for calculating betting results")
         return None
     
-    # Get first place (team with highest distance)
-    first_place = Team.objects.all().order_by('-distance').first()
-    
-    # Get second place (team with second highest distance)
-    second_place = Team.objects.all().exclude(id=first_place.id).order_by('-distance').first()
+    # First and second place are the two teams furthest ahead
+    standings = Standings(tournament.id, places=2)
+    first_place = standings.first_place
+    second_place = standings.second_place
     
     if not first_place or not second_place:
         logger.error("Couldn't determine first or second place for betting results")
         return None
     
-    # Calculate betting points for each team
-    teams = Team.objects.all()
-    results = []
-    
-    for team in teams:
-        # Get all bets by this team on the winners
-        first_place_bets = Bet.objects.filter(team=team, bet_on_team=first_place)
-        second_place_bets = Bet.objects.filter(team=team, bet_on_team=second_place)
-        
-        # Sum up betting points
-        first_place_points = sum([bet.odds.odd1 for bet in first_place_bets]) if first_place_bets else 0
-        second_place_points = sum([bet.odds.odd2 for bet in second_place_bets]) if second_place_bets else 0
-        total_points = first_place_points + second_place_points
-        
-        results.append({
+    # Betting points of every team, best first, read from the bet ledger
+    teams = with_points(Team.objects.filter(tournament=tournament), first_place, second_place)
+    results = [
+        {
             'team': team,
-            'first_place_points': first_place_points,
-            'second_place_points': second_place_points,
-            'total_points': total_points
-        })
-    
-    # Sort by total points (descending)
-    results.sort(key=lambda x: x['total_points'], reverse=True)
+            'first_place_points': team.first_place_points,
+            'second_place_points': team.second_place_points,
+            'total_points': team.total_points
+        }
+        for team in teams
+    ]
     
     return {
         'first_place': first_place,
@@ -606,29 +741,34 @@ def calculate_betting_results():
         'betting_results': results
     }
 
-def increment_finish_distance():
+def increment_finish_distance(tournament):
     """Increment the finish distance when there are multiple ties"""
     # This would require updating the setting, which is not possible directly
     # Instead, we'll use a Round property to track the effective finish_distance
     try:
-        active_round = Round.objects.get(active=True)
-        
-        # Create a new round with incremented finish distance
-        new_round = Round.objects.create(
-            number=active_round.number + 1,
-            active=True,
-            stage="betting"  # Reset to betting stage for the next round
-        )
-        
-        active_round.active = False
-        active_round.save()
-        
-        # Generate odds for the new round
-        generate_new_odds(new_round.id)
+        with transaction.atomic():
+            active_round = Round.objects.get(tournament=tournament, active=True)
+            
+            active_round.active = False
+            active_round.save(update_fields=['active', 'modified'])
+            
+            # Create a new round with incremented finish distance
+            new_round = Round.objects.create(
+                tournament=tournament,
+                number=active_round.number + 1,
+                active=True,
+                stage="betting",  # Reset to betting stage for the next round
+                pending_bets=Team.objects.filter(tournament=tournament).count()
+            )
+            
+            # Generate odds for the new round
+            odds = generate_new_odds(new_round.id)
+            record_transition(active_round, new_round, [new_round, *odds])
+            publish_round_changed(new_round)
         
         logger.info(f"Finish distance effectively increased, continuing tournament with round {new_round.number}")
         
         return new_round
     except Exception as e:
         logger.exception(f"Error incrementing finish distance: {e}")
-        return None
+        return None
\ No newline at end of file
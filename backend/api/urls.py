@@ -3,6 +3,7 @@ from rest_framework.routers import DefaultRouter
 from . import views
 
 router = DefaultRouter()
+router.register(r'tournaments', views.TournamentViewSet, 'tournament')
 router.register(r'teams', views.TeamViewSet, 'team')
 router.register(r'rounds', views.RoundViewSet, 'round')
 router.register(r'games', views.GameViewSet, 'game')
@@ -23,5 +24,10 @@ urlpatterns = [
     path('team-stage-statuses/', views.team_stage_statuses, name='team-stage-statuses'),
     path('get-tournament-settings/', views.get_tournament_settings, name='get-tournament-settings'),
     path('get-tournament-results/', views.get_tournament_results, name='get-tournament-results'),
+    path('player-state/', views.player_state, name='player-state'),
     path('set-second-place-winner/', views.set_second_place_winner, name='set-second-place-winner'),
+    path('events/', views.round_events, name='events'),
+    path('cache-stats/', views.cache_stats, name='cache-stats'),
+    path('export/', views.export_tournament, name='export'),
+    path('event-log/', views.get_event_log, name='event-log'),
 ]
\ No newline at end of file
@@ -1,26 +1,69 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
+from rest_framework.request import Request
+from asgiref.sync import sync_to_async
 from django.views.generic import TemplateView
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from django.shortcuts import get_object_or_404
-from django.db import models
-from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.http import parse_etags
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
+from functools import partial, wraps
+import hashlib
+import json
 import logging
 
-from .models import Team, Round, Game, Bet, Odds, Bonus
+from .models import Tournament, Team, Round, Game, Bet, Odds, Bonus
 from .serializers import (
+    TournamentSerializer,
     TeamSerializer,
     RoundSerializer,
     GameSerializer,
     BetSerializer,
     OddsSerializer,
     BonusSerializer,
+    related_paths,
 )
+from .calibration import SimulationNeeded, simulations_deferred
+from .locks import tournament_lock
+from .cache import MISSING, get_response_cache
+from .listing import (
+    LIST_RENDERERS,
+    ListCursorPagination,
+    NDJSONRenderer,
+    ndjson_response,
+    served_over_asgi,
+    streaming_content,
+)
+from .export import TournamentExport
+from .standings import Standings
+from .ledger import add_bet
+from .simulation import seats_per_location
+from .replay import take_checkpoint
+from .events import (
+    MAX_TAIL_LIMIT,
+    TAIL_LIMIT,
+    event_row,
+    events_recorded,
+    record_event,
+    take_changes,
+    record_rows_saved,
+    tail,
+    team_changes,
+)
+from .broadcast import event_stream
 from .tournament import (
+    bump_version,
+    publish_diff,
+    round_data,
+    stage_statuses_by_team,
     all_bets_placed,
     move_to_joust_stage,
     check_tournament_winner,
     all_games_finished,
+    record_game_result,
     process_winners,
     move_to_bonus_stage,
     move_to_finished_stage,
@@ -29,132 +72,395 @@ from .tournament import (
     increment_finish_distance,
     all_bonuses_used,
     move_to_new_round,
-    move_to_final_multiple_ties_stage
+    move_to_final_multiple_ties_stage,
+    refresh_pending
 )
 
 # Get a logger for this file
 logger = logging.getLogger(__name__)
 
+# Helper function to resolve which tournament a request belongs to
+def get_tournament(request):
+    """
+    Resolve the tournament a request is scoped to.
+
+    The tournament owning the team identifier of the request wins, as the
+    team's data comes from there; an explicit `tournament` slug naming
+    another tournament is rejected. Then come the slug and the tournament
+    owning the team_id or round_id of the request. Requests without any of
+    these fall back to the most recently created tournament.
+    """
+    slug = request.query_params.get('tournament') or request.data.get('tournament')
+    identifier = request.query_params.get('identifier') or request.query_params.get('player_id')
+    if identifier:
+        tournament = get_object_or_404(Tournament, teams__identifier=identifier)
+        if slug and slug != tournament.slug:
+            raise ValidationError({'error': f"The team is not in tournament {slug!r}"})
+        return tournament
+
+    if slug:
+        return get_object_or_404(Tournament, slug=slug)
+
+    team_id = request.data.get('team_id')
+    if team_id:
+        return get_object_or_404(Tournament, teams__id=team_id)
+
+    round_id = request.query_params.get('round_id') or request.data.get('round_id')
+    if round_id:
+        return get_object_or_404(Tournament, rounds__id=round_id)
+
+    tournament = Tournament.objects.order_by('-created').first()
+    if tournament is None:
+        raise Http404("No tournament found")
+    return tournament
+
 # Helper function to check if a round is active
-def is_round_active(round_id):
+def is_round_active(tournament, round_id):
     """Check if a round is active"""
     try:
-        round_obj = Round.objects.get(id=round_id, active=True)
+        round_obj = Round.objects.get(tournament=tournament, id=round_id, active=True)
         return True
     except Round.DoesNotExist:
         return False
 
+# Helper function to answer requests for a round that is no longer active
+def inactive_round_response(tournament):
+    """Reject a request for an inactive round, passing on the round that is active now"""
+    active_round = Round.objects.filter(tournament=tournament, active=True).first()
+    return Response({
+        'error': 'This round is not active',
+        'round': RoundSerializer(active_round).data if active_round else None
+    }, status=status.HTTP_400_BAD_REQUEST)
+
+# Times a write endpoint is run again after simulating the positions its
+# transition needs, before it simulates them holding the lock instead
+SIMULATION_ATTEMPTS = 3
+
+# Decorator serialising the write endpoints of one tournament
+def tournament_locked(view):
+    """
+    Run a write endpoint under the lock of its tournament, so that the
+    completion check and the stage transition it triggers happen at most
+    once per round, however many requests arrive at the same time. Only
+    requests that wrote something bump the tournament version.
+
+    A transition pricing a position not simulated yet rolls back, and the
+    position is simulated with the lock released before the request runs
+    again, so other requests do not wait for the simulation.
+    """
+    def run_locked(tournament, request, *args, **kwargs):
+        with tournament_lock(tournament):
+            # Forget the changes of an earlier attempt that rolled back
+            take_changes(tournament.id)
+            recorded_before = events_recorded()
+            response = view(request, *args, **kwargs)
+            if response.status_code >= 400:
+                # Rejected requests leave the tournament as it was, even
+                # when they failed part way through their changes
+                transaction.set_rollback(True)
+            elif events_recorded() != recorded_before:
+                # Every write is recorded in the event log, requests that
+                # wrote nothing leave the version, ETags and caches alone
+                bump_version(tournament.id)
+            return response
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            tournament = get_tournament(request)
+        except Http404:
+            # Nothing to lock, let the view report the missing tournament
+            return view(request, *args, **kwargs)
+        for _ in range(SIMULATION_ATTEMPTS):
+            try:
+                with simulations_deferred():
+                    return run_locked(tournament, request, *args, **kwargs)
+            except SimulationNeeded as needed:
+                if not needed.simulate():
+                    break
+        return run_locked(tournament, request, *args, **kwargs)
+    return wrapper
+
+# Decorator answering polls of unchanged tournaments with 304 Not Modified
+def versioned(view):
+    """
+    Tag the responses of a read endpoint with the version of its tournament
+    as a strong ETag. Requests whose If-None-Match still holds that version
+    get 304 Not Modified without running the view.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            tournament = get_tournament(request)
+        except Http404:
+            return view(request, *args, **kwargs)
+
+        # Read before the view runs, so a write landing in between can only
+        # make the client fetch again, never keep stale data
+        etag = f'"{tournament.id}-{tournament.version}"'
+        # Shared with the cached decorator below
+        request.versioned_tournament = tournament
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = view(request, *args, **kwargs)
+
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            # Let browsers keep the response but revalidate it on every poll
+            response['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
+
+# Decorator serving a versioned read endpoint from the response cache
+def cached(view=None, *, every_write=False):
+    """
+    Serve the responses of a read endpoint from the response cache, keyed by
+    the cache versions of the tournament and of the team of the request's
+    identifier, and the query parameters. The tournament is the team's own,
+    see get_tournament. Endpoints showing every team pass every_write, keying their responses
+    on the tournament version instead. Only 200 and 404
+    are cached, other errors may be transient. Goes below @versioned.
+    """
+    if view is None:
+        return partial(cached, every_write=every_write)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        tournament = getattr(request, 'versioned_tournament', None)
+        if tournament is None:
+            return view(request, *args, **kwargs)
+
+        team = None
+        identifier = request.query_params.get('identifier')
+        if identifier:
+            team = Team.objects.filter(identifier=identifier, tournament=tournament).first()
+
+        response_cache = get_response_cache()
+        key = response_cache.key(tournament, team, view.__name__, request.query_params, every_write)
+        cached_response = response_cache.get(key)
+        if cached_response is not MISSING:
+            status_code, data = cached_response
+            return Response(data, status=status_code)
+
+        response = view(request, *args, **kwargs)
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_404_NOT_FOUND):
+            response_cache.set(key, (response.status_code, response.data))
+        return response
+    return wrapper
+
+def serializer_options(request):
+    """
+    The fields a list request asks for: ?fields=a,b for only these fields,
+    ?expand=team,round for only these nested objects and ?compact=1 for
+    foreign keys as IDs only
+    """
+    options = {}
+    for name in ('fields', 'expand'):
+        value = request.query_params.get(name)
+        if value is not None:
+            options[name] = [item for item in value.split(',') if item]
+    options['compact'] = request.query_params.get('compact', '').lower() in ('1', 'true', 'yes')
+    return options
+
+def list_response(request, serializer_class, queryset):
+    """
+    Serialize a list, selecting the nested objects asked for in the same
+    query. Paged by id with ?cursor= or ?page_size=, streamed as NDJSON
+    with ?format=ndjson
+    """
+    options = serializer_options(request)
+    paths = related_paths(serializer_class(**options))
+    if paths:
+        # Without arguments select_related would follow every foreign key
+        queryset = queryset.select_related(*paths)
+
+    if request.accepted_renderer.format == NDJSONRenderer.format:
+        return ndjson_response(request, serializer_class, queryset, options)
+
+    paginator = ListCursorPagination()
+    if paginator.requested(request):
+        page = paginator.paginate_queryset(queryset, request)
+        return paginator.get_paginated_response(serializer_class(page, many=True, **options).data)
+
+    serializer = serializer_class(queryset, many=True, **options)
+    return Response(serializer.data)
+
+class TournamentViewSet(viewsets.ViewSet):
+    permission_classes = [permissions.AllowAny]
+    renderer_classes = LIST_RENDERERS
+    queryset = Tournament.objects.all()
+    serializer_class = TournamentSerializer
+
+    def list(self, request):
+        return list_response(request, self.serializer_class, Tournament.objects.all())
+    
+    def create(self, request):
+        serializer = self.serializer_class(data=request.data)
+        if serializer.is_valid():
+            with transaction.atomic():
+                # The state its event log is replayed from
+                take_checkpoint(serializer.save().id)
+            return Response(serializer.data)
+        return Response(serializer.errors, status=400)
+
 class TeamViewSet(viewsets.ViewSet):
     permission_classes = [permissions.AllowAny]
+    renderer_classes = LIST_RENDERERS
     queryset = Team.objects.all()
     serializer_class = TeamSerializer
 
     def list(self, request):
-        queryset = Team.objects.all()
+        queryset = Team.objects.filter(tournament=get_tournament(request))
         
         # Get identifier from query params and filter if provided
         identifier = request.query_params.get('identifier', None)
         if identifier:
             queryset = queryset.filter(identifier=identifier)
             
-        serializer = self.serializer_class(queryset, many=True)
-        return Response(serializer.data)
+        return list_response(request, self.serializer_class, queryset)
     
     def create(self, request):
         serializer = self.serializer_class(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            tournament = get_tournament(request)
+            with tournament_lock(tournament):
+                record_rows_saved(tournament.id, [serializer.save(tournament=tournament)])
+                refresh_pending(tournament.id)
+                bump_version(tournament.id, resync=True)
             return Response(serializer.data)
         return Response(serializer.errors, status=400)
     
 class RoundViewSet(viewsets.ViewSet):
     permission_classes = [permissions.AllowAny]
+    renderer_classes = LIST_RENDERERS
     queryset = Round.objects.all()
     serializer_class = RoundSerializer
 
     def list(self, request):
-        queryset = Round.objects.all()
-        serializer = self.serializer_class(queryset, many=True)
-        return Response(serializer.data)
+        queryset = Round.objects.filter(tournament=get_tournament(request))
+        return list_response(request, self.serializer_class, queryset)
     
     def create(self, request):
         serializer = self.serializer_class(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            tournament = get_tournament(request)
+            with tournament_lock(tournament):
+                round_obj = serializer.save(tournament=tournament)
+                record_rows_saved(tournament.id, [round_obj])
+                refresh_pending(tournament.id)
+                round_obj.refresh_from_db(fields=['pending_bets', 'pending_games', 'pending_bonuses'])
+                bump_version(tournament.id, resync=True)
             return Response(serializer.data)
         return Response(serializer.errors, status=400)
     
 class GameViewSet(viewsets.ViewSet):
     permission_classes = [permissions.AllowAny]
+    renderer_classes = LIST_RENDERERS
     queryset = Game.objects.all()
     serializer_class = GameSerializer
 
     def list(self, request):
-        queryset = Game.objects.all()
-        serializer = self.serializer_class(queryset, many=True)
-        return Response(serializer.data)
+        queryset = Game.objects.filter(tournament=get_tournament(request))
+        return list_response(request, self.serializer_class, queryset)
     
     def create(self, request):
         serializer = self.serializer_class(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            tournament = get_tournament(request)
+            with tournament_lock(tournament):
+                record_rows_saved(tournament.id, [serializer.save(tournament=tournament)])
+                refresh_pending(tournament.id)
+                bump_version(tournament.id, resync=True)
             return Response(serializer.data)
         return Response(serializer.errors, status=400)
     
 class BetViewSet(viewsets.ViewSet):
     permission_classes = [permissions.AllowAny]
+    renderer_classes = LIST_RENDERERS
     queryset = Bet.objects.all()
     serializer_class = BetSerializer
 
     def list(self, request):
-        queryset = Bet.objects.all()
-        serializer = self.serializer_class(queryset, many=True)
-        return Response(serializer.data)
+        queryset = Bet.objects.filter(tournament=get_tournament(request))
+        return list_response(request, self.serializer_class, queryset)
     
     def create(self, request):
         serializer = self.serializer_class(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            tournament = get_tournament(request)
+            with tournament_lock(tournament):
+                bet = serializer.save(tournament=tournament)
+                add_bet(bet)
+                record_rows_saved(tournament.id, [bet])
+                refresh_pending(tournament.id)
+                bump_version(tournament.id, resync=True)
             return Response(serializer.data)
         return Response(serializer.errors, status=400)
     
 
 class OddsViewSet(viewsets.ViewSet):
     permission_classes = [permissions.AllowAny]
+    renderer_classes = LIST_RENDERERS
     queryset = Odds.objects.all()
     serializer_class = OddsSerializer
 
     def list(self, request):
-        queryset = Odds.objects.all()
-        serializer = self.serializer_class(queryset, many=True)
-        return Response(serializer.data)
+        queryset = Odds.objects.filter(tournament=get_tournament(request))
+        return list_response(request, self.serializer_class, queryset)
     
     def create(self, request):
         serializer = self.serializer_class(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            tournament = get_tournament(request)
+            with tournament_lock(tournament):
+                record_rows_saved(tournament.id, [serializer.save(tournament=tournament)])
+                bump_version(tournament.id, resync=True)
             return Response(serializer.data)
         return Response(serializer.errors, status=400)
 
 
 class BonusViewSet(viewsets.ViewSet):
     permission_classes = [permissions.AllowAny]
+    renderer_classes = LIST_RENDERERS
     queryset = Bonus.objects.all()
     serializer_class = BonusSerializer
 
     def list(self, request):
-        queryset = Bonus.objects.all()
-        serializer = self.serializer_class(queryset, many=True)
-        return Response(serializer.data)
+        queryset = Bonus.objects.filter(tournament=get_tournament(request))
+        return list_response(request, self.serializer_class, queryset)
     
     def create(self, request):
         serializer = self.serializer_class(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            tournament = get_tournament(request)
+            with tournament_lock(tournament):
+                record_rows_saved(tournament.id, [serializer.save(tournament=tournament)])
+                refresh_pending(tournament.id)
+                bump_version(tournament.id, resync=True)
             return Response(serializer.data)
         return Response(serializer.errors, status=400)
 
 
+async def round_events(request):
+    """Stream round and stage changes of a tournament as Server-Sent Events"""
+    if not served_over_asgi(request):
+        # WSGI servers would buffer the endless stream and never send a byte.
+        # No Content tells EventSource not to reconnect, so the client polls
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+    try:
+        tournament = await sync_to_async(get_tournament)(Request(request))
+    except Http404 as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_404_NOT_FOUND)
+    except ValidationError as e:
+        return JsonResponse(e.detail, status=status.HTTP_400_BAD_REQUEST)
+
+    response = StreamingHttpResponse(event_stream(tournament.id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 # React home page
 class React(TemplateView):
     template_name = 'index.html'
@@ -162,10 +468,11 @@ class React(TemplateView):
 
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
+@versioned
 def get_round_info(request):
     """Return the current active round ID and stage"""
     try:
-        active_round = Round.objects.get(active=True)
+        active_round = Round.objects.get(tournament=get_tournament(request), active=True)
         return Response({
             'round_id': active_round.id,
             'stage': active_round.stage,
@@ -176,6 +483,8 @@ def get_round_info(request):
 
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
+@versioned
+@cached
 def get_bets_available(request):
     """Return the number of bets available for a team"""
     try:
@@ -190,8 +499,22 @@ def get_bets_available(request):
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+def next_opponent_data(team, game):
+    """The opponent of a team in one of its games"""
+    opponent = game.team2 if game.team1.id == team.id else game.team1
+    return {
+        'opponent_name': opponent.name,
+        'opponent_id': opponent.id,
+        'opponent_description': opponent.description,
+        'game_finished': game.finished,
+        'game_id': game.id,
+        'location': game.location  # Include location in the response
+    }
+
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
+@versioned
+@cached
 def get_next_opponent(request):
     """Return the next opponent team for a given team and round"""
     try:
@@ -202,7 +525,7 @@ def get_next_opponent(request):
             return Response({'error': 'Team identifier and round_id are required'}, status=status.HTTP_400_BAD_REQUEST)
         
         team = get_object_or_404(Team, identifier=identifier)
-        round_obj = get_object_or_404(Round, id=round_id)
+        round_obj = get_object_or_404(Round, id=round_id, tournament_id=team.tournament_id)
         
         # Find a game where the team is either team1 or team2
         game = Game.objects.filter(
@@ -213,22 +536,14 @@ def get_next_opponent(request):
         if not game:
             return Response({'error': 'No game found for this team and round'}, status=status.HTTP_404_NOT_FOUND)
         
-        # Return the opponent
-        opponent = game.team2 if game.team1.id == team.id else game.team1
-        
-        return Response({
-            'opponent_name': opponent.name,
-            'opponent_id': opponent.id,
-            'opponent_description': opponent.description,
-            'game_finished': game.finished,
-            'game_id': game.id,
-            'location': game.location  # Include location in the response
-        })
+        return Response(next_opponent_data(team, game))
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
+@versioned
+@cached
 def get_bonus_for_team(request):
     """Return bonus information for a specific team in a specific round"""
     try:
@@ -243,7 +558,7 @@ def get_bonus_for_team(request):
         team = get_object_or_404(Team, identifier=identifier)
         
         # Get the round
-        round_obj = get_object_or_404(Round, id=round_id)
+        round_obj = get_object_or_404(Round, id=round_id, tournament_id=team.tournament_id)
         
         # Find the bonus for this team and round
         bonus = Bonus.objects.filter(team=team, round=round_obj).first()
@@ -260,22 +575,24 @@ def get_bonus_for_team(request):
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@tournament_locked
 def place_bet(request):
     """API endpoint for placing bets"""
     try:
         team_id = request.data.get('team_id')
         bet_on_team_id = request.data.get('bet_on_team_id')
         round_id = request.data.get('round_id')
+        tournament = get_tournament(request)
 
         # Check if the round is active
-        if not is_round_active(round_id):
+        if not is_round_active(tournament, round_id):
             logger.warning("Attempted to place bet for inactive round: %s. Request data: %s", 
                          round_id, request.data)
-            return Response({'error': 'This round is not active'}, status=status.HTTP_400_BAD_REQUEST)
+            return inactive_round_response(tournament)
         
-        team = get_object_or_404(Team, id=team_id)
-        bet_on_team = get_object_or_404(Team, id=bet_on_team_id)
-        round_obj = get_object_or_404(Round, id=round_id)
+        team = get_object_or_404(Team, id=team_id, tournament=tournament)
+        bet_on_team = get_object_or_404(Team, id=bet_on_team_id, tournament=tournament)
+        round_obj = get_object_or_404(Round, id=round_id, tournament=tournament)
         
         # Check if the team has available bets
         if team.bets_available <= 0:
@@ -293,6 +610,7 @@ def place_bet(request):
         # Create the bet
         try:
             bet = Bet.objects.create(
+                tournament=tournament,
                 team=team,
                 bet_on_team=bet_on_team,
                 odds=odds,
@@ -308,6 +626,18 @@ def place_bet(request):
         try:
             team.bets_available -= 1
             team.save()
+            add_bet(bet)
+            if bet.bet_finish:
+                # The team is done betting this round
+                Round.objects.filter(id=round_obj.id).update(pending_bets=models.F('pending_bets') - 1)
+            record_event(tournament.id, 'bet_placed', changed_teams=[team.id], bet=event_row(bet))
+            publish_diff(tournament.id, 'bet_placed', [team], bet={
+                'id': bet.id,
+                'team': team.id,
+                'bet_on_team': bet_on_team.id,
+                'round': round_obj.id,
+                'bet_finish': bet.bet_finish
+            })
         except Exception as e:
             logger.error("Failed to update team bets_available: %s. Request data: %s", 
                        str(e), request.data)
@@ -335,6 +665,7 @@ def place_bet(request):
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@tournament_locked
 def mark_game(request):
     """API endpoint for recording game results"""
     logger.debug("mark_game function called with data: %s", request.data)
@@ -343,17 +674,18 @@ def mark_game(request):
         game_id = request.data.get('game_id')
         winner_id = request.data.get('winner_id')
         round_id = request.data.get('round_id')
+        tournament = get_tournament(request)
         
         # Check if the round is active
-        if not is_round_active(round_id):
+        if not is_round_active(tournament, round_id):
             logger.warning("Attempted to mark game for inactive round: %s. Request data: %s", 
                          round_id, request.data)
-            return Response({'error': 'This round is not active'}, status=status.HTTP_400_BAD_REQUEST)
+            return inactive_round_response(tournament)
         
-        team = get_object_or_404(Team, id=team_id)
-        game = get_object_or_404(Game, id=game_id)
-        winner_team = get_object_or_404(Team, id=winner_id)
-        round_obj = get_object_or_404(Round, id=round_id)
+        team = get_object_or_404(Team, id=team_id, tournament=tournament)
+        game = get_object_or_404(Game, id=game_id, tournament=tournament)
+        winner_team = get_object_or_404(Team, id=winner_id, tournament=tournament)
+        round_obj = get_object_or_404(Round, id=round_id, tournament=tournament)
         
         # Ensure the game belongs to the correct round
         if game.round.id != round_obj.id:
@@ -381,10 +713,8 @@ def mark_game(request):
             return Response({'error': 'Game is already finished'}, 
                            status=status.HTTP_400_BAD_REQUEST)
 
-        # Set the winner
-        game.win = (winner_team.id == game.team1.id)  # True if team1 wins, False if team2 wins
-        game.finished = True
-        game.save()
+        # Set the winner, True if team1 wins, False if team2 wins
+        record_game_result(game, winner_team.id == game.team1.id)
         
         logger.info("Game result recorded successfully: %s won game %s", winner_team.name, game.id)
         
@@ -397,8 +727,9 @@ def mark_game(request):
             if round_obj.stage == "final":
                 # This was a tiebreaker round, move to finished state
                 # We know we have a clear winner now
-                first_place = Team.objects.all().order_by('-distance').first()
-                second_place = Team.objects.all().exclude(id=first_place.id).order_by('-distance').first()
+                standings = Standings(tournament.id, places=2)
+                first_place = standings.first_place
+                second_place = standings.second_place
                 final_round = move_to_finished_stage(round_id, first_place, second_place)
                 return Response({
                     'message': 'Final game recorded. Tournament is finished!',
@@ -408,16 +739,16 @@ def mark_game(request):
                 })
             
             # Check if there's a tournament winner or ties
-            first_place_ties, second_place_ties, at_finish = check_tournament_winner()
+            first_place_ties, second_place_ties, at_finish = check_tournament_winner(tournament)
             
             if at_finish:
-                if first_place_ties.count() == 1:
+                if len(first_place_ties) == 1:
                     # We have a clear first place winner
-                    first_place = first_place_ties.first()
+                    first_place = first_place_ties[0]
                     
-                    if second_place_ties.count() == 1:
+                    if len(second_place_ties) == 1:
                         # We have clear first and second place winners
-                        second_place = second_place_ties.first()
+                        second_place = second_place_ties[0]
                         final_round = move_to_finished_stage(round_id, first_place, second_place)
                         return Response({
                             'message': 'We have clear tournament winners!',
@@ -425,7 +756,7 @@ def mark_game(request):
                             'second_place': TeamSerializer(second_place).data,
                             'round': RoundSerializer(final_round).data
                         })
-                    elif second_place_ties.count() == 2:
+                    elif len(second_place_ties) == 2:
                         # We have a clear first place but need tiebreaker for second place
                         final_round = move_to_final_stage(round_id, None, second_place_ties)
                         return Response({
@@ -444,7 +775,7 @@ def mark_game(request):
                             'second_place_ties': TeamSerializer(second_place_ties, many=True).data,
                             'round': RoundSerializer(final_round).data
                         })
-                elif first_place_ties.count() == 2:
+                elif len(first_place_ties) == 2:
                     # We have exactly 2 teams tied for first place - setup a tiebreaker
                     final_round = move_to_final_stage(round_id, first_place_ties)
                     return Response({
@@ -454,7 +785,7 @@ def mark_game(request):
                     })
                 else:
                     # We have more than 2 teams tied for first place - increase finish distance
-                    new_round = increment_finish_distance()
+                    new_round = increment_finish_distance(tournament)
                     return Response({
                         'message': 'Multiple teams tied for first place! Continuing tournament with increased finish distance.',
                         'ties': TeamSerializer(first_place_ties, many=True).data,
@@ -486,6 +817,7 @@ def mark_game(request):
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@tournament_locked
 def use_bonus(request):
     """API endpoint for selecting and using bonuses"""
     try:
@@ -493,15 +825,16 @@ def use_bonus(request):
         bonus_type = request.data.get('bonus_type')
         bonus_target = request.data.get('bonus_target')
         round_id = request.data.get('round_id')
+        tournament = get_tournament(request)
         
         # Check if the round is active
-        if not is_round_active(round_id):
+        if not is_round_active(tournament, round_id):
             logger.warning("Attempted to use bonus for inactive round: %s. Request data: %s", 
                          round_id, request.data)
-            return Response({'error': 'This round is not active'}, status=status.HTTP_400_BAD_REQUEST)
+            return inactive_round_response(tournament)
         
-        team = get_object_or_404(Team, id=team_id)
-        round_obj = get_object_or_404(Round, id=round_id)
+        team = get_object_or_404(Team, id=team_id, tournament=tournament)
+        round_obj = get_object_or_404(Round, id=round_id, tournament=tournament)
         
         # Check if the team has an unused bonus for this round
         try:
@@ -519,7 +852,7 @@ def use_bonus(request):
                              bonus_type, request.data)
                 return Response({'error': 'Bonus target is required for this bonus type'}, 
                                status=status.HTTP_400_BAD_REQUEST)
-            target_team = get_object_or_404(Team, id=bonus_target)
+            target_team = get_object_or_404(Team, id=bonus_target, tournament=tournament)
         
         # Check location selection limits
         if bonus_type == "select_location":
@@ -527,26 +860,30 @@ def use_bonus(request):
                 return Response({'error': 'Location is required for this bonus type'}, 
                                status=status.HTTP_400_BAD_REQUEST)
             
-            # Check if two teams have already selected this location for this round number
+            # Check if the location's seats are all selected for this round number
+            seats = seats_per_location(Team.objects.filter(tournament=tournament).count())
             location_count = Bonus.objects.filter(
+                tournament=tournament,
                 round__number=round_obj.number,
                 bonus_type='select_location',
                 bonus_target=bonus_target,
                 finished=True
             ).count()
             
-            if location_count >= 2:
-                return Response({'error': 'This location has already been selected by two teams'}, 
+            if location_count >= seats:
+                return Response({'error': f'This location has already been selected by {seats} teams'}, 
                                status=status.HTTP_400_BAD_REQUEST)
 
-        # Apply bonus logic
+        # Apply bonus logic, remembering the team it changed
+        changed_teams = []
         match bonus_type:
             case "extra_bet":
                 team.bets_available += 1
                 team.save()
+                changed_teams.append(team)
             case "plus_distance":
                 # Do not add distance if the target team is 1 away from finishing
-                if target_team.distance >= settings.TOURNAMENT_FINISH_DISTANCE - 1:
+                if target_team.distance >= tournament.finish_distance - 1:
                     logger.warning("Cannot add distance to team %s at distance %s. Request data: %s", 
                                  target_team.name, target_team.distance, request.data)
                     return Response({'error': 'Players must finish on their own'}, 
@@ -554,6 +891,7 @@ def use_bonus(request):
                 else:
                     target_team.distance += 1
                     target_team.save()
+                    changed_teams.append(target_team)
             case "minus_distance":
                 # Do not reduce distance if the target team is already at 0
                 if target_team.distance <= 0:
@@ -564,6 +902,7 @@ def use_bonus(request):
                 else:
                     target_team.distance -= 1
                     target_team.save()
+                    changed_teams.append(target_team)
             case "select_location":
                 # Location selection handled at validation step
                 pass
@@ -578,6 +917,11 @@ def use_bonus(request):
         bonus.bonus_type = bonus_type
         bonus.bonus_target = bonus_target
         bonus.save()
+        Round.objects.filter(id=round_obj.id).update(pending_bonuses=models.F('pending_bonuses') - 1)
+        record_event(tournament.id, 'bonus_used',
+                     changed_teams=[team.id] + [changed.id for changed in changed_teams],
+                     bonus=event_row(bonus), teams=team_changes(changed_teams, 'distance', 'bets_available'))
+        publish_diff(tournament.id, 'bonus_used', changed_teams, bonus=BonusSerializer(bonus).data)
         
         logger.info("Bonus '%s' used successfully by team %s", bonus_type, team.name)
         
@@ -600,8 +944,51 @@ def use_bonus(request):
         logger.exception("Error in use_bonus function: %s. Request data: %s", str(e), request.data)
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+def betting_table_data(player_team, round_obj):
+    """The betting table of a player's team for a round, in one query"""
+    # Odds of a team for this round
+    round_odds = Odds.objects.filter(round=round_obj, team=models.OuterRef('pk')).order_by('id')
+    
+    # Get all teams with their odds for this round, the odds of the player's
+    # bets on them and the number of bets placed on them by all players
+    # across ALL rounds, in one query over the bet ledger
+    player_ledger = models.Q(received_ledger__team=player_team)
+    teams = Team.objects.filter(tournament_id=player_team.tournament_id).annotate(
+        round_odd1=models.Subquery(round_odds.values('odd1')[:1]),
+        round_odd2=models.Subquery(round_odds.values('odd2')[:1]),
+        bet1_sum=models.Sum('received_ledger__odd1_sum', filter=player_ledger),
+        bet2_sum=models.Sum('received_ledger__odd2_sum', filter=player_ledger),
+        team_bet_count=Coalesce(models.Sum('received_ledger__bet_count'), 0),
+    ).order_by('-distance')
+    
+    # Build result table with all required data
+    result_table = []
+    
+    for team in teams:
+        # Build team entry
+        result_table.append({
+            'id': team.id,
+            'name': team.name,
+            'description': team.description,
+            'distance': team.distance,
+            'odd1': team.round_odd1 if team.round_odd1 is not None else 1.0,
+            'odd2': team.round_odd2 if team.round_odd2 is not None else 1.0,
+            'bet1': team.bet1_sum if team.bet1_sum is not None else 0,
+            'bet2': team.bet2_sum if team.bet2_sum is not None else 0,
+            'total_bet_count': team.team_bet_count,
+            'is_player_team': team.id == player_team.id
+        })
+    
+    return {
+        'teams': result_table,
+        'bets_available': player_team.bets_available,
+        'round_stage': round_obj.stage
+    }
+
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
+@versioned
+@cached(every_write=True)
 def get_betting_table(request):
     """Return all data needed for the betting table in a single API call"""
     try:
@@ -612,70 +999,26 @@ def get_betting_table(request):
             return Response({'error': 'Team identifier and round_id are required'}, 
                           status=status.HTTP_400_BAD_REQUEST)
         
-        # Get active round and verify
-        try:
-            round_obj = Round.objects.get(id=round_id)
-        except Round.DoesNotExist:
-            return Response({'error': 'Round not found'}, status=status.HTTP_404_NOT_FOUND)
-        
         # Get player team info
         try:
             player_team = Team.objects.get(identifier=identifier)
         except Team.DoesNotExist:
             return Response({'error': 'Player team not found'}, status=status.HTTP_404_NOT_FOUND)
         
-        bets_available = player_team.bets_available
-        player_bets = Bet.objects.filter(team=player_team.id)
-        
-        # Get all teams with odds for this round
-        teams = Team.objects.all().order_by('-distance')
-        odds_data = Odds.objects.filter(round=round_id)
-        
-        # Get ALL bets across ALL rounds to count total bet frequencies
-        all_bets = Bet.objects.all()
-        
-        # Build result table with all required data
-        result_table = []
-        
-        for team in teams:
-            # Get odds for this team
-            team_odds = odds_data.filter(team=team.id).first()
-            odd1 = team_odds.odd1 if team_odds else 1.0
-            odd2 = team_odds.odd2 if team_odds else 1.0
-            
-            # Sum bets for this team by the player
-            team_bets = player_bets.filter(bet_on_team=team.id)
-            bet1_sum = sum(bet.odds.odd1 for bet in team_bets if bet.odds) if team_bets else 0
-            bet2_sum = sum(bet.odds.odd2 for bet in team_bets if bet.odds) if team_bets else 0
-            
-            # Count bets placed on this team by all players across ALL rounds
-            team_bet_count = all_bets.filter(bet_on_team=team.id).count()
-            
-            # Build team entry
-            result_table.append({
-                'id': team.id,
-                'name': team.name,
-                'description': team.description,
-                'distance': team.distance,
-                'odd1': odd1,
-                'odd2': odd2,
-                'bet1': bet1_sum,
-                'bet2': bet2_sum,
-                'total_bet_count': team_bet_count,
-                'is_player_team': team.id == player_team.id
-            })
+        # Get active round and verify
+        try:
+            round_obj = Round.objects.get(id=round_id, tournament_id=player_team.tournament_id)
+        except Round.DoesNotExist:
+            return Response({'error': 'Round not found'}, status=status.HTTP_404_NOT_FOUND)
         
-        return Response({
-            'teams': result_table,
-            'bets_available': bets_available,
-            'round_stage': round_obj.stage
-        })
+        return Response(betting_table_data(player_team, round_obj))
         
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
+@versioned
 def team_stage_statuses(request):
     """Return status of teams in the current round for all stages"""
     try:
@@ -683,56 +1026,9 @@ def team_stage_statuses(request):
         if not round_id:
             return Response({'error': 'round_id is required'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Get the round and its number
-        round_obj = get_object_or_404(Round, id=round_id)
-        round_number = round_obj.number
-        
-        # Get all rounds with the same number (different stages)
-        all_rounds_same_number = Round.objects.filter(number=round_number)
-        teams = Team.objects.all()
-        result = {}
-        
-        for team in teams:
-            # Check betting status across all betting rounds with this number
-            betting_rounds = all_rounds_same_number.filter(stage='betting')
-            bet_finished = False
-            if betting_rounds.exists():
-                for betting_round in betting_rounds:
-                    bets = Bet.objects.filter(team=team, round=betting_round)
-                    if bets.exists() and bets.filter(bet_finish=True).exists():
-                        bet_finished = True
-                        break
-            
-            # Check joust status across all joust rounds with this number
-            joust_rounds = all_rounds_same_number.filter(stage='joust')
-            joust_finished = False
-            if joust_rounds.exists():
-                for joust_round in joust_rounds:
-                    games = Game.objects.filter(
-                        (models.Q(team1=team) | models.Q(team2=team)) &
-                        models.Q(round=joust_round)
-                    )
-                    if games.exists() and games.filter(finished=True).exists():
-                        joust_finished = True
-                        break
-            
-            # Check bonus status across all bonus rounds with this number
-            bonus_rounds = all_rounds_same_number.filter(stage='bonus')
-            bonus_used = False
-            if bonus_rounds.exists():
-                for bonus_round in bonus_rounds:
-                    bonuses = Bonus.objects.filter(team=team, round=bonus_round)
-                    if bonuses.exists() and bonuses.filter(finished=True).exists():
-                        bonus_used = True
-                        break
-            
-            # Add to result dictionary
-            result[team.id] = {
-                'bet_finished': bet_finished,
-                'joust_finished': joust_finished,
-                'bonus_used': bonus_used
-            }
-        
+        # Get the round, in the tournament the response is versioned by
+        round_obj = get_object_or_404(Round, id=round_id, tournament=get_tournament(request))
+        result = stage_statuses_by_team(round_obj)
         return Response(result)
         
     except Exception as e:
@@ -741,20 +1037,125 @@ def team_stage_statuses(request):
 
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
+@versioned
+@cached
 def get_tournament_settings(request):
     """Return tournament settings like finish distance"""
+    tournament = get_tournament(request)
     return Response({
-        'finish_distance': settings.TOURNAMENT_FINISH_DISTANCE
+        'tournament': tournament.slug,
+        'finish_distance': tournament.finish_distance
     })
 
+def player_state_sections(team):
+    """
+    Every section of a team's player state, for the active round of its
+    tournament, from a fixed number of queries. The team must come with its
+    tournament selected.
+    """
+    tournament = team.tournament
+    active_round = Round.objects.filter(tournament=tournament, active=True).first()
+    game = bonus = None
+    if active_round:
+        game = Game.objects.filter(
+            models.Q(team1=team) | models.Q(team2=team),
+            round=active_round
+        ).select_related('team1', 'team2').first()
+        bonus = Bonus.objects.filter(team=team, round=active_round).first()
+    
+    # Each section holds what the endpoint of the same name returns
+    return {
+        'round': round_data(active_round) if active_round else None,
+        'settings': {
+            'tournament': tournament.slug,
+            'finish_distance': tournament.finish_distance
+        },
+        'team': TeamSerializer(team).data,
+        'bets_available': {'bets_available': team.bets_available},
+        'next_opponent': next_opponent_data(team, game) if game else None,
+        'bonus': BonusSerializer(bonus).data if bonus else None,
+        'betting_table': betting_table_data(team, active_round) if active_round else None,
+    }
+
+def section_etag(name, data):
+    """Strong ETag of a player state section, hashing its name and content"""
+    content = json.dumps([name, data], sort_keys=True, default=str)
+    return f'"{hashlib.sha1(content.encode()).hexdigest()[:20]}"'
+
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
+@versioned
+def player_state(request):
+    """
+    Return everything a player's page needs in one response. Every section
+    carries its own ETag; the sections whose ETag is listed in If-None-Match
+    are marked unchanged and sent without their data.
+    """
+    identifier = request.query_params.get('identifier')
+    if not identifier:
+        return Response({'error': 'Team identifier is required'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        team = Team.objects.select_related('tournament').get(identifier=identifier)
+    except Team.DoesNotExist:
+        return Response({'error': 'Player team not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    known_etags = parse_etags(request.headers.get('If-None-Match', ''))
+    sections = {}
+    for name, data in player_state_sections(team).items():
+        etag = section_etag(name, data)
+        if etag in known_etags:
+            sections[name] = {'etag': etag, 'unchanged': True}
+        else:
+            sections[name] = {'etag': etag, 'data': data}
+    
+    return Response({'identifier': identifier, 'sections': sections})
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def cache_stats(request):
+    """Return the hit and miss counts of the response cache, summed over the processes sharing it"""
+    return Response(get_response_cache().stats())
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def export_tournament(request):
+    """Stream a tournament with its whole history as gzip-compressed NDJSON"""
+    tournament = get_tournament(request)
+    export = TournamentExport([tournament.id])
+    response = StreamingHttpResponse(streaming_content(request, export.gzip()), content_type='application/gzip')
+    response['Content-Disposition'] = f'attachment; filename="{tournament.slug}.jsonl.gz"'
+    return response
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def get_event_log(request):
+    """Return the events of a tournament following the seq in `after`, oldest first"""
+    tournament = get_tournament(request)
+    try:
+        after = int(request.query_params.get('after', 0))
+        limit = min(int(request.query_params.get('limit', TAIL_LIMIT)), MAX_TAIL_LIMIT)
+    except ValueError:
+        return Response({'error': 'after and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    events = list(tail(tournament.id, after, limit))
+    return Response({
+        'events': events,
+        # Passed back as `after` to read the events that follow
+        'last_seq': events[-1]['seq'] if events else after
+    })
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+@versioned
 def get_tournament_results(request):
     """Return the tournament results including first and second place winners"""
     try:
+        tournament = get_tournament(request)
+
         # Check if we're in finished stage
         try:
-            active_round = Round.objects.get(active=True)
+            active_round = Round.objects.get(tournament=tournament, active=True)
             if active_round.stage != 'finished':
                 return Response({
                     'active': False,
@@ -764,7 +1165,7 @@ def get_tournament_results(request):
             return Response({'error': 'No active round found'}, status=status.HTTP_404_NOT_FOUND)
         
         # Calculate betting results
-        results = calculate_betting_results()
+        results = calculate_betting_results(tournament)
         
         if not results:
             return Response({'error': 'Could not calculate tournament results'}, 
@@ -778,10 +1179,11 @@ def get_tournament_results(request):
             'betting_results': []
         }
         
-        # Format betting results
-        for result in results['betting_results']:
+        # Format betting results, serializing the teams in one pass
+        teams = TeamSerializer([result['team'] for result in results['betting_results']], many=True).data
+        for result, team in zip(results['betting_results'], teams):
             formatted_results['betting_results'].append({
-                'team': TeamSerializer(result['team']).data,
+                'team': team,
                 'first_place_points': result['first_place_points'],
                 'second_place_points': result['second_place_points'],
                 'total_points': result['total_points']
@@ -795,6 +1197,7 @@ def get_tournament_results(request):
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@tournament_locked
 def set_second_place_winner(request):
     """API endpoint for manually setting second place winner from dashboard"""
     try:
@@ -803,18 +1206,21 @@ def set_second_place_winner(request):
         if not team_id:
             return Response({'error': 'Team ID is required'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Get the team
-        second_place = get_object_or_404(Team, id=team_id)
+        # Get the team, in the tournament whose lock is held
+        tournament = get_tournament(request)
+        second_place = Team.objects.filter(id=team_id, tournament=tournament).first()
+        if second_place is None:
+            return Response({'error': 'Team not found in this tournament'}, status=status.HTTP_404_NOT_FOUND)
         
         # Get the active round
         try:
-            active_round = Round.objects.get(active=True)
+            active_round = Round.objects.get(tournament=tournament, active=True)
         except Round.DoesNotExist:
             return Response({'error': 'No active round found'}, 
                           status=status.HTTP_400_BAD_REQUEST)
         
         # Get first place (team with highest distance)
-        first_place = Team.objects.all().order_by('-distance').first()
+        first_place = Standings(tournament.id, places=1).first_place
         
         # Make sure we're not setting the first place team as second place
         if second_place.id == first_place.id:
@@ -830,6 +1236,9 @@ def set_second_place_winner(request):
             # Increase the selected second place team's distance by 1
             second_place.distance += 1
             second_place.save()
+            record_event(tournament.id, 'teams_moved', changed_teams=[first_place.id, second_place.id],
+                         teams=team_changes([first_place, second_place], 'distance'))
+            publish_diff(tournament.id, 'teams_moved', [first_place, second_place])
             
             # Move to finished stage
             final_round = move_to_finished_stage(active_round.id, first_place, second_place)
@@ -2,6 +2,7 @@
 ASGI config for gettingstarted project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django, WebSocket connections to the live dashboard feed.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -13,4 +14,16 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.app.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up
+from backend.api.live import PATH as DASHBOARD_PATH, dashboard_feed, websocket_not_found  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope["type"] != "websocket":
+        await django_application(scope, receive, send)
+    elif scope["path"] == DASHBOARD_PATH:
+        await dashboard_feed(scope, receive, send)
+    else:
+        await websocket_not_found(scope, receive, send)
@@ -169,7 +169,10 @@ if IS_HEROKU_APP:
     DATABASES = {
         "default": dj_database_url.config(
             env="DATABASE_URL",
-            conn_max_age=600,
+            # Under ASGI every request runs its synchronous view in a thread of its own,
+            # so a persistent connection would be left open by a thread that has ended:
+            # https://docs.djangoproject.com/en/5.1/ref/databases/#persistent-connections
+            conn_max_age=0,
             conn_health_checks=True,
             ssl_require=True,
         ),
@@ -181,10 +184,44 @@ else:
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
             "NAME": BASE_DIR / "db.sqlite3",
+            # Take the write lock when a transaction starts, so concurrent requests
+            # queue up on the tournament lock instead of failing to upgrade theirs
+            "OPTIONS": {
+                "transaction_mode": "IMMEDIATE",
+                "timeout": 20,
+            },
+            # A file, as the concurrency tests query it from several threads
+            # and threads cannot share an in-memory database
+            "TEST": {
+                "NAME": BASE_DIR / "test_db.sqlite3",
+            },
         }
     }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+if "REDIS_URL" in os.environ:
+    # Shared by every worker process, needs the redis package
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        },
+    }
+else:
+    # Each worker process keeps its own cache in memory
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "tournament",
+            # Entries of every team, endpoint and round of the running tournaments
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        },
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -323,3 +360,26 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedStaticFilesStorage'
 # Tournament settings
 TOURNAMENT_FINISH_DISTANCE = 9
 
+# Calibrated odds: simulated tournaments per position, the time a cache miss may
+# spend simulating, and the LRU cache of simulated positions. Set
+# TOURNAMENT_CALIBRATION_CACHE_PATH to also keep simulated positions on disk, in a
+# file every worker process shares.
+TOURNAMENT_CALIBRATION_RUNS = 20000
+TOURNAMENT_CALIBRATION_TIME_BUDGET = 2.0
+TOURNAMENT_CALIBRATION_CACHE_SIZE = 1024
+TOURNAMENT_CALIBRATION_CACHE_PATH = os.environ.get("TOURNAMENT_CALIBRATION_CACHE_PATH")
+
+# How write requests lock their tournament: "row" locks the tournament row with
+# SELECT ... FOR UPDATE, "advisory" uses a Postgres advisory lock instead.
+TOURNAMENT_LOCK_BACKEND = os.environ.get("TOURNAMENT_LOCK_BACKEND", "row")
+
+# How round changes reach the event streams of every worker process: "local" for
+# a single process, "postgres" for LISTEN/NOTIFY, or the dotted path of a backend.
+# Idle streams send a keepalive event every TOURNAMENT_EVENTS_KEEPALIVE seconds.
+TOURNAMENT_BROADCAST_BACKEND = os.environ.get("TOURNAMENT_BROADCAST_BACKEND", "local")
+TOURNAMENT_EVENTS_KEEPALIVE = 15
+
+# Cache of the polled player endpoints: the CACHES alias it uses and how long
+# an entry is kept. Writes make entries unreachable, the timeout frees them.
+TOURNAMENT_RESPONSE_CACHE = "default"
+TOURNAMENT_RESPONSE_CACHE_TIMEOUT = 300
@@ -11,7 +11,7 @@ import LooksOneIcon from '@mui/icons-material/LooksOne';
 import LooksTwoIcon from '@mui/icons-material/LooksTwo';
 import { useSearchParams } from 'react-router-dom';
 import { 
-    placeBet, getBettingTable, getTournamentResults
+    placeBet, getTournamentResults
 } from '../../services/tournamentService';
 import { useTournament } from '../../context/TournamentContext';
 
@@ -32,7 +32,7 @@ const BetPage = () => {
     const [tournamentResults, setTournamentResults] = useState(null);
     
     // Get tournament context
-    const { roundInfo, roundChanged, refreshRoundInfo, finishDistance } = useTournament();
+    const { roundInfo, refreshRoundInfo, finishDistance, playerState, refreshPlayerState } = useTournament();
     
     // Get the player_id from URL params
     const playerId = searchParams.get('player_id');
@@ -52,12 +52,16 @@ const BetPage = () => {
                 return;
             }
             
+            // The betting table comes with the player state, wait for it
+            if (!playerState) {
+                return;
+            }
+            
             try {
                 setLoading(true);
                 setError('');
                 
-                // Get all betting table data in a single API call
-                const data = await getBettingTable(playerId, roundId);
+                const data = { teams: [], bets_available: 0, round_stage: '', ...playerState.betting_table };
                 
                 // If teams have odds, store them for future reference
                 if (data.teams && data.teams.some(team => team.odd1 && team.odd2)) {
@@ -95,7 +99,7 @@ const BetPage = () => {
         
         fetchData();
         
-    }, [playerId, roundId, roundStage, roundChanged]);
+    }, [playerId, roundId, playerState]);
 
     // Fetch tournament results if in finished stage
     useEffect(() => {
@@ -143,26 +147,8 @@ const BetPage = () => {
             
             await placeBet(playerTeam.id, selectedTeam.id, roundInfo.round_id);
             
-            // Refresh the betting table data
-            const data = await getBettingTable(playerId, roundInfo.round_id);
-            
-            // Preserve odds when refreshing after a bet
-            if (Object.keys(previousOdds).length > 0) {
-                const teamsWithOdds = data.teams.map(team => {
-                    if (previousOdds[team.id]) {
-                        return {
-                            ...team,
-                            odd1: previousOdds[team.id].odd1,
-                            odd2: previousOdds[team.id].odd2
-                        };
-                    }
-                    return team;
-                });
-                
-                data.teams = teamsWithOdds;
-            }
-            
-            setTableData(data);
+            // Refresh the betting table data, the odds are kept when it arrives
+            await refreshPlayerState();
             
             handleDialogClose();
         } catch (err) {
@@ -8,7 +8,7 @@ import Grid from '@mui/material/Grid2';
 import RedeemIcon from '@mui/icons-material/Redeem';
 import { useSearchParams } from 'react-router-dom';
 import { 
-    getTeamByIdentifier, getBonusForTeam, useBonus, getBettingTable
+    useBonus
 } from '../../services/tournamentService';
 import { useTournament } from '../../context/TournamentContext';
 
@@ -38,7 +38,7 @@ const BonusPage = () => {
     const [selectedLocation, setSelectedLocation] = useState('');
     
     // Get tournament context
-    const { roundInfo, roundChanged } = useTournament();
+    const { roundInfo, playerState, refreshPlayerState } = useTournament();
     
     // Extract only the properties we need to depend on
     const roundId = roundInfo?.round_id;
@@ -61,21 +61,25 @@ const BonusPage = () => {
                 return;
             }
             
+            // The team, its bonus and the other teams come with the player state, wait for it
+            if (!playerState) {
+                return;
+            }
+            
             try {
                 setLoading(true);
                 setError('');
                 
                 // Get player team info
-                const playerTeamData = await getTeamByIdentifier(playerId);
+                const playerTeamData = playerState.team;
                 setPlayerTeam(playerTeamData);
                 
                 // Check if player has an available bonus
                 if (playerTeamData) {
-                    const bonusData = await getBonusForTeam(playerId, roundId);
-                    setBonus(bonusData);
+                    setBonus(playerState.bonus);
                     
-                    // Fetch available teams for targeting
-                    const tableData = await getBettingTable(playerId, roundId);
+                    // Available teams for targeting
+                    const tableData = playerState.betting_table;
                     if (tableData && tableData.teams) {
                         setTeams(tableData.teams.filter(team => team.id !== playerTeamData.id));
                     }
@@ -90,7 +94,7 @@ const BonusPage = () => {
         
         fetchData();
         
-    }, [playerId, roundId, roundStage, roundChanged]);
+    }, [playerId, roundId, roundStage, playerState]);
 
     const handleBonusSelect = (bonusType) => {
         setSelectedBonus(bonusType);
@@ -161,8 +165,7 @@ const BonusPage = () => {
             await useBonus(bonusData);
             
             // Update bonus status
-            const bonusData2 = await getBonusForTeam(playerId, roundInfo.round_id);
-            setBonus(bonusData2);
+            await refreshPlayerState();
             
             handleDialogClose();
         } catch (err) {
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useCallback, useRef } from 'react';
 import { 
     Box, Typography, Paper, Table, TableBody, TableCell, TableContainer, 
     TableHead, TableRow, Button, CircularProgress, Alert, Link,
@@ -10,12 +10,40 @@ import EmojiEventsIcon from '@mui/icons-material/EmojiEvents';
 import LocationOnIcon from '@mui/icons-material/LocationOn';
 import { 
     getAllTeams, getRoundInfo, getTournamentResults, setSecondPlaceWinner,
-    getGamesForRound
+    getGamesForRound, subscribeToDashboard
 } from '../../services/tournamentService';
 
 // Local URL constant
 const LOCAL_URL = window.location.origin;
 
+// Map every team playing one of the games to the game's location
+const locationsOfGames = (games) => {
+    const locationMap = {};
+    games.forEach(game => {
+        if (game.location) {
+            locationMap[game.team1] = game.location;
+            locationMap[game.team2] = game.location;
+        }
+    });
+    return locationMap;
+};
+
+// Replace items of a list by id, adding the ones it does not hold yet
+const upsertById = (items, updates) => {
+    const updated = items.map(item => updates.find(update => update.id === item.id) || item);
+    const added = updates.filter(update => !items.some(item => item.id === update.id));
+    return [...updated, ...added];
+};
+
+// Set one stage status of the given teams
+const withStatus = (statuses, teamIds, key) => {
+    const updated = { ...statuses };
+    teamIds.forEach(teamId => {
+        updated[teamId] = { ...updated[teamId], [key]: true };
+    });
+    return updated;
+};
+
 const DashboardPage = () => {
     const [teams, setTeams] = useState([]);
     const [loading, setLoading] = useState(true);
@@ -31,71 +59,47 @@ const DashboardPage = () => {
     const [games, setGames] = useState([]);
     const [teamLocations, setTeamLocations] = useState({});
 
-    useEffect(() => {
-        const fetchData = async () => {
-            try {
-                setLoading(true);
-                // Get current round info
-                const roundData = await getRoundInfo();
-                setRoundInfo(roundData);
-                
-                // Get all teams
-                const teamsData = await getAllTeams();
-                setTeams(teamsData);
-                
-                // Fetch stage statuses for all teams
-                const statuses = await fetchTeamStageStatuses(teamsData, roundData?.round_id);
-                setStageStatuses(statuses);
-                
-                // Fetch games for current round to get locations
-                if (roundData.round_id) {
-                    try {
-                        const gamesData = await getGamesForRound(roundData.round_id);
-                        setGames(gamesData);
-                        
-                        // Create a mapping of team ID to their game location
-                        const locationMap = {};
-                        gamesData.forEach(game => {
-                            if (game.location) {
-                                locationMap[game.team1] = game.location;
-                                locationMap[game.team2] = game.location;
-                            }
-                        });
-                        setTeamLocations(locationMap);
-                    } catch (gameError) {
-                        console.error("Failed to fetch games:", gameError);
-                    }
+    const roundRef = useRef(null);
+
+    const fetchData = useCallback(async () => {
+        try {
+            setLoading(true);
+            // Get current round info
+            const roundData = await getRoundInfo();
+            roundRef.current = roundData;
+            setRoundInfo(roundData);
+            
+            // Get all teams
+            const teamsData = await getAllTeams();
+            setTeams(teamsData);
+            
+            // Fetch stage statuses for all teams
+            const statuses = await fetchTeamStageStatuses(teamsData, roundData?.round_id);
+            setStageStatuses(statuses);
+            
+            // Fetch games for current round to get locations
+            if (roundData.round_id) {
+                try {
+                    const gamesData = await getGamesForRound(roundData.round_id);
+                    setGames(gamesData);
+                    
+                    // Create a mapping of team ID to their game location
+                    setTeamLocations(locationsOfGames(gamesData));
+                } catch (gameError) {
+                    console.error("Failed to fetch games:", gameError);
                 }
+            }
+            
+            // If in finished stage, get tournament results
+            if (roundData.stage === 'finished') {
+                const results = await getTournamentResults();
+                setTournamentResults(results);
                 
-                // If in finished stage, get tournament results
-                if (roundData.stage === 'finished') {
-                    const results = await getTournamentResults();
-                    setTournamentResults(results);
-                    
-                    // If there's no second place winner yet, find potential second place teams
-                    if (results && results.active && !results.second_place) {
-                        // Find teams tied for second place (all teams not in first place with highest distance)
-                        const firstPlaceId = results.first_place.id;
-                        const nonWinnerTeams = teamsData.filter(team => team.id !== firstPlaceId);
-                        
-                        if (nonWinnerTeams.length > 0) {
-                            // Find max distance among non-winners
-                            const maxDistance = Math.max(...nonWinnerTeams.map(team => team.distance));
-                            // Filter teams with that distance
-                            const tiedTeams = nonWinnerTeams.filter(team => team.distance === maxDistance);
-                            setSecondPlaceTies(tiedTeams);
-                        }
-                    }
-                } 
-                // Special handling for final-multiple-ties stage
-                else if (roundData.stage === 'final-multiple-ties') {
-                    // Find first place team (highest distance)
-                    const firstPlaceTeam = teamsData.sort((a, b) => b.distance - a.distance)[0];
-                    setFirstPlace(firstPlaceTeam);
-                    
-                    // Find all teams tied for second place
-                    // (teams with highest distance excluding first place)
-                    const nonWinnerTeams = teamsData.filter(team => team.id !== firstPlaceTeam.id);
+                // If there's no second place winner yet, find potential second place teams
+                if (results && results.active && !results.second_place) {
+                    // Find teams tied for second place (all teams not in first place with highest distance)
+                    const firstPlaceId = results.first_place.id;
+                    const nonWinnerTeams = teamsData.filter(team => team.id !== firstPlaceId);
                     
                     if (nonWinnerTeams.length > 0) {
                         // Find max distance among non-winners
@@ -105,16 +109,112 @@ const DashboardPage = () => {
                         setSecondPlaceTies(tiedTeams);
                     }
                 }
-            } catch (err) {
-                console.error("Failed to fetch data:", err);
-                setError('Failed to load dashboard data. Please try again.');
-            } finally {
-                setLoading(false);
+            } 
+            // Special handling for final-multiple-ties stage
+            else if (roundData.stage === 'final-multiple-ties') {
+                // Find first place team (highest distance)
+                const firstPlaceTeam = teamsData.sort((a, b) => b.distance - a.distance)[0];
+                setFirstPlace(firstPlaceTeam);
+                
+                // Find all teams tied for second place
+                // (teams with highest distance excluding first place)
+                const nonWinnerTeams = teamsData.filter(team => team.id !== firstPlaceTeam.id);
+                
+                if (nonWinnerTeams.length > 0) {
+                    // Find max distance among non-winners
+                    const maxDistance = Math.max(...nonWinnerTeams.map(team => team.distance));
+                    // Filter teams with that distance
+                    const tiedTeams = nonWinnerTeams.filter(team => team.distance === maxDistance);
+                    setSecondPlaceTies(tiedTeams);
+                }
             }
-        };
+        } catch (err) {
+            console.error("Failed to fetch data:", err);
+            setError('Failed to load dashboard data. Please try again.');
+        } finally {
+            setLoading(false);
+        }
+    }, []);
 
+    useEffect(() => {
         fetchData();
-    }, []);
+    }, [fetchData]);
+
+    // Apply a message of the live dashboard feed
+    const applyLiveMessage = useCallback((message) => {
+        if (message.type === 'snapshot') {
+            roundRef.current = message.round;
+            setRoundInfo(message.round);
+            setTeams(message.teams);
+            setStageStatuses(message.statuses);
+            setGames(message.games);
+            setTeamLocations(locationsOfGames(message.games));
+            return;
+        }
+
+        // Every diff carries the teams it changed
+        const changedTeams = message.teams || [];
+        if (message.type === 'round_changed' && message.round.number !== roundRef.current?.number) {
+            // A new round number: statuses start over and every team got its new bets
+            setTeams(current => upsertById(current, changedTeams).map(team => ({
+                ...team,
+                bets_available: team.bets_available + (message.bets_granted || 0)
+            })));
+            setStageStatuses(current => Object.fromEntries(Object.keys(current).map(teamId => [
+                teamId, { bet_finished: false, joust_finished: false, bonus_used: false }
+            ])));
+            setGames([]);
+            setTeamLocations({});
+        } else if (changedTeams.length > 0) {
+            setTeams(current => upsertById(current, changedTeams));
+        }
+
+        switch (message.type) {
+            case 'bet_placed':
+                if (message.bet.bet_finish) {
+                    setStageStatuses(current => withStatus(current, [message.bet.team], 'bet_finished'));
+                }
+                break;
+            case 'game_marked':
+                setGames(current => upsertById(current, [message.game]));
+                // Only joust games count, not the tiebreakers of the final
+                if (roundRef.current?.stage === 'joust') {
+                    setStageStatuses(current => withStatus(
+                        current, [message.game.team1, message.game.team2], 'joust_finished'
+                    ));
+                }
+                break;
+            case 'bonus_used':
+                setStageStatuses(current => withStatus(current, [message.bonus.team], 'bonus_used'));
+                break;
+            case 'round_changed': {
+                roundRef.current = message.round;
+                setRoundInfo(message.round);
+                const newGames = message.games || [];
+                if (newGames.length > 0) {
+                    setGames(current => upsertById(current, newGames));
+                    setTeamLocations(current => ({ ...current, ...locationsOfGames(newGames) }));
+                }
+                // Teams without a bonus this round get theirs handed out already used
+                const usedBonuses = (message.bonuses || []).filter(bonus => bonus.finished);
+                if (usedBonuses.length > 0) {
+                    setStageStatuses(current => withStatus(
+                        current, usedBonuses.map(bonus => bonus.team), 'bonus_used'
+                    ));
+                }
+                // Results and ties come from their own endpoints
+                if (['final-multiple-ties', 'finished'].includes(message.round.stage)) {
+                    fetchData();
+                }
+                break;
+            }
+            default:
+                break;
+        }
+    }, [fetchData]);
+
+    // Keep the dashboard current with the live feed instead of reloading it
+    useEffect(() => subscribeToDashboard(applyLiveMessage), [applyLiveMessage]);
 
     // Fetch stage statuses for all teams
     const fetchTeamStageStatuses = async (teams, roundId) => {
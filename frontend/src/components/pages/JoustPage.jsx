@@ -9,7 +9,6 @@ import EmojiEventsIcon from '@mui/icons-material/EmojiEvents';
 import LocationOnIcon from '@mui/icons-material/LocationOn';
 import { useSearchParams } from 'react-router-dom';
 import { 
-    getTeamByIdentifier, getNextOpponent,
     getGamesForRound, markGame
 } from '../../services/tournamentService';
 import { useTournament } from '../../context/TournamentContext';
@@ -33,7 +32,7 @@ const JoustPage = () => {
     const [selectedWinner, setSelectedWinner] = useState(null);
     
     // Get tournament context
-    const { roundInfo, roundChanged } = useTournament();
+    const { roundInfo, playerState } = useTournament();
     
     // Extract only the properties we need to depend on
     const roundId = roundInfo?.round_id;
@@ -52,6 +51,11 @@ const JoustPage = () => {
                 return;
             }
             
+            // The team and its opponent come with the player state, wait for it
+            if (!playerState) {
+                return;
+            }
+            
             try {
                 setLoading(true);
                 setError('');
@@ -59,13 +63,16 @@ const JoustPage = () => {
                 // Only continue if we're in joust or final stage
                 if (roundStage === 'joust' || roundStage === 'final') {
                     // Get player team info
-                    const playerTeamData = await getTeamByIdentifier(playerId);
+                    const playerTeamData = playerState.team;
                     setPlayerTeam(playerTeamData);
                     
                     if (playerTeamData) {
                         // Get next opponent
                         try {
-                            const opponentData = await getNextOpponent(playerId, roundId);
+                            const opponentData = playerState.next_opponent;
+                            if (!opponentData) {
+                                throw new Error('No game found for this team and round');
+                            }
                             setOpponent(opponentData.opponent_name);
                             setOpponentId(opponentData.opponent_id);
                             setOpponentDescription(opponentData.opponent_description || '');
@@ -107,7 +114,7 @@ const JoustPage = () => {
                     setLocation('');
                     
                     // Get player team info for display purposes
-                    const playerTeamData = await getTeamByIdentifier(playerId);
+                    const playerTeamData = playerState.team;
                     setPlayerTeam(playerTeamData);
                 }
             } catch (err) {
@@ -120,7 +127,7 @@ const JoustPage = () => {
         
         fetchData();
         
-    }, [playerId, roundId, roundStage, roundChanged]);
+    }, [playerId, roundId, roundStage, playerState]);
 
     const handleWinClick = () => {
         setSelectedWinner(playerTeam.id);
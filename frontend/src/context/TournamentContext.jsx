@@ -1,9 +1,14 @@
 import React, { createContext, useState, useEffect, useCallback, useRef } from 'react';
-import { getRoundInfo, getTournamentSettings } from '../services/tournamentService';
+import { getRoundInfo, getTournamentSettings, getPlayerState } from '../services/tournamentService';
 import { useLocation } from 'react-router-dom';
 
 export const TournamentContext = createContext();
 
+// How long the event stream may take to send the round, and stay silent
+// afterwards, in milliseconds. The server sends a keepalive every 15 seconds
+const STREAM_CONNECT_TIMEOUT = 5000;
+const STREAM_SILENCE_TIMEOUT = 40000;
+
 export const TournamentProvider = ({ children }) => {
     const [roundInfo, setRoundInfo] = useState(null);
     const [loading, setLoading] = useState(true);
@@ -11,8 +16,11 @@ export const TournamentProvider = ({ children }) => {
     const [roundChanged, setRoundChanged] = useState(false);
     const [finishDistance, setFinishDistance] = useState(12); // Temporary default
     const previousRoundInfoRef = useRef(null);
+    // Everything the player's pages show, on player links only
+    const [playerState, setPlayerState] = useState(null);
     
     const location = useLocation();
+    const playerId = new URLSearchParams(location.search).get('player_id');
     
     // Extract current page from path
     const currentPage = location.pathname.split('/').filter(Boolean)[0] || 'track';
@@ -29,51 +37,122 @@ export const TournamentProvider = ({ children }) => {
         }
     }, []);
 
+    // Apply new round info, flagging round and stage changes
+    const applyRoundInfo = useCallback((data) => {
+        // Check if round or stage has changed - only trigger changes when needed
+        if (previousRoundInfoRef.current && (
+            previousRoundInfoRef.current.number !== data.number || 
+            previousRoundInfoRef.current.stage !== data.stage
+        )) {
+            console.log('Round or stage changed - triggering updates');
+            setRoundChanged(true);
+            // Reset the flag after a delay to allow components to react
+            setTimeout(() => setRoundChanged(false), 200);
+        }
+        
+        // Update ref for future comparisons
+        previousRoundInfoRef.current = {...data};
+        
+        // Ensure we're working with round number, not ID
+        setRoundInfo(data);
+        setError(null);
+    }, []);
+
+    // Fetch the player state in one call, its settings included
+    const fetchPlayerState = useCallback(async () => {
+        if (!playerId) return;
+        try {
+            const state = await getPlayerState(playerId);
+            setPlayerState(state);
+            if (state.settings && state.settings.finish_distance) {
+                setFinishDistance(state.settings.finish_distance);
+            }
+        } catch (err) {
+            console.error("Error fetching player state:", err);
+        }
+    }, [playerId]);
+
     // Fetch round info - this is common data needed by all pages
     const fetchRoundInfo = useCallback(async () => {
         try {
             const data = await getRoundInfo();
-            
-            // Check if round or stage has changed - only trigger changes when needed
-            if (previousRoundInfoRef.current && (
-                previousRoundInfoRef.current.number !== data.number || 
-                previousRoundInfoRef.current.stage !== data.stage
-            )) {
-                console.log('Round or stage changed - triggering updates');
-                setRoundChanged(true);
-                // Reset the flag after a delay to allow components to react
-                setTimeout(() => setRoundChanged(false), 200);
-            }
-            
-            // Update ref for future comparisons
-            previousRoundInfoRef.current = {...data};
-            
-            // Ensure we're working with round number, not ID
-            setRoundInfo(data);
-            setError(null);
+            applyRoundInfo(data);
         } catch (err) {
             console.error("Error fetching round info:", err);
             setError("Failed to fetch tournament information");
         } finally {
             setLoading(false);
         }
-    }, []);
+    }, [applyRoundInfo]);
     
     // Initial fetch on component mount
     useEffect(() => {
-        // Get tournament settings first
-        fetchTournamentSettings();
+        // Get tournament settings first, player links get them with the player state
+        if (!playerId) {
+            fetchTournamentSettings();
+        }
         
         // Then get round info
         fetchRoundInfo();
         
-        // Set up polling for round info (this runs constantly but is lightweight)
-        const roundInfoInterval = setInterval(fetchRoundInfo, 10000);
+        // Poll round info only while the event stream is unavailable
+        let roundInfoInterval = null;
+        const startPolling = () => {
+            if (!roundInfoInterval) {
+                roundInfoInterval = setInterval(fetchRoundInfo, 10000);
+            }
+        };
+        const stopPolling = () => {
+            clearInterval(roundInfoInterval);
+            roundInfoInterval = null;
+        };
         
+        if (!window.EventSource) {
+            startPolling();
+            return stopPolling;
+        }
+        
+        // The server pushes round info whenever the tournament changes.
+        // The page's `tournament` and `player_id` parameters pick the tournament.
+        const events = new EventSource(`/api/events/${window.location.search}`);
+
+        // The stream sends the round on connecting and a keepalive while idle.
+        // A stream silent for longer, as behind a buffering server or proxy,
+        // is given up for polling
+        let silenceTimeout = null;
+        const expectEvent = (delay) => {
+            clearTimeout(silenceTimeout);
+            silenceTimeout = setTimeout(() => {
+                events.close();
+                startPolling();
+            }, delay);
+        };
+        expectEvent(STREAM_CONNECT_TIMEOUT);
+
+        events.addEventListener('round', (event) => {
+            applyRoundInfo(JSON.parse(event.data));
+            setLoading(false);
+            stopPolling();
+            expectEvent(STREAM_SILENCE_TIMEOUT);
+        });
+        events.addEventListener('keepalive', () => expectEvent(STREAM_SILENCE_TIMEOUT));
+        // EventSource reconnects on its own, poll in the meantime. A server
+        // without the stream answers No Content, which closes it for good
+        events.onerror = startPolling;
+
         return () => {
-            clearInterval(roundInfoInterval);
+            clearTimeout(silenceTimeout);
+            events.close();
+            stopPolling();
         };
-    }, [fetchRoundInfo, fetchTournamentSettings]);
+    }, [applyRoundInfo, fetchRoundInfo, fetchTournamentSettings, playerId]);
+    
+    // Reload the player state whenever the round or stage changes
+    const roundId = roundInfo?.round_id;
+    const roundStage = roundInfo?.stage;
+    useEffect(() => {
+        fetchPlayerState();
+    }, [fetchPlayerState, roundId, roundStage]);
     
     // Context value
     const value = {
@@ -83,7 +162,9 @@ export const TournamentProvider = ({ children }) => {
         currentPage,
         roundChanged,
         finishDistance,
-        refreshRoundInfo: fetchRoundInfo
+        playerState,
+        refreshRoundInfo: fetchRoundInfo,
+        refreshPlayerState: fetchPlayerState
     };
     
     return (
@@ -11,6 +11,20 @@ const tournamentApi = axios.create({
     }
 });
 
+// Scope every request to the tournament of the current page. The backend
+// resolves it from `tournament` (a slug) or, for player links, from `player_id`.
+tournamentApi.interceptors.request.use((config) => {
+    const pageParams = new URLSearchParams(window.location.search);
+    const scope = {};
+    ['tournament', 'player_id'].forEach((key) => {
+        if (pageParams.get(key)) {
+            scope[key] = pageParams.get(key);
+        }
+    });
+    config.params = { ...scope, ...config.params };
+    return config;
+});
+
 export const getRoundInfo = async () => {
     try {
         const response = await tournamentApi.get('get-round-info/');
@@ -123,6 +137,44 @@ export const getBettingTable = async (identifier, roundId) => {
     }
 };
 
+// Sections of the player state received so far, with their ETags, and the
+// ETag of the tournament version they were received at
+let playerStateCache = { identifier: null, versionEtag: null, sections: {} };
+
+// Get everything a player's page needs in one call: round, settings, team,
+// bets_available, next_opponent, bonus and betting_table. Sections that did
+// not change since the last call are not sent again and come from the cache.
+export const getPlayerState = async (identifier) => {
+    try {
+        if (playerStateCache.identifier !== identifier) {
+            playerStateCache = { identifier, versionEtag: null, sections: {} };
+        }
+        const known = [
+            playerStateCache.versionEtag,
+            ...Object.values(playerStateCache.sections).map(section => section.etag)
+        ].filter(Boolean);
+        const response = await tournamentApi.get('player-state/', {
+            params: { identifier },
+            headers: known.length > 0 ? { 'If-None-Match': known.join(', ') } : {},
+            // 304: nothing changed in the tournament since the last call
+            validateStatus: (status) => status === 200 || status === 304
+        });
+        if (response.status === 200) {
+            const sections = {};
+            Object.entries(response.data.sections).forEach(([name, section]) => {
+                sections[name] = section.unchanged ? playerStateCache.sections[name] : section;
+            });
+            playerStateCache = { identifier, versionEtag: response.headers.etag, sections };
+        }
+        return Object.fromEntries(
+            Object.entries(playerStateCache.sections).map(([name, section]) => [name, section.data])
+        );
+    } catch (error) {
+        console.error("Error fetching player state:", error);
+        throw error;
+    }
+};
+
 // Get tournament settings like finish distance
 export const getTournamentSettings = async () => {
     try {
@@ -156,4 +208,33 @@ export const setSecondPlaceWinner = async (teamId) => {
     }
 };
 
+// Open the live dashboard feed of the page's tournament. onMessage receives a
+// snapshot first, then every diff. A dropped connection is opened again and
+// starts with a new snapshot. Returns a function closing the feed.
+export const subscribeToDashboard = (onMessage) => {
+    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    const url = `${protocol}//${window.location.host}/ws/dashboard/${window.location.search}`;
+    let socket = null;
+    let closed = false;
+    let reconnectTimeout = null;
+
+    const connect = () => {
+        socket = new WebSocket(url);
+        socket.onmessage = (event) => onMessage(JSON.parse(event.data));
+        socket.onclose = (event) => {
+            // 4404 means the tournament does not exist, reconnecting will not help
+            if (!closed && event.code !== 4404) {
+                reconnectTimeout = setTimeout(connect, 3000);
+            }
+        };
+    };
+    connect();
+
+    return () => {
+        closed = true;
+        clearTimeout(reconnectTimeout);
+        socket.close();
+    };
+};
+
 export default tournamentApi;
@@ -18,27 +18,20 @@ import os
 # (IPv4 connections will still work so long as `IPV6_V6ONLY` hasn't been enabled.)
 bind = ["[::]:{}".format(os.environ.get("PORT", 5006))]
 
-# The default `sync` worker is more suited to CPU/network-bandwidth bound workloads, so we
-# instead use the thread based worker type for improved support of blocking I/O workloads:
-# https://docs.gunicorn.org/en/stable/design.html#server-model
-#
-# If you need to further improve the performance of blocking I/O workloads, you may want to
-# try the `gevent` worker type, though you will need to disable `preload_app`, enable DB
-# connecting pooling, and be aware that gevent's monkey patching can break some packages.
-#
-# Note: When changing the number of dynos/workers/threads you will want to make sure you
-# do not exceed the maximum number of connections to external services such as DBs:
-# https://devcenter.heroku.com/articles/python-concurrency-and-database-connections
-worker_class = "gthread"
+# The app is served through its ASGI entry point (`backend.app.asgi`), so the event stream
+# at /api/events/ and the dashboard WebSocket can hold one long-lived connection per client
+# without tying up a thread. The uvicorn worker runs an asyncio event loop per process.
+# Django runs the synchronous view of every request in a thread of its own, so a worker
+# serves several API requests at once, as the threads of the `gthread` worker did;
+# `ASGITests` in backend/api/tests.py checks this:
+# https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/uvicorn/
+worker_class = "uvicorn_worker.UvicornWorker"
 
 # gunicorn will start this many worker processes. The Python buildpack automatically sets a
 # default for WEB_CONCURRENCY at dyno boot, based on the number of CPUs and available RAM:
 # https://devcenter.heroku.com/articles/python-concurrency
 workers = os.environ.get("WEB_CONCURRENCY", 1)
 
-# Each `gthread` worker process will use a pool of this many threads.
-threads = 5
-
 # Workers silent for more than this many seconds are killed and restarted.
 # Note: This only affects the maximum request time when using the `sync` worker.
 # For all other worker types it acts only as a worker heartbeat timeout.
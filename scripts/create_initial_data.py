@@ -17,6 +17,11 @@ teams = {
     'melisa-98h3g87f3g87f3g87f3g': {'name': 'Melisa', 'description': 'Ignas ir Mantrimas'},
 }
 
+# Define tournament parameters
+tournament_name = 'Default tournament'
+tournament_slug = 'default'
+finish_distance = 9
+
 # Define odds parameters
 odd1 = 10
 odd2 = 5
@@ -27,12 +32,27 @@ timestamp = datetime.now(timezone.utc).isoformat()
 # Initialize fixtures list
 fixtures = []
 
+# Add the tournament that owns all the other fixtures
+tournament_fixture = {
+    "model": "api.tournament",
+    "pk": 1,
+    "fields": {
+        "name": tournament_name,
+        "slug": tournament_slug,
+        "finish_distance": finish_distance,
+        "created": timestamp,
+        "modified": timestamp
+    }
+}
+fixtures.append(tournament_fixture)
+
 # Add teams to fixtures
 for i, (identifier, team_info) in enumerate(teams.items(), start=1):
     team_fixture = {
         "model": "api.team",
         "pk": i,
         "fields": {
+            "tournament": 1,
             "identifier": identifier,
             "name": team_info['name'],
             "description": team_info['description'],
@@ -49,9 +69,11 @@ round_fixture = {
     "model": "api.round",
     "pk": 1,
     "fields": {
+        "tournament": 1,
         "number": 1,
         "active": True,
         "stage": "betting",
+        "pending_bets": len(teams),
         "created": timestamp,
         "modified": timestamp
     }
@@ -64,6 +86,7 @@ for i, (identifier, team_info) in enumerate(teams.items(), start=1):
         "model": "api.odds",
         "pk": i,
         "fields": {
+            "tournament": 1,
             "round": 1,
             "team": i,
             "odd1": odd1,